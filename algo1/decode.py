@@ -1,14 +1,37 @@
+import re
+import sys
+from pathlib import Path
+
 from bs4 import BeautifulSoup
 
+ROOT_DIR = str(Path(__file__).resolve().parent.parent)
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
+
+from common.algorithms import load
+from common.framing import LENGTH_COMPRESSED, unframe_payload
+from common.buffers import read_text
+
 def bits_to_bytes(bitstring: str) -> bytes:
     return bytes(int(bitstring[i:i+8], 2) for i in range(0, len(bitstring), 8))
 
-def decode_html(input_html: str, threshold=2.0):
-    with open(input_html, "r", encoding="utf-8") as f:
-        soup = BeautifulSoup(f, "html.parser")
+# znacznik trybu kompaktowego jest zdefiniowany raz, w encode.py
+COMPACT_MARKER = load('algo1', 'encode').COMPACT_MARKER
+COMPACT_SHIFT_RE = re.compile(r'\.([a-z])\{position:relative;top:(-?\d+(?:\.\d+)?)px\}')
+COMPACT_LINE_RE = re.compile(r'<p(?: class=([a-z]))?>')
+LEVELS_RE = re.compile(r"""<meta name=['"]?stego-levels['"]? content=['"]?([-\d.,]+)""")
+
+def compact_offsets(html: str) -> list:
+    """Szybka ścieżka dla trybu kompaktowego: bez BeautifulSoup, same wyrażenia regularne."""
+    head_end = html.find('</head>')
+    shifts = {cls: float(top) for cls, top in COMPACT_SHIFT_RE.findall(html, 0, head_end)}
+    return [shifts.get(cls, 0.0) for cls in COMPACT_LINE_RE.findall(html, head_end)]
+
+def style_offsets(html: str) -> list:
+    soup = BeautifulSoup(html, "html.parser")
 
     divs = soup.find_all("div")
-    bits = []
+    offsets = []
 
     for div in divs:
         style = div.get("style", "")
@@ -18,17 +41,90 @@ def decode_html(input_html: str, threshold=2.0):
                 top_val = float(style.split("top:")[1].split("px")[0])
             except Exception:
                 pass
-        bit = '1' if top_val > threshold else '0'
-        bits.append(bit)
+        offsets.append(top_val)
+    return offsets
+
+def read_levels(html: str):
+    """Tablica poziomów z nagłówka (tryb wielopoziomowy) albo None."""
+    head_end = html.find('</head>')
+    match = LEVELS_RE.search(html, 0, head_end if head_end >= 0 else len(html))
+    if not match:
+        return None
+    return [float(level) for level in match.group(1).split(',')]
+
+def offsets_to_bits(offsets, levels=None, threshold=2.0) -> str:
+    """
+    Bez tablicy poziomów: próg jak dotąd (1 bit na linię).
+    Z tablicą: kwantyzacja do najbliższego poziomu, log2(len(levels)) bitów na linię.
+    """
+    if levels is None:
+        return ''.join('1' if top > threshold else '0' for top in offsets)
+
+    k = (len(levels) - 1).bit_length()
+    symbols = range(len(levels))
+    return ''.join(format(min(symbols, key=lambda i: abs(top - levels[i])), f'0{k}b')
+                   for top in offsets)
 
-    bitstring = ''.join(bits)
+# znaczniki otwierające linii coveru, na bajtach (plik czytany przez mmap, bez parsowania całości)
+DIV_TAG_RE = re.compile(rb"<div style='position: relative; top: (-?\d+(?:\.\d+)?)px;'>")
+P_TAG_RE = re.compile(rb"<p(?: class=([a-z]))?>")
+DEFAULT_LEVELS = (0, 4)
+
+def body_layout(data):
+    """
+    (tryb kompaktowy, poziomy, bity na linię, offset pierwszej linii coveru)
+    z nagłówka dokumentu; data: bajty, bytearray albo mmap.
+    """
+    head_end = data.find(b'</head>')
+    body = data.find(b'<body', max(head_end, 0))
+    if head_end < 0 or body < 0:
+        raise ValueError("To nie jest plik stego algo1 (brak <head>/<body>).")
+    head = bytes(data[:head_end]).decode('utf-8', errors='replace')
+    compact = COMPACT_MARKER in head
+    levels = read_levels(head)
+    if levels is None:
+        levels = DEFAULT_LEVELS
+    k = (len(levels) - 1).bit_length()
+    return compact, levels, k, data.find(b'\n', body) + 1
+
+def tag_symbol(match, compact, levels, threshold=2.0) -> int:
+    """Symbol linii z dopasowania DIV_TAG_RE / P_TAG_RE (jak offsets_to_bits)."""
+    if compact:
+        cls = match.group(1)
+        return ord(cls) - ord('a') + 1 if cls else 0
+    top = float(match.group(1))
+    if tuple(levels) == DEFAULT_LEVELS:
+        return 1 if top > threshold else 0
+    return min(range(len(levels)), key=lambda i: abs(top - levels[i]))
+
+def length_header(value: int):
+    """32-bitowy nagłówek -> (długość wiadomości w bajtach, czy skompresowana)."""
+    return value & ~LENGTH_COMPRESSED, bool(value & LENGTH_COMPRESSED)
+
+def decode_payload(input_html, threshold=2.0) -> bytes:
+    """
+    Zwraca ukryte bajty (po ewentualnej dekompresji).
+    input_html: ścieżka, bajty, memoryview, mmap albo strumień binarny.
+    """
+    html = read_text(input_html)
+
+    if COMPACT_MARKER in html[:1024]:
+        offsets = compact_offsets(html)
+    else:
+        offsets = style_offsets(html)
+    bits = offsets_to_bits(offsets, read_levels(html), threshold)
+
+    bitstring = bits
     length_bits = bitstring[:32]
-    msg_len = int(length_bits, 2)
+    msg_len, compressed = length_header(int(length_bits, 2))
     total_bits = 32 + msg_len * 8
     msg_bits = bitstring[32:total_bits]
 
-    msg_bytes = bits_to_bytes(msg_bits)
-    message = msg_bytes.decode('utf-8', errors='replace')
+    payload = bits_to_bytes(msg_bits)
+    return unframe_payload(payload) if compressed else payload
+
+def decode_html(input_html, threshold=2.0):
+    message = decode_payload(input_html, threshold).decode('utf-8', errors='replace')
 
     print(f"Odczytana wiadomość: {message!r}")
     return message
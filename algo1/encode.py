@@ -1,37 +1,117 @@
+import sys
+from pathlib import Path
+
+ROOT_DIR = str(Path(__file__).resolve().parent.parent)
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
+
+from common.framing import LENGTH_COMPRESSED, frame_payload
+from common.buffers import describe, write_sink
+
 def to_bits(data: bytes) -> str:
     return ''.join(f'{b:08b}' for b in data)
 
 def int_to_32bits(n: int) -> str:
     return f'{n:032b}'
 
-def encode_html(output_html: str, cover_lines, message: str):
-    msg_bytes = message.encode('utf-8')
-    length_bits = int_to_32bits(len(msg_bytes))
-    payload_bits = length_bits + to_bits(msg_bytes)
+# Tryb kompaktowy: przesunięcie zdefiniowane raz w arkuszu stylów, linia to
+# <p class=a> (bit 1) albo goły <p> (bit 0) bez </p> (HTML zamyka go sam);
+# dekoder rozpoznaje ten tryb po znaczniku meta.
+COMPACT_MARKER = "<meta name=stego-format content=compact>"
+
+# Domyślne tablice poziomów (px) dla 1, 2 i 3 bitów na linię.
+# 1 bit to dotychczasowe 0/4 px, więc stare pliki dekodują się bez zmian.
+DEFAULT_LEVELS = {
+    1: (0, 4),
+    2: (0, 1, 2, 3),
+    3: (0, 1, 2, 3, 4, 5, 6, 7),
+}
+
+def levels_meta(levels, compact) -> str:
+    """Tablica poziomów zapisana w nagłówku; dekoder kwantyzuje do najbliższego poziomu."""
+    content = ','.join(f'{level:g}' for level in levels)
+    if compact:
+        return f"<meta name=stego-levels content={content}>"
+    return f"<meta name='stego-levels' content='{content}'>"
+
+def payload_symbols(message, compress=False, bits_per_line=1) -> list:
+    """
+    Długość (32 bity) + wiadomość jako symbole po bits_per_line bitów (ostatni
+    dopełniony zerami). Najwyższy bit długości mówi, że wiadomość jest
+    skompresowana (common/framing.py), więc długość musi być mniejsza niż 2**31.
+    """
+    msg_bytes = message.encode('utf-8') if isinstance(message, str) else bytes(message)
+    if compress:
+        msg_bytes = frame_payload(msg_bytes)
+    if len(msg_bytes) >= LENGTH_COMPRESSED:
+        raise ValueError("Wiadomość za długa (maksymalnie 2**31 - 1 bajtów).")
+    header = len(msg_bytes) | (LENGTH_COMPRESSED if compress else 0)
+    payload_bits = int_to_32bits(header) + to_bits(msg_bytes)
+
+    k = bits_per_line
+    payload_bits += '0' * (-len(payload_bits) % k)
+    return [int(payload_bits[i:i + k], 2) for i in range(0, len(payload_bits), k)]
+
+def line_tag(symbol, levels, compact=False) -> str:
+    """Znacznik otwierający linii niosącej symbol; reszta linii od niego nie zależy."""
+    if compact:
+        # klasa dla poziomu i: litera 'a' + i - 1; poziom 0 to goły <p>
+        return f"<p class={chr(ord('a') + symbol - 1)}>" if symbol else "<p>"
+    return f"<div style='position: relative; top: {levels[symbol]:g}px;'>"
+
+def encode_html(output_html, cover_lines, message, compress=False, compact=False,
+                bits_per_line=1, levels=None):
+    # output_html: ścieżka, strumień binarny, bufor do zapisu albo None (zwraca bajty HTML)
+    # message: str (UTF-8) albo bytes; compress=True kompresuje przed ukryciem
+    # bits_per_line > 1: każda linia ma jeden z 2**bits_per_line poziomów przesunięcia
+    if levels is None:
+        levels = DEFAULT_LEVELS.get(bits_per_line)
+        if levels is None:
+            raise ValueError(f"Brak domyślnych poziomów dla {bits_per_line} bitów na linię.")
+    if len(levels) != 2 ** bits_per_line or len(set(levels)) != len(levels):
+        raise ValueError(f"Potrzeba {2 ** bits_per_line} różnych poziomów przesunięcia.")
+    if compact and levels[0] != 0:
+        # symbol 0 to goły <p> bez klasy, czyli przesunięcie 0 px
+        raise ValueError("W trybie kompaktowym pierwszy poziom musi wynosić 0 px.")
 
-    if len(cover_lines) < len(payload_bits):
-        raise ValueError(f"Potrzeba co najmniej {len(payload_bits)} linii w coverze.")
+    k = bits_per_line
+    symbols = payload_symbols(message, compress, k)
 
-    html_lines = [
-        "<!DOCTYPE html>",
-        "<html><head><meta charset='utf-8'><title>Stego HTML</title></head><body style='font-family: monospace; line-height: 1.5;'>"
-    ]
+    if len(cover_lines) < len(symbols):
+        raise ValueError(f"Potrzeba co najmniej {len(symbols)} linii w coverze.")
 
-    shift_amount = 4  # przesunięcie dla bitu 1
+    # nagłówek z tablicą poziomów, gdy nie są to domyślne 0/4 px (dekoder przyjmuje je bez nagłówka)
+    meta = levels_meta(levels, compact) if tuple(levels) != DEFAULT_LEVELS[1] else ''
 
-    for i, line in enumerate(cover_lines):
-        bit = payload_bits[i] if i < len(payload_bits) else '0'
-        top_shift = shift_amount if bit == '1' else 0
-        html_lines.append(f"<div style='position: relative; top: {top_shift}px;'>{line}</div>")
+    if compact:
+        classes = ''.join(f".{chr(ord('a') + i - 1)}{{position:relative;top:{level:g}px}}"
+                          for i, level in enumerate(levels) if i > 0)
+        html_lines = [
+            "<!DOCTYPE html>",
+            f"<html><head><meta charset=utf-8>{COMPACT_MARKER}{meta}<title>Stego HTML</title>"
+            f"<style>body{{font-family:monospace;line-height:1.5}}p{{margin:0}}"
+            f"{classes}</style></head><body>"
+        ]
+        for i, line in enumerate(cover_lines):
+            symbol = symbols[i] if i < len(symbols) else 0
+            html_lines.append(f"{line_tag(symbol, levels, True)}{line}")
+    else:
+        html_lines = [
+            "<!DOCTYPE html>",
+            f"<html><head><meta charset='utf-8'>{meta}<title>Stego HTML</title></head><body style='font-family: monospace; line-height: 1.5;'>"
+        ]
+        for i, line in enumerate(cover_lines):
+            symbol = symbols[i] if i < len(symbols) else 0
+            html_lines.append(f"{line_tag(symbol, levels)}{line}</div>")
 
     html_lines.append("</body></html>")
 
-    with open(output_html, "w", encoding="utf-8") as f:
-        f.write("\n".join(html_lines))
+    result = write_sink("\n".join(html_lines).encode("utf-8"), output_html)
 
-    print(f"Zapisano HTML: {output_html}")
+    print(f"Zapisano HTML: {describe(output_html)}")
     print(f"Ukryta wiadomość: {message!r}")
-    print(f"Użyto {len(payload_bits)} linii.")
+    print(f"Użyto {len(symbols)} linii.")
+    return result
 
 if __name__ == "__main__":
     lines = [f"Line {i+1}" for i in range(2000)]
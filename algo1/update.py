@@ -0,0 +1,106 @@
+"""
+Podmiana wiadomości w istniejącym pliku stego bez ponownego kodowania.
+
+Symbol k-tej linii zależy tylko od k-tego symbolu wiadomości, więc wystarczy
+porównać stary i nowy ciąg symboli i przepisać znaczniki otwierające linii,
+które się różnią. Czytane są tylko linie niosące starą albo nową wiadomość.
+Znaczniki <div> mają stałą długość (przy poziomach 0/4 px i jednocyfrowych),
+więc plik jest poprawiany w miejscu przez mmap; w trybie kompaktowym <p> i
+<p class=a> różnią się długością i reszta pliku jest przesuwana
+(common/patching.py).
+
+    python update.py stego.html -m "nowa wiadomosc"
+"""
+import argparse
+import sys
+from pathlib import Path
+
+ROOT_DIR = str(Path(__file__).resolve().parent.parent)
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
+
+from common.algorithms import load
+from common.buffers import describe
+from common.patching import PatchTarget
+
+encode = load('algo1', 'encode')
+decode = load('algo1', 'decode')
+
+class _Lines:
+    """Kolejne linie coveru: (początek znacznika, koniec znacznika, symbol)."""
+
+    def __init__(self, data, start, compact, levels, threshold):
+        self.data = data
+        self.pos = start
+        self.compact = compact
+        self.levels = levels
+        self.threshold = threshold
+        self.lines = []
+
+    def read(self, count):
+        """Wczytaj linie do count; ValueError, gdy plik ma ich mniej."""
+        tag_re = decode.P_TAG_RE if self.compact else decode.DIV_TAG_RE
+        while len(self.lines) < count:
+            match = tag_re.match(self.data, self.pos)
+            if self.pos <= 0 or not match:
+                raise ValueError(f"Potrzeba co najmniej {count} linii w coverze.")
+            symbol = decode.tag_symbol(match, self.compact, self.levels, self.threshold)
+            self.lines.append((match.start(), match.end(), symbol))
+            self.pos = self.data.find(b'\n', match.end()) + 1
+
+
+def update_html(stego_html, message, compress=False, threshold=2.0):
+    """
+    Zamień ukrytą wiadomość na message (str albo bytes) z zachowaniem trybu i
+    poziomów dokumentu. stego_html: ścieżka albo bytearray / mmap (zmieniane
+    w miejscu; zwraca liczbę zmienionych linii) albo bajty / strumień
+    (zwraca nowy dokument).
+    """
+    with PatchTarget(stego_html) as doc:
+        compact, levels, k, start = decode.body_layout(doc.data)
+        lines = _Lines(doc.data, start, compact, levels, threshold)
+
+        # stara długość z nagłówka (32 bity), potem tyle linii, ile niesie stara albo nowa wiadomość
+        header = -(-32 // k)
+        lines.read(header)
+        bits = ''.join(format(symbol, f'0{k}b') for _, _, symbol in lines.lines)
+        old_length, _ = decode.length_header(int(bits[:32], 2))
+        old_count = -(-(32 + old_length * 8) // k)
+        symbols = encode.payload_symbols(message, compress, k)
+        try:
+            lines.read(max(old_count, len(symbols)))
+        except ValueError:
+            # uszkodzona stara długość nie blokuje nadpisania, brak linii na nową wiadomość tak
+            lines.read(len(symbols))
+
+        patches = []
+        for i, (tag_start, tag_end, old) in enumerate(lines.lines):
+            new = symbols[i] if i < len(symbols) else 0
+            if new != old:
+                patches.append((tag_start, tag_end,
+                                encode.line_tag(new, levels, compact).encode('utf-8')))
+        result = doc.apply(patches)
+
+    print(f"Zaktualizowano: {describe(stego_html)}")
+    print(f"Zmieniono {len(patches)} z {len(lines.lines)} linii.")
+    return result if not doc.writable else len(patches)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Podmiana wiadomości w pliku stego algo1 w miejscu')
+
+    parser.add_argument('stego', help='Plik stego HTML (zmieniany w miejscu)')
+    parser.add_argument('-m', '--message', required=True, help='Nowa wiadomość')
+    parser.add_argument('-z', '--compress', action='store_true', help='Kompresja przed ukryciem')
+
+    args = parser.parse_args()
+
+    try:
+        update_html(args.stego, args.message, args.compress)
+    except (ValueError, OSError) as e:
+        print(f"Błąd: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,25 @@
 import textwrap
 import re
+import sys
 from pathlib import Path
 from bs4 import BeautifulSoup
 
+ROOT_DIR = str(Path(__file__).resolve().parent.parent)
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
+
+from common.framing import frame_payload, unframe_payload
+from common.cover_index import load_or_build, indexed_lines
+from common.buffers import describe, read_source, read_text, write_sink
+from common.patching import PatchTarget
+
 COVER_FILE = "cover.txt"
 OUTPUT_FILE = "stego_subtelny.html"
 SECRET_TEXT = "Ukryta wiadomosc TEST 123000321!!!"
 
-def text_to_binary(secret_text: str) -> str:
-    return ''.join(format(b, '08b') for b in secret_text.encode('utf-8'))
+def text_to_binary(secret_text) -> str:
+    data = secret_text.encode('utf-8') if isinstance(secret_text, str) else bytes(secret_text)
+    return ''.join(format(b, '08b') for b in data)
 
 def pad_bits(bits: str) -> str:
     return bits if len(bits) % 2 == 0 else '0' + bits
@@ -16,7 +27,17 @@ def pad_bits(bits: str) -> str:
 def bits_to_blocks(bits: str) -> list[str]:
     return textwrap.wrap(bits, 2)
 
-def binary_to_text(bits: str) -> str:
+# skompresowana wiadomosc (common/framing.py) jest oznaczona w naglowku dokumentu
+COMPRESSED_META = '<meta name="stego-compressed" content="1">'
+
+def head_line(compressed=False) -> str:
+    return f'<html><head>{COMPRESSED_META}<style>' if compressed else '<html><head><style>'
+
+def is_compressed(html_text: str) -> bool:
+    head_end = html_text.find('</head>')
+    return COMPRESSED_META in html_text[:head_end if head_end >= 0 else len(html_text)]
+
+def binary_to_bytes(bits: str, compressed=False) -> bytes:
     bit_len = (len(bits) // 8) * 8
     bits = bits[:bit_len]
     b_array = bytearray()
@@ -24,30 +45,86 @@ def binary_to_text(bits: str) -> str:
         byte_str = bits[i:i+8]
         if len(byte_str) == 8:
             b_array.append(int(byte_str, 2))
+    return unframe_payload(bytes(b_array)) if compressed else bytes(b_array)
+
+def binary_to_text(bits: str, compressed=False) -> str:
     try:
-        return b_array.decode('utf-8')
+        return binary_to_bytes(bits, compressed).decode('utf-8')
     except UnicodeDecodeError:
         return "BLAD DEKODOWANIA"
 
+# jedna linia coveru -> linia HTML niosąca blok 2 bitów (None: bez bloku)
+def encode_line(line: str, block) -> str:
+    if block == '00':
+        # jedna spasja
+        return f'<span class="end-00">{line}</span><br>'
+    if block == '11':
+        # dwie spacje na koniec
+        return f'<span class="end-11">{line}</span><br>'
+    if block == '01':
+        # spacja między slowami
+        parts = line.split(' ', 1)
+        if len(parts) > 1:
+            return f'<span>{parts[0]}<span class="space-01">&nbsp;</span>{parts[1]}</span><br>'
+    elif block == '10':
+        # spacja przed 1. znakiem specjalnym
+        match = re.search(r'([,.!;?])', line)
+        if match:
+            idx = match.start()
+            return f'<span>{line[:idx]}<span class="space-10"></span>{line[idx:]}</span><br>'
+    return f'<span>{line}</span><br>'
+
+SPACE_01 = '<span class="space-01">&nbsp;</span>'
+SPACE_10 = '<span class="space-10"></span>'
+LINE_RE = re.compile(r'<span(?: class="end-(00|11)")?>(.*)</span><br>$')
+
+def decode_line(html_line: str):
+    """Odwrotność encode_line: (blok albo None, linia coveru) albo None dla obcej linii."""
+    match = LINE_RE.match(html_line)
+    if not match:
+        return None
+    block, inner = match.groups()
+    if block:
+        return block, inner
+    if SPACE_01 in inner:
+        return '01', inner.replace(SPACE_01, ' ', 1)
+    if SPACE_10 in inner:
+        return '10', inner.replace(SPACE_10, '', 1)
+    return None, inner
+
 # ukrywanie
-def encode_html_with_formatting(cover_file: str, secret_text: str, output_html: str):
-    
+def encode_html_with_formatting(cover_file, secret_text, output_html, compress=False,
+                                use_index=False):
+    # cover_file: ścieżka, bajty, memoryview, mmap albo strumień binarny
+    # output_html: ścieżka, strumień, bufor do zapisu albo None (zwraca bajty HTML)
+    # secret_text: str albo bytes; compress=True kompresuje przed ukryciem
+    # use_index=True: podział na linie z indeksu covera (common/cover_index.py)
+
     try:
-        cover_text = Path(cover_file).read_text(encoding='utf-8')
+        # jak read_text(): \r\n i \r -> \n
+        cover_bytes = bytes(read_source(cover_file)).replace(b'\r\n', b'\n').replace(b'\r', b'\n')
     except FileNotFoundError:
         print(f"BRAK PLIKU COVER TEXT: {cover_file}")
         return
 
+    if compress:
+        if isinstance(secret_text, str):
+            secret_text = secret_text.encode('utf-8')
+        secret_text = frame_payload(secret_text)
     bits = pad_bits(text_to_binary(secret_text))
     blocks = bits_to_blocks(bits)
-    lines = cover_text.split('\n')
+    if use_index:
+        with load_or_build(cover_bytes, 'algo2') as index:
+            lines = indexed_lines(cover_bytes, index)
+    else:
+        lines = cover_bytes.decode('utf-8').split('\n')
 
     if len(blocks) > len(lines):
         print(f"!!!COVER TEXT ma {len(lines)} linii, ")
         print(f"ale potrzeba {len(blocks)} linii, wiadomosc zostanie skrocona.")
         blocks = blocks[:len(lines)]
 
-    html_lines = ['<html><head><style>',
+    html_lines = [head_line(compress),
                   'body { font-family: "Times New Roman", serif; }',
                   '.end-00::after { content: "\\00a0"; }',         # 1 spacja na końcu
                   '.end-11::after { content: "\\00a0\\00a0"; }',   # 2 spacje na końcu
@@ -55,50 +132,69 @@ def encode_html_with_formatting(cover_file: str, secret_text: str, output_html:
                   '.space-10::before { content: "\\00a0"; }', # spacja przed znakiem spec.
                   '</style></head><body>']
 
-    block_index = 0
-    for line in lines:
-        if block_index < len(blocks):
-            block = blocks[block_index]
-            encoded_line = ""
-            
-            if block == '00':
-                # jedna spasja
-                encoded_line = f'<span class="end-00">{line}</span>'
-            elif block == '11':
-		# dwie spacje na koniec
-                encoded_line = f'<span class="end-11">{line}</span>'
-            elif block == '01':
-                # spacja między slowami 
-                parts = line.split(' ', 1)
-                if len(parts) > 1:
-                    encoded_line = f'<span>{parts[0]}<span class="space-01">&nbsp;</span>{parts[1]}</span>'
-                else:
-                    encoded_line = f'<span>{line}</span>'
-            elif block == '10':
-                # spacja przed 1. znakiem specjalnym 
-                match = re.search(r'([,.!;?])', line)
-                if match:
-                    idx = match.start()
-                    encoded_line = f'<span>{line[:idx]}<span class="space-10"></span>{line[idx:]}</span>'
-                else:
-                    encoded_line = f'<span>{line}</span>'
-
-            html_lines.append(encoded_line + '<br>')
-            block_index += 1
-        else:
-            html_lines.append(f'<span>{line}</span><br>')
+    for i, line in enumerate(lines):
+        html_lines.append(encode_line(line, blocks[i] if i < len(blocks) else None))
 
     html_lines.append('</body></html>')
-    Path(output_html).write_text('\n'.join(html_lines), encoding='utf-8')
-    print(f"+++Plik zapisany: {output_html}")
+    result = write_sink('\n'.join(html_lines).encode('utf-8'), output_html)
+    print(f"+++Plik zapisany: {describe(output_html)}")
+    return result
 
-def decode_html_with_formatting(stego_html: str) -> str: 
-    try:
-        html_text = Path(stego_html).read_text(encoding='utf-8')
-    except FileNotFoundError:
-        print(f"!!!BRAK PLIKU: {stego_html}")
-        return ""
-        
+def update_html_with_formatting(stego_html, secret_text, compress=False):
+    """
+    Podmiana wiadomości w istniejącym pliku stego: przepisywane są tylko linie,
+    których blok się zmienia. Stara wiadomość kończy się na ostatniej linii z
+    blokiem; linie bez bloku bywają też w jej środku (koder zostawia bez bloku
+    linię, która go nie uniesie, np. 01 bez spacji). Bloki 00/11 mają
+    tę samą długość i są zmieniane w miejscu (mmap); inne zmiany przepisują plik
+    od pierwszej z nich (common/patching.py).
+    stego_html: ścieżka albo bytearray (zmieniane w miejscu; zwraca liczbę
+    zmienionych linii) albo bajty / strumień (zwraca nowy dokument).
+    """
+    if compress:
+        if isinstance(secret_text, str):
+            secret_text = secret_text.encode('utf-8')
+        secret_text = frame_payload(secret_text)
+    blocks = bits_to_blocks(pad_bits(text_to_binary(secret_text)))
+
+    with PatchTarget(stego_html) as doc:
+        data = doc.data
+        pos = data.find(b'</style></head><body>')
+        if pos < 0:
+            raise ValueError("To nie jest plik stego algo2 (brak naglowka).")
+        pos = data.find(b'\n', pos) + 1
+
+        patches = []
+        if is_compressed(bytes(data[:pos]).decode('utf-8', errors='replace')) != bool(compress):
+            first = data.find(b'\n')
+            patches.append((0, first, head_line(compress).encode('utf-8')))
+        # każda linia z blokiem ma <span class="...">, a za starą wiadomością już żadna
+        last_block = data.rfind(b'<span class="', pos)
+        checked = 0
+        while pos > 0:
+            end = data.find(b'\n', pos)
+            end = len(data) if end < 0 else end
+            parsed = decode_line(bytes(data[pos:end]).decode('utf-8'))
+            if parsed is None:
+                break  # '</body></html>'
+            old, line = parsed
+            new = blocks[checked] if checked < len(blocks) else None
+            if old is None and new is None and pos > last_block:
+                break
+            if old != new:
+                patches.append((pos, end, encode_line(line, new).encode('utf-8')))
+            checked += 1
+            pos = end + 1
+
+        if checked < len(blocks):
+            print(f"!!!COVER TEXT ma {checked} linii, ")
+            print(f"ale potrzeba {len(blocks)} linii, wiadomosc zostanie skrocona.")
+        result = doc.apply(patches)
+
+    print(f"+++Plik zaktualizowany: {describe(stego_html)} (zmieniono {len(patches)} linii)")
+    return result if not doc.writable else len(patches)
+
+def extract_bits(html_text: str) -> str:
     soup = BeautifulSoup(html_text, "lxml")
     extracted_bits = ''
 
@@ -134,7 +230,22 @@ def decode_html_with_formatting(stego_html: str) -> str:
              if len(extracted_bits) > 2:
                 pass
 
-    return binary_to_text(extracted_bits)
+    return extracted_bits
+
+def decode_payload(stego_html) -> bytes:
+    """Ukryte bajty (po ewentualnej dekompresji) zamiast tekstu."""
+    html_text = read_text(stego_html)
+    return binary_to_bytes(extract_bits(html_text), is_compressed(html_text))
+
+def decode_html_with_formatting(stego_html) -> str: 
+    # stego_html: ścieżka, bajty, memoryview, mmap albo strumień binarny
+    try:
+        html_text = read_text(stego_html)
+    except FileNotFoundError:
+        print(f"!!!BRAK PLIKU: {stego_html}")
+        return ""
+        
+    return binary_to_text(extract_bits(html_text), is_compressed(html_text))
 
 if __name__ == "__main__":
     
@@ -1,6 +1,18 @@
 import sys
 import math
 import os
+from pathlib import Path
+
+ROOT_DIR = str(Path(__file__).resolve().parent.parent)
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
+
+from common.algorithms import load
+from common.framing import payload_to_text, split_flag
+from common.streams import open_text_input
+
+# znacznik strumienia z bitem kompresji jest zdefiniowany raz, w encode.py
+MARKER = load('algo3', 'encode').MARKER
 
 # Optimized 4-category emoticon sets - EXACTLY 16 emoticons each (must match encoder)
 EMOTICON_SETS = {
@@ -18,7 +30,7 @@ EMOTICON_SETS = {
     ],
     'angry': [
         '😠', '😡', '🤬', '😤', '👿', '😾', '💢', '😖',
-        '😣', '😩', '😫', '🤯', '😒', '🙄', '😑', '😬'
+        '😣', '😩', '😈', '🤯', '😒', '🙄', '😑', '😬'
     ]
 }
 
@@ -86,22 +98,106 @@ def extract_bits_from_sentence(stego_sentence):
 
     return extracted_bits, emoticon, set_name
 
-def binary_to_text(binary_string):
-    """Konwertuj binary string na tekst (ASCII)."""
-    # Upewnij się że długość jest wielokrotnością 8
-    padding = len(binary_string) % 8
-    if padding != 0:
-        binary_string = binary_string[:len(binary_string) - padding]
+# tryb wielu slotów (encode.py --slots): nagłówek i grupy granic słów są
+# zdefiniowane raz, w koderze
+HEADER_BITS = load('algo3', 'encode').HEADER_BITS
+slot_groups = load('algo3', 'encode').slot_groups
+
+def split_slots(stego_sentence):
+    """
+    Rozdziel zdanie na słowa i emotikony stojące jako osobne słowa.
+    Zwraca: (word_count, [(emoticon, granica), ...]), granica = liczba słów przed emotikoną
+    """
+    word_count = 0
+    emoticons = []
+    for token in stego_sentence.split():
+        if find_emoticon_info(token)[0] is not None:
+            emoticons.append((token, word_count))
+        else:
+            word_count += 1
+    return word_count, emoticons
+
+def detect_slots(stego_sentences):
+    """
+    Tryb kodera: 1 (jedna emotikona na zdanie) albo k z nagłówka trybu
+    wielu slotów - tam pierwsze zdanie ma zawsze co najmniej dwie emotikony,
+    a indeks pierwszej to k - 1.
+    """
+    if not stego_sentences:
+        return 1
+    _, emoticons = split_slots(stego_sentences[0])
+    if len(emoticons) < 2:
+        return 1
+    _, index, _ = find_emoticon_info(emoticons[0][0])
+    return index + 1
+
+def extract_slot_bits(stego_sentence, slots, header=False):
+    """
+    Wyciągnij bity ze zdania w trybie wielu slotów; header=True pomija
+    nagłówek (indeks pierwszej emotikony) w pierwszym zdaniu.
+    Zwraca: (extracted_bits, emoticons, set_name) lub None
+    """
+    word_count, emoticons = split_slots(stego_sentence)
+    groups = slot_groups(word_count, slots)
+    if len(emoticons) != len(groups):
+        return None
+
+    bits = ''
+    set_name = None
+    for (emoticon, boundary), (first, last) in zip(emoticons, groups):
+        set_name, index, n = find_emoticon_info(emoticon)
+        if not first <= boundary <= last:
+            return None
+        bits += decimal_to_bits(index, n)
+        if last > first:
+            bits += '1' if boundary == last else '0'
+    if header:
+        bits = bits[HEADER_BITS:]
+    return bits, ' '.join(e for e, _ in emoticons), set_name
+
+def is_marked(stego_sentences):
+    """
+    Czy strumień zaczyna się od bitu kompresji: tryb wielu slotów albo MARKER
+    na początku pierwszego zdania. Pliki sprzed bitu kompresji go nie mają.
+    """
+    if not stego_sentences:
+        return True
+    return detect_slots(stego_sentences) > 1 or stego_sentences[0].split(maxsplit=1)[0] == MARKER
+
+def iter_sentence_bits(stego_sentences):
+    """Pary (zdanie, wynik extract_*) dla wszystkich zdań; tryb rozpoznawany sam."""
+    slots = detect_slots(stego_sentences)
+    for i, sentence in enumerate(stego_sentences):
+        if i == 0 and slots == 1 and sentence.split(maxsplit=1)[0] == MARKER:
+            sentence = sentence[len(MARKER):].lstrip()
+        if slots > 1:
+            yield sentence, extract_slot_bits(sentence, slots, header=(i == 0))
+        else:
+            yield sentence, extract_bits_from_sentence(sentence)
+
+def binary_to_bytes(binary_string):
+    """Konwertuj binary string na bajty (niepełny ostatni bajt jest pomijany)."""
+    usable = len(binary_string) - len(binary_string) % 8
+    return bytes(int(binary_string[i:i+8], 2) for i in range(0, usable, 8))
 
-    text = ''
-    for i in range(0, len(binary_string), 8):
-        byte = binary_string[i:i+8]
-        if len(byte) == 8:
-            char_code = int(byte, 2)
-            if 32 <= char_code <= 126:  # Drukowane ASCII
-                text += chr(char_code)
+def payload_from_bits(binary_string, marked=True):
+    """
+    Bity ze wszystkich zdań -> (bajty wiadomości, czy skompresowana); w strumieniu
+    oznaczonym (is_marked) pierwszy bit to flaga kompresji, w starym same bity wiadomości.
+    """
+    if not marked:
+        return binary_to_bytes(binary_string), False
+    bits, compressed = split_flag(binary_string)
+    return binary_to_bytes(bits), compressed
 
-    return text
+def binary_to_text(binary_string, marked=True):
+    """Konwertuj bity ze wszystkich zdań na tekst (UTF-8, jak w koderze)."""
+    payload, compressed = payload_from_bits(binary_string, marked)
+    if not marked:
+        # stary koder: drukowane ASCII, reszta pomijana jak w dawnym dekoderze
+        return ''.join(chr(b) for b in payload if 32 <= b <= 126)
+    # zera na końcu to dopełnienie ostatniego zdania, nie część wiadomości
+    return payload_to_text(payload, compressed).rstrip('\x00')
 
 def decode_messages(stego_sentences):
     """
@@ -113,9 +209,7 @@ def decode_messages(stego_sentences):
     print("EXTRACTING BITS FROM STEGO SENTENCES:")
     print("=" * 60)
 
-    for i, sentence in enumerate(stego_sentences, 1):
-        result = extract_bits_from_sentence(sentence)
-
+    for i, (sentence, result) in enumerate(iter_sentence_bits(stego_sentences), 1):
         if result:
             bits, emoticon, set_name = result
             all_bits += bits
@@ -132,7 +226,7 @@ def decode_messages(stego_sentences):
     print(f"{'=' * 60}\n")
 
     # Konwertuj na tekst
-    decoded_text = binary_to_text(all_bits)
+    decoded_text = binary_to_text(all_bits, is_marked(stego_sentences))
 
     return decoded_text, all_bits
 
@@ -150,7 +244,8 @@ def main():
         print(f"Default: python decode.py (uses stego_output.txt)")
         sys.exit(1)
 
-    with open(stego_file, 'r', encoding='utf-8') as f:
+    # plik skompresowany gzip/zstd jest rozpoznawany i rozpakowywany w locie
+    with open_text_input(stego_file) as f:
         stego_sentences = [line.strip() for line in f if line.strip()]
 
     print(f"\n{'=' * 60}")
@@ -1,6 +1,18 @@
 import sys
 import math
 import os
+import re
+import argparse
+import asyncio
+from pathlib import Path
+
+ROOT_DIR = str(Path(__file__).resolve().parent.parent)
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
+
+from common.framing import flag_bit, frame_payload
+from common.cover_index import load_or_build, indexed_labels
+from common.streams import open_text_output
 
 # Optimized 4-category emoticon sets - EXACTLY 16 emoticons each
 EMOTICON_SETS = {
@@ -18,7 +30,7 @@ EMOTICON_SETS = {
     ],
     'angry': [
         '😠', '😡', '🤬', '😤', '👿', '😾', '💢', '😖',
-        '😣', '😩', '😫', '🤯', '😒', '🙄', '😑', '😬'
+        '😣', '😩', '😈', '🤯', '😒', '🙄', '😑', '😬'
     ]
 }
 
@@ -26,10 +38,11 @@ def bits_to_decimal(bits):
     return int(bits, 2)
 
 def text_to_binary(text):
-    binary = ''
-    for char in text:
-        binary += format(ord(char), '08b')
-    return binary
+    # UTF-8, jak w dekoderze (ord() gubił znaki spoza latin-1: ą, ł, ż...)
+    return bytes_to_binary(text.encode('utf-8'))
+
+def bytes_to_binary(data):
+    return ''.join(format(b, '08b') for b in data)
 
 def batch_sentiment_labels_with_llm(cover_sentences):
     try:
@@ -159,78 +172,323 @@ def fallback_sentiment_batch(cover_sentences):
 
     return labels
 
-def create_stego_sentences(cover_sentences, secret_bits, sentiment_labels):
+VALID_SENTIMENTS = ('happy', 'sad', 'funny', 'angry')
+
+CHUNK_PROMPT = """You are a sentiment annotation assistant.
+Label the EMOTION category for each numbered line in the following chat.
+Available categories: happy, sad, funny, angry.
+
+INSTRUCTIONS:
+- Return ONLY the labels, one per line, as "<number>. <label>"
+- Return exactly {count} lines, numbered 1 to {count}
+- DO NOT add any commentary, headers, or explanations
+
+CRITICAL RULES:
+- Insults, curse words, hostility → angry
+- Questions or sentences with negative words (idiot, stupid, etc.) → angry
+- "Why" questions with criticism → angry
+- Passive-aggressive tone → angry or sad
+- Positive, joyful emotions → happy
+- Sorrowful, disappointed emotions → sad
+- Humorous, playful emotions → funny
+
+Chat:
+{chat}
+
+Labels:"""
+
+def build_chunk_prompt(chunk):
+    chat = '\n'.join(f"{i}. {sentence}" for i, sentence in enumerate(chunk, 1))
+    return CHUNK_PROMPT.format(count=len(chunk), chat=chat)
+
+def parse_chunk_labels(response_text, expected):
     """
-    Koduje bity używając wstępnie przeanalizowanych etykiet sentymentu.
-    sentiment_labels: lista etykiet ('happy', 'sad', 'funny', 'angry') dla każdej linii
+    Odpowiedź "1. happy\n2. sad..." -> lista etykiet.
+    Zwraca None, gdy brakuje numeru albo etykieta jest nieznana
+    (wtedy fragment idzie do ponownej próby zamiast dopełniania 'happy').
     """
-    results = []
-    bit_index = 0
-    cover_index = 0
+    labels = {}
+    for line in response_text.lower().splitlines():
+        match = re.match(r'\s*(\d+)\s*[.):-]?\s*(.*)', line)
+        if not match:
+            continue
+        number = int(match.group(1))
+        found = [label for label in VALID_SENTIMENTS if label in match.group(2)]
+        if len(found) == 1 and 1 <= number <= expected:
+            labels[number] = found[0]
+
+    if len(labels) != expected:
+        return None
+    return [labels[i] for i in range(1, expected + 1)]
+
+async def _label_chunk(client, model, chunk, semaphore, retries):
+    prompt = build_chunk_prompt(chunk)
+    for attempt in range(retries + 1):
+        try:
+            async with semaphore:
+                response = await client.chat(model=model, messages=[{'role': 'user', 'content': prompt}])
+            labels = parse_chunk_labels(response['message']['content'], len(chunk))
+            if labels is not None:
+                return labels
+        except Exception as e:
+            print(f"Warning: chunk request failed ({e}), attempt {attempt + 1}/{retries + 1}")
+    print(f"Warning: no valid labels for a chunk of {len(chunk)} lines, using keyword fallback")
+    return fallback_sentiment_batch(chunk)
+
+async def label_sentences_async(cover_sentences, chunk_size=40, concurrency=4, retries=2,
+                                host=None, model='llama3.1'):
+    """
+    Dzieli cover na fragmenty po chunk_size linii i etykietuje je równolegle
+    (najwyżej concurrency zapytań naraz). Każdy fragment jest walidowany
+    i ponawiany osobno. host=None -> OLLAMA_HOST albo domyślny localhost:11434.
+    """
+    import ollama
 
-    while bit_index < len(secret_bits):
-        # Pobierz aktualną linię cover text
-        current_cover = cover_sentences[cover_index % len(cover_sentences)]
+    client = ollama.AsyncClient(host=host)
+    semaphore = asyncio.Semaphore(concurrency)
+    chunks = [cover_sentences[i:i + chunk_size] for i in range(0, len(cover_sentences), chunk_size)]
+    results = await asyncio.gather(*(_label_chunk(client, model, chunk, semaphore, retries)
+                                     for chunk in chunks))
+    return [label for chunk_labels in results for label in chunk_labels]
 
-        # Pobierz etykietę sentymentu dla tej linii
-        emoticon_set_name = sentiment_labels[cover_index % len(cover_sentences)]
+def chunked_sentiment_labels_with_llm(cover_sentences, chunk_size=40, concurrency=4, retries=2, host=None):
+    try:
+        return asyncio.run(label_sentences_async(cover_sentences, chunk_size, concurrency, retries, host))
+    except ImportError:
+        print("Error: ollama library not installed!")
+        print("Install with: pip install ollama")
+        sys.exit(1)
 
-        emoticon_set = EMOTICON_SETS[emoticon_set_name]
-        N = len(emoticon_set)
-        n = math.floor(math.log2(N))
+class BitReader:
+    """
+    Czyta bity po n naraz z bajtów (dowolny iterable intów 0-255) albo
+    ze stringa '0101...'. Koniec wiadomości dopełniany jest zerami,
+    tak jak wcześniej w create_stego_sentences. prefix: bity czytane przed
+    źródłem (bit kompresji).
+    """
+    def __init__(self, source, prefix=''):
+        self._bit_string = prefix + source if isinstance(source, str) else None
+        self._bytes = None if isinstance(source, str) else iter(source)
+        self._pos = 0
+        self._acc = int(prefix, 2) if prefix else 0
+        self._acc_bits = len(prefix)
+
+    def read(self, n):
+        """Zwraca n bitów jako string albo None, gdy nie zostało już nic."""
+        if self._bit_string is not None:
+            chunk = self._bit_string[self._pos:self._pos + n]
+            self._pos += n
+            return chunk.ljust(n, '0') if chunk else None
+
+        while self._acc_bits < n:
+            byte = next(self._bytes, None)
+            if byte is None:
+                break
+            self._acc = (self._acc << 8) | byte
+            self._acc_bits += 8
+
+        if self._acc_bits == 0:
+            return None
+        if self._acc_bits < n:
+            self._acc <<= n - self._acc_bits
+            self._acc_bits = n
+
+        rest = self._acc_bits - n
+        value = self._acc >> rest
+        self._acc &= (1 << rest) - 1
+        self._acc_bits = rest
+        return format(value, f'0{n}b')
+
+# liczba bitów na indeks emotikony w każdym zestawie
+SET_BITS = {name: math.floor(math.log2(len(emoticons))) for name, emoticons in EMOTICON_SETS.items()}
+
+# tryb wielu slotów: k - 1 zapisane na 4 bitach pierwszej emotikony
+MAX_SLOTS = 16
+HEADER_BITS = 4
+# pierwszy bit wiadomości: 1 = skompresowana (common/framing.py), zawsze zapisywany
+FLAG_BITS = 1
+# znacznik na początku pierwszego zdania w trybie klasycznym: strumień zaczyna się
+# od bitu kompresji. Pliki sprzed niego (bez bitu) nie mają go nigdy - emotikony
+# spoza EMOTICON_SETS koder nie wstawia - i dekoder czyta je po staremu.
+# Tryb wielu slotów rozpoznaje się po nagłówku, zawsze ma bit kompresji.
+MARKER = '💬'
+
+def slot_groups(word_count, slots):
+    """
+    Granice słów 0..word_count (0 = przed pierwszym słowem, word_count = na końcu)
+    podzielone na min(slots, word_count + 1) ciągłych grup, po jednej na emotikonę.
+    Zwraca listę (pierwsza, ostatnia); emotikona stoi na pierwszej (bit 0)
+    albo ostatniej (bit 1) granicy swojej grupy.
+    """
+    boundaries = word_count + 1
+    m = min(slots, boundaries)
+    q, r = divmod(boundaries, m)
+    groups = []
+    start = 0
+    for j in range(m):
+        size = q + (1 if j < r else 0)
+        groups.append((start, start + size - 1))
+        start += size
+    return groups
+
+def slot_bits(word_count, slots, n=4):
+    """Bity zdania o word_count słowach w trybie slots emotikon (n bitów na indeks)."""
+    return sum(n + (last > first) for first, last in slot_groups(word_count, slots))
+
+def sentence_bits(sentence, slots=1, n=4):
+    """Ile bitów niesie zdanie: 6 w trybie klasycznym, slot_bits w trybie wielu slotów."""
+    if slots == 1:
+        return n + 2
+    return slot_bits(len(sentence.split()), slots, n)
+
+def sentences_needed(cover_sentences, bit_count, slots=1):
+    """
+    Ile pierwszych zdań cover wystarczy na bit_count bitów (z nagłówkiem trybu
+    i bitem kompresji);
+    tylko je trzeba etykietować. Gdy cover jest za krótki - wszystkie
+    (koder zaczyna wtedy zdania od nowa).
+    """
+    n = min(SET_BITS.values())
+    needed = bit_count + FLAG_BITS + (HEADER_BITS if slots > 1 else 0)
+    for i, sentence in enumerate(cover_sentences, 1):
+        needed -= sentence_bits(sentence, slots, n)
+        if needed <= 0:
+            return i
+    return len(cover_sentences)
+
+def _place_emoticons(sentence, emoticon_set, n, slots, bits):
+    """Wstaw emotikony w granice słów; bits ma dokładnie slot_bits(...) bitów."""
+    words = sentence.split()
+    placed = {}
+    pos = 0
+    emoticons = []
+    for first, last in slot_groups(len(words), slots):
+        d = min(bits_to_decimal(bits[pos:pos + n]), len(emoticon_set) - 1)
+        pos += n
+        boundary = first
+        if last > first:
+            boundary = last if bits[pos] == '1' else first
+            pos += 1
+        placed[boundary] = emoticon_set[d]
+        emoticons.append(emoticon_set[d])
+    tokens = []
+    for i in range(len(words) + 1):
+        if i in placed:
+            tokens.append(placed[i])
+        if i < len(words):
+            tokens.append(words[i])
+    return ' '.join(tokens), emoticons
+
+def iter_stego_sentences(cover_sentences, secret, sentiment_labels, verbose=False, slots=1,
+                         compressed=False):
+    """
+    Generator zdań stego: dla każdej linii cover pobiera z BitReadera n + 2 bity
+    (indeks emotikony, bit pozycji, bit przecinka).
+    slots > 1: do slots emotikon na zdanie w granicach słów (slot_groups), każda
+    niesie n bitów indeksu i bit pozycji w swojej grupie; indeks pierwszej
+    emotikony pierwszego zdania to slots - 1 (dekoder rozpoznaje tryb sam).
+    slots = 1: pierwsze zdanie zaczyna się od MARKER.
+    secret: BitReader (czytający już bit kompresji), bajty albo string bitów;
+    przed bajtami / bitami zapisywany jest bit kompresji (compressed).
+    Zwraca pary (zdanie, rekord); rekord (słownik z detalami) tylko gdy verbose=True,
+    w przeciwnym razie None.
+    """
+    if not 1 <= slots <= MAX_SLOTS:
+        raise ValueError(f"slots must be between 1 and {MAX_SLOTS}")
+    reader = secret if isinstance(secret, BitReader) else BitReader(secret, flag_bit(compressed))
+    cover_count = len(cover_sentences)
+    cover_index = 0
 
-        # Sprawdź czy mamy wystarczająco bitów
-        bits_needed = n + 2
+    while True:
+        # Pobierz aktualną linię cover text i jej etykietę sentymentu
+        current_cover = cover_sentences[cover_index % cover_count]
+        emoticon_set_name = sentiment_labels[cover_index % cover_count]
 
-        if bit_index + bits_needed > len(secret_bits):
-            remaining = secret_bits[bit_index:]
-            secret_bits += '0' * (bits_needed - len(remaining))
+        emoticon_set = EMOTICON_SETS[emoticon_set_name]
+        n = SET_BITS[emoticon_set_name]
+
+        if slots > 1:
+            header = format(slots - 1, f'0{n}b') if cover_index == 0 else ''
+            chunk = reader.read(sentence_bits(current_cover, slots, n) - len(header))
+            if chunk is None:
+                return
+            stego, emoticons = _place_emoticons(current_cover, emoticon_set, n, slots, header + chunk)
+            emoticon = ' '.join(emoticons)
+        else:
+            chunk = reader.read(n + 2)
+            if chunk is None:
+                return
 
-        # Wyciągnij bity
-        emoticon_bits = secret_bits[bit_index:bit_index+n]
-        position_bit = secret_bits[bit_index+n] if bit_index+n < len(secret_bits) else '0'
-        punct_bit = secret_bits[bit_index+n+1] if bit_index+n+1 < len(secret_bits) else '0'
+            emoticon_bits = chunk[:n]
+            position_bit = chunk[n]
+            punct_bit = chunk[n + 1]
 
-        # Wybierz emotikonę
-        d = bits_to_decimal(emoticon_bits)
-        if d >= N:
-            d = N - 1
-        emoticon = emoticon_set[d]
+            # Wybierz emotikonę
+            d = min(bits_to_decimal(emoticon_bits), len(emoticon_set) - 1)
+            emoticon = emoticon_set[d]
 
-        # Pozycja (0=start, 1=end)
-        position = 'end' if position_bit == '1' else 'start'
+            # Interpunkcja (0=with comma, 1=without)
+            punctuation = '' if punct_bit == '1' else ','
 
-        # Interpunkcja (0=with comma, 1=without)
-        punctuation = '' if punct_bit == '1' else ','
+            # Pozycja (0=start, 1=end)
+            if position_bit == '0':
+                stego = f"{emoticon}{punctuation} {current_cover}"
+            else:
+                stego = f"{current_cover} {punctuation}{emoticon}"
+            if cover_index == 0:
+                stego = f"{MARKER} {stego}"
+
+        record = None
+        if verbose:
+            record = {
+                'sentence': stego,
+                'bits_embedded': chunk,
+                'bits_count': len(chunk),
+                'emoticon': emoticon,
+                'set': emoticon_set_name,
+                'cover_used': current_cover
+            }
+        yield stego, record
 
-        # Zbuduj stego zdanie
-        if position == 'start':
-            stego = f"{emoticon}{punctuation} {current_cover}"
-        else:
-            stego = f"{current_cover} {punctuation}{emoticon}"
-
-        results.append({
-            'sentence': stego,
-            'bits_embedded': emoticon_bits + position_bit + punct_bit,
-            'bits_count': len(emoticon_bits + position_bit + punct_bit),
-            'emoticon': emoticon,
-            'set': emoticon_set_name,
-            'cover_used': current_cover
-        })
-
-        bit_index += bits_needed
         cover_index += 1
 
-    return results
+def create_stego_sentences(cover_sentences, secret_bits, sentiment_labels, slots=1,
+                           compressed=False):
+    """
+    Koduje bity używając wstępnie przeanalizowanych etykiet sentymentu.
+    sentiment_labels: lista etykiet ('happy', 'sad', 'funny', 'angry') dla każdej linii
+    slots: emotikony na zdanie (1 = tryb klasyczny, patrz iter_stego_sentences)
+    compressed: secret_bits to wiadomość po frame_payload
+    Zwraca listę rekordów; do dużych wejść lepiej użyć iter_stego_sentences.
+    """
+    return [record for _, record in
+            iter_stego_sentences(cover_sentences, secret_bits, sentiment_labels, verbose=True,
+                                 slots=slots, compressed=compressed)]
 
 def main():
-    # Parametry
-    if len(sys.argv) >= 3:
-        cover_file = sys.argv[1]
-        secret_file = sys.argv[2]
-    else:
-        cover_file = 'cover.txt'
-        secret_file = 'secret.txt'
+    parser = argparse.ArgumentParser(description='Emoticon steganography - encoder')
+
+    parser.add_argument('cover_file', nargs='?', default='cover.txt', help='Cover chat, one message per line')
+    parser.add_argument('secret_file', nargs='?', default='secret.txt', help='Secret message file')
+    parser.add_argument('-o', '--output', default='stego_output.txt',
+                        help='Output stego file (.gz / .zst: written compressed)')
+    parser.add_argument('--compress', action='store_true', help='Compress the secret before embedding')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Print every stego sentence')
+    parser.add_argument('--chunk-size', type=int, default=40,
+                        help='Cover lines per LLM request (0 = whole cover in one request)')
+    parser.add_argument('--concurrency', type=int, default=4, help='Parallel LLM requests')
+    parser.add_argument('--retries', type=int, default=2, help='Retries per chunk before keyword fallback')
+    parser.add_argument('--host', help='Ollama server URL (default: $OLLAMA_HOST or localhost:11434)')
+    parser.add_argument('--index', action='store_true',
+                        help='Reuse sentiment labels stored in the cover index (built on first use)')
+    parser.add_argument('--slots', type=int, default=1,
+                        help=f'Emoticons per sentence at word boundaries (1-{MAX_SLOTS}, 1 = classic mode)')
+
+    args = parser.parse_args()
+    if not 1 <= args.slots <= MAX_SLOTS:
+        parser.error(f"--slots must be between 1 and {MAX_SLOTS}")
+    cover_file = args.cover_file
+    secret_file = args.secret_file
 
     # Wczytaj cover sentences
     if not os.path.exists(cover_file):
@@ -252,44 +510,68 @@ def main():
     with open(secret_file, 'r', encoding='utf-8') as f:
         secret_message = f.read().strip()
 
-    # Konwertuj na binarny
-    secret_bits = text_to_binary(secret_message)
+    # Bajty wiadomości: UTF-8 (polskie znaki bez strat), opcjonalnie skompresowane
+    secret_bytes = secret_message.encode('utf-8')
+    if args.compress:
+        secret_bytes = frame_payload(secret_bytes)
 
     print(f"\n{'=' * 60}")
     print("STEGANOGRAPHY WITH BATCH SENTIMENT ANALYSIS")
     print(f"{'=' * 60}")
     print(f"\nCover sentences (from {cover_file}): {len(cover_sentences)} messages")
-    print(f"Secret message (from {secret_file}): {secret_message}")
-    print(f"Secret in binary: {secret_bits}")
-    print(f"Total bits to embed: {len(secret_bits)}")
+    print(f"Secret message (from {secret_file}): {len(secret_message)} chars")
+    if args.verbose:
+        print(f"Secret: {secret_message}")
+        print(f"Secret in binary: {bytes_to_binary(secret_bytes)}")
+    print(f"Total bits to embed: {len(secret_bytes) * 8}")
     print(f"\nEmoticon sets: 4 categories × 16 emoticons each = 64 total")
     print(f"Bits per emoticon: 4 (log2(16) = 4)")
+    if args.slots > 1:
+        print(f"Slots: up to {args.slots} emoticons per sentence")
+
+    # etykietujemy tylko zdania, które faktycznie poniosą bity
+    used = sentences_needed(cover_sentences, len(secret_bytes) * 8, args.slots)
+    print(f"Cover sentences needed: {used} of {len(cover_sentences)}")
+    cover_sentences = cover_sentences[:used]
     print(f"\nUsing: llama3.1")
 
-    sentiment_labels = batch_sentiment_labels_with_llm(cover_sentences)
+    if args.index:
+        with open(cover_file, 'rb') as f:
+            cover_bytes = f.read()
+        # etykiety liczone przy pierwszym użyciu tymi samymi ustawieniami LLM co bez --index
+        options = {'chunk_size': args.chunk_size, 'concurrency': args.concurrency,
+                   'retries': args.retries, 'host': args.host}
+        with load_or_build(cover_bytes, 'algo3', {'labeller': 'llm'}, options) as index:
+            sentiment_labels = indexed_labels(index)[:used]
+    elif args.chunk_size > 0:
+        sentiment_labels = chunked_sentiment_labels_with_llm(
+            cover_sentences, args.chunk_size, args.concurrency, args.retries, args.host)
+    else:
+        sentiment_labels = batch_sentiment_labels_with_llm(cover_sentences)
 
     # Koduj wiadomość
     print(f"\n{'=' * 60}")
     print("ENCODING MESSAGE")
     print(f"{'=' * 60}")
-    results = create_stego_sentences(cover_sentences, secret_bits, sentiment_labels)
-
-    print(f"\n{'=' * 60}")
-    print("STEGO SENTENCES (CHAT MESSAGES):")
-    print(f"{'=' * 60}")
 
-    with open('stego_output.txt', 'w', encoding='utf-8') as f:
-        for i, result in enumerate(results, 1):
-            print(f"\nMessage {i}:")
-            print(f"  Original: {result['cover_used']}")
-            print(f"  Stego: {result['sentence']}")
-            print(f"  Emoticon: {result['emoticon']} (from '{result['set']}' set)")
-            print(f"  Bits: {result['bits_embedded']} ({result['bits_count']} bits)")
-            f.write(result['sentence'] + '\n')
+    count = 0
+    # .gz / .zst: kompresja w locie, nieskompresowany plik nie powstaje
+    with open_text_output(args.output) as f:
+        for stego, result in iter_stego_sentences(cover_sentences, secret_bytes,
+                                                  sentiment_labels, verbose=args.verbose,
+                                                  slots=args.slots, compressed=args.compress):
+            count += 1
+            if result is not None:
+                print(f"\nMessage {count}:")
+                print(f"  Original: {result['cover_used']}")
+                print(f"  Stego: {result['sentence']}")
+                print(f"  Emoticon: {result['emoticon']} (from '{result['set']}' set)")
+                print(f"  Bits: {result['bits_embedded']} ({result['bits_count']} bits)")
+            f.write(stego + '\n')
 
     print(f"\n{'=' * 60}")
-    print(f"Total messages created: {len(results)}")
-    print(f"Stego sentences saved to: stego_output.txt")
+    print(f"Total messages created: {count}")
+    print(f"Stego sentences saved to: {args.output}")
 
 if __name__ == "__main__":
     main()
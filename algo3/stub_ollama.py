@@ -0,0 +1,87 @@
+"""
+Local stand-in for the ollama server, for running the chunked labeller offline.
+
+    python stub_ollama.py --port 11435 --delay 0.2 --fail-rate 0.3
+    python encode.py --host http://127.0.0.1:11435 cover.txt secret.txt
+
+Answers POST /api/chat with keyword-based labels in the "<n>. <label>" format.
+--fail-rate drops a label from that share of responses, so retries and the
+per-chunk validation get exercised.
+"""
+import argparse
+import json
+import random
+import re
+import sys
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+ROOT_DIR = str(Path(__file__).resolve().parent.parent)
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
+
+from common.algorithms import load
+
+fallback_sentiment_batch = load('algo3', 'encode').fallback_sentiment_batch
+
+
+class StubOllamaHandler(BaseHTTPRequestHandler):
+    delay = 0.0
+    fail_rate = 0.0
+
+    def do_POST(self):
+        if self.path != '/api/chat':
+            self.send_error(404)
+            return
+
+        request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+        prompt = request['messages'][-1]['content']
+        chat = prompt.split('Chat:', 1)[-1].split('Labels:', 1)[0]
+        lines = [m.group(1) for m in re.finditer(r'^\d+\. (.*)$', chat, re.MULTILINE)]
+
+        labels = fallback_sentiment_batch(lines)
+        content = '\n'.join(f"{i}. {label}" for i, label in enumerate(labels, 1))
+        if labels and random.random() < self.fail_rate:
+            content = content.rsplit('\n', 1)[0] if len(labels) > 1 else 'not sure'
+
+        time.sleep(self.delay)
+        body = json.dumps({
+            'model': request.get('model', 'stub'),
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'message': {'role': 'assistant', 'content': content},
+            'done': True,
+        }).encode('utf-8')
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stub ollama server for algo3')
+
+    parser.add_argument('--port', type=int, default=11435, help='Port to listen on')
+    parser.add_argument('--delay', type=float, default=0.0, help='Seconds to wait per request')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='Share of malformed responses')
+
+    args = parser.parse_args()
+
+    StubOllamaHandler.delay = args.delay
+    StubOllamaHandler.fail_rate = args.fail_rate
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), StubOllamaHandler)
+    print(f"Stub ollama on http://127.0.0.1:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,39 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+
+ROOT_DIR = str(Path(__file__).resolve().parent.parent)
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
+
+from common.buffers import read_source
+
 def sum_of_squares_of_digits(r: int) -> int:
     return sum((int(d)**2) for d in str(r))
 
+# x*y from the digit-square sum s = 10x + y of every key byte r
+MIX = np.array([(s // 10) * (s % 10) for s in map(sum_of_squares_of_digits, range(256))], dtype=np.uint8)
+
 def decipher_one_time_pad(ciphertext: bytes, key: bytes) -> bytes:
     if len(ciphertext) != len(key):
         raise ValueError("Ciphertext and key lengths differ.")
-    plain = []
-    for e, r in zip(ciphertext, key):
-        s = sum_of_squares_of_digits(r)
-        x = s // 10
-        y = s % 10
-        n = (e - r + (x*y)) % 256
-        plain.append(n)
-    return bytes(plain)
+    e = np.frombuffer(bytes(ciphertext), dtype=np.uint8)
+    r = np.frombuffer(bytes(key), dtype=np.uint8)
+    # uint8 arithmetic wraps around, i.e. is mod 256
+    return (e - r + MIX[r]).tobytes()
+
+def unpack_key(source):
+    # source: path, bytes, memoryview, mmap or binary stream with key.bin contents
+    data = read_source(source)
+    otp_len = int.from_bytes(data[:4], "big")
+    return bytes(data[4:4+otp_len]), bytes(data[4+otp_len:])
 
 if __name__ == "__main__":
     # Load files
     with open("stego_text.txt", "r", encoding="utf-8") as f:
         stego_text = f.read()
-    with open("key.bin", "rb") as f:
-        data = f.read()
-
-    otp_len = int.from_bytes(data[:4], "big")
-    otp_key = data[4:4+otp_len]
-    cipher = data[4+otp_len:]
+    otp_key, cipher = unpack_key("key.bin")
 
     # Decrypt
     plaintext_bytes = decipher_one_time_pad(cipher, otp_key)
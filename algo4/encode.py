@@ -1,29 +1,71 @@
-import random
+import sys
+from pathlib import Path
+
+import numpy as np
+
+ROOT_DIR = str(Path(__file__).resolve().parent.parent)
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
+
+from common.buffers import write_sink
+
+POOL_SIZE = 1000
+BATCH_SIZE = 1 << 16
 
 def sum_of_squares_of_digits(r: int) -> int:
     return sum((int(d)**2) for d in str(r))
 
+# x*y from the digit-square sum s = 10x + y of every key byte r
+MIX = np.array([(s // 10) * (s % 10) for s in map(sum_of_squares_of_digits, range(256))], dtype=np.uint8)
+
+def key_stream(n: int, rng_seed=None) -> np.ndarray:
+    """
+    n key bytes from a generator private to this call, so concurrent
+    encodes never share state. The format, fixed for a given seed:
+
+      rng = numpy.random.default_rng(rng_seed)          (PCG64)
+      pool = rng.integers(0, 256, POOL_SIZE, dtype=uint8)
+      per batch of up to BATCH_SIZE bytes:
+          idx = rng.integers(0, POOL_SIZE, size, dtype=uint16)
+          new = rng.integers(0, 256, size, dtype=uint8)
+          key[t] = pool[idx[t]], then pool[idx[t]] = new[t]
+
+    i.e. the original scheme (a random pool entry is used and refilled),
+    drawn in batches. Keys from the old random.seed() streams differ.
+    """
+    rng = np.random.default_rng(rng_seed)
+    pool = rng.integers(0, 256, POOL_SIZE, dtype=np.uint8)
+    key = np.empty(n, dtype=np.uint8)
+    for start in range(0, n, BATCH_SIZE):
+        size = min(BATCH_SIZE, n - start)
+        idx = rng.integers(0, POOL_SIZE, size, dtype=np.uint16)
+        new = rng.integers(0, 256, size, dtype=np.uint8)
+        # group the draws by pool entry: each one reads what the previous
+        # draw of the same entry wrote, the first one reads the pool
+        order = np.argsort(idx, kind='stable')
+        sorted_idx = idx[order]
+        first = np.ones(size, dtype=bool)
+        first[1:] = sorted_idx[1:] != sorted_idx[:-1]
+        values = np.where(first, pool[sorted_idx], np.roll(new[order], 1))
+        key[start + order] = values
+        last = np.ones(size, dtype=bool)
+        last[:-1] = first[1:]
+        pool[sorted_idx[last]] = new[order][last]
+    return key
+
 def encipher_one_time_pad(plaintext: bytes, rng_seed=None):
-    if rng_seed is not None:
-        random.seed(rng_seed)
-    A = [random.randrange(256) for _ in range(1000)]
-    cipher, key = [], []
-    for b in plaintext:
-        i = random.randrange(len(A))
-        r = A[i]
-        key.append(r)
-        A[i] = random.randrange(256)
-        s = sum_of_squares_of_digits(r)
-        x = s // 10
-        y = s % 10
-        e = (b - (x*y) + r) % 256
-        cipher.append(e)
-    return bytes(cipher), bytes(key)
-
-def missing_letter_hide(ciphertext: bytes, cover_text: str, rng_seed=None):
-    if rng_seed is not None:
-        random.seed(rng_seed)
-    words = cover_text.split()
+    """Returns (cipher, key); e = (b - x*y + r) mod 256 for every byte b and key byte r."""
+    key = key_stream(len(plaintext), rng_seed)
+    plain = np.frombuffer(bytes(plaintext), dtype=np.uint8)
+    # uint8 arithmetic wraps around, i.e. is mod 256
+    cipher = plain - MIX[key] + key
+    return cipher.tobytes(), key.tobytes()
+
+def missing_letter_hide(ciphertext: bytes, cover_text: str, rng_seed=None, words=None):
+    # words: precomputed cover_text.split(), e.g. from common.cover_index.indexed_words
+    # rng_seed: kept for existing callers; hiding draws no random numbers
+    if words is None:
+        words = cover_text.split()
     new_words = []
     w_index = 0
 
@@ -43,6 +85,12 @@ def missing_letter_hide(ciphertext: bytes, cover_text: str, rng_seed=None):
     new_words.extend(words[w_index:])
     return " ".join(new_words)
 
+def pack_key(otp_key: bytes, cipher: bytes, sink=None):
+    # key.bin layout: u32 key length | key | ciphertext
+    # sink: path, binary stream, writable buffer, or None to get the bytes back
+    data = len(otp_key).to_bytes(4, "big") + otp_key + cipher
+    return write_sink(data, sink)
+
 SHAKESPEARE_SONNET_18 = """Shall I compare thee to a summer’s day?
 Thou art more lovely and more temperate:
 Rough winds do shake the darling buds of May,
@@ -69,10 +117,7 @@ if __name__ == "__main__":
         f.write(stego_text)
 
     # Combine key + ciphertext into one file
-    with open("key.bin", "wb") as f:
-        f.write(len(otp_key).to_bytes(4, "big"))
-        f.write(otp_key)
-        f.write(cipher)
+    pack_key(otp_key, cipher, "key.bin")
 
     print("\n✅ Saved 'stego_text.txt' and 'key.bin'")
     print("Preview:\n")
@@ -1,14 +1,28 @@
 import sys
+import re
 import argparse
+import itertools
 from pathlib import Path
 
+ROOT_DIR = str(Path(__file__).resolve().parent.parent)
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
+
+from common.algorithms import load
+from common.framing import payload_to_text, split_flag
+from common.streams import open_input, open_text_input
+
+# the letter classes are defined once, in encode.py
+PARTITIONS = load('algo5', 'encode').PARTITIONS
+
 
 class FeatureCodingSteganography:
-    def __init__(self):
-        self.categories = {
-            'CF1': list('aeiou'),
-            'CF2': list('bcdfghjklmnpqrstvwxyz'),
-        }
+    def __init__(self, classes=2):
+        if classes not in PARTITIONS:
+            raise ValueError(f"classes must be one of {sorted(PARTITIONS)}")
+        self.classes = classes
+        self.bits_per_letter = classes.bit_length() - 1
+        self.categories = {f'CF{i + 1}': list(letters) for i, letters in enumerate(PARTITIONS[classes])}
 
         self.char_to_category = {}
         for cat_name, chars in self.categories.items():
@@ -16,49 +30,154 @@ class FeatureCodingSteganography:
                 self.char_to_category[char] = cat_name
 
     def decode(self, stego_text):
-        transformed = []
-
-        for i, char in enumerate(stego_text):
-            char_lower = char.lower()
-            if char.isupper() and char_lower in self.char_to_category:
-                category = self.char_to_category[char_lower]
-                transformed.append((i, char_lower, category))
+        # capital letter -> class number; class step -> its bits
+        numbers = {char.upper(): i for i, chars in enumerate(self.categories.values()) for char in chars}
+        step_bits = [format(step, f'0{self.bits_per_letter}b') for step in range(self.classes)]
+        transformed = [numbers[char] for char in stego_text if char in numbers]
 
         if len(transformed) < 2:
             return None
 
-        current_state = transformed[0][2]
-        decoded_bits = []
-
-        for i in range(1, len(transformed)):
-            next_state = transformed[i][2]
-
-            if next_state == current_state:
-                decoded_bits.append('0')
-            else:
-                decoded_bits.append('1')
-                current_state = next_state
+        return ''.join(step_bits[(next_state - current_state) % self.classes]
+                       for current_state, next_state in zip(transformed, transformed[1:]))
+
+    def first_letter(self, stego):
+        """First transformable letter, in either case, of stego (str, bytes or mmap); None if there is none."""
+        letters = ''.join(self.char_to_category)
+        pattern = f'[{letters}{letters.upper()}]'
+        m = re.search(pattern if isinstance(stego, str) else pattern.encode('ascii'), stego)
+        return m and m.group()
+
+    def marked(self, stego):
+        """
+        Whether a stego text starts with the compression flag. The encoder marks
+        it by leaving the first transformable letter lowercase; encoders from
+        before the flag capitalised that letter first.
+        """
+        letter = self.first_letter(stego)
+        return letter is None or letter.islower()
+
+    def payload(self, bits, marked=True):
+        """
+        Bit stream from decode() -> (message bytes, compressed). In a marked
+        stream the first bit is the compression flag; the last byte is
+        zero-padded with two classes, with 4 or 8 the encoder's padding of the
+        last step is dropped. An unmarked stream is read the old way: every
+        bit is message, one latin-1 character per byte (returned as UTF-8).
+        """
+        compressed = False
+        if marked:
+            bits, compressed = split_flag(bits)
+        if self.classes > 2:
+            bits = bits[:len(bits) - len(bits) % 8]
+        else:
+            bits += '0' * (-len(bits) % 8)
+        data = bytes(int(bits[i:i + 8], 2) for i in range(0, len(bits), 8))
+        return (data if marked else _legacy_text(data)), compressed
+
+    def byte_table(self):
+        """
+        Lookup table byte -> category number (1, 2, ...) for uppercase ASCII
+        letters, 0 for everything else. UTF-8 continuation bytes are >= 0x80,
+        so they can never be mistaken for a letter.
+        """
+        np = _numpy()
+        table = np.zeros(256, dtype=np.uint8)
+        numbers = {name: i + 1 for i, name in enumerate(self.categories)}
+        for char, cat_name in self.char_to_category.items():
+            table[ord(char.upper())] = numbers[cat_name]
+        return table
+
+    def decode_chunks(self, chunks):
+        """
+        Vectorized decode over an iterable of byte chunks.
+        Yields uint8 arrays of bits; the category of the last uppercase letter
+        is carried over so a transition split across chunks is not lost.
+        """
+        np = _numpy()
+        table = self.byte_table()
+        last = 0
+
+        for chunk in chunks:
+            cats = table[np.frombuffer(chunk, dtype=np.uint8)]
+            cats = cats[cats != 0]
+            if cats.size == 0:
+                continue
+
+            if last:
+                cats = np.concatenate((np.array([last], dtype=np.uint8), cats))
+            last = cats[-1]
+            if self.classes == 2:
+                yield (np.diff(cats) != 0).view(np.uint8)
+                continue
+            steps = (np.diff(cats.astype(np.int16)) % self.classes).astype(np.uint8)
+            # class step -> its bits_per_letter bits, MSB first
+            bits = np.unpackbits(steps[:, None], axis=1)[:, 8 - self.bits_per_letter:]
+            yield bits.reshape(-1)
+
+    def decode_file(self, f, chunk_size=1 << 20):
+        """
+        Decode a binary file object in chunks of chunk_size bytes.
+        Returns (message bytes, compressed) like payload(), or None when
+        fewer than two transformed letters exist.
+        """
+        np = _numpy()
+        out = bytearray()
+        pending = np.zeros(0, dtype=np.uint8)
+        total = 0
+
+        chunks = iter(lambda: f.read(chunk_size), b'')
+        # the chunks up to the first transformable letter tell whether the stream is marked
+        head = []
+        for chunk in chunks:
+            head.append(chunk)
+            if self.first_letter(chunk) is not None:
+                break
+        marked = self.marked(b''.join(head))
+        flag = None if marked else False
+
+        for bits in self.decode_chunks(itertools.chain(head, chunks)):
+            total += bits.size
+            if flag is None and bits.size:
+                flag, bits = bool(bits[0]), bits[1:]
+            if pending.size:
+                bits = np.concatenate((pending, bits))
+            usable = bits.size - bits.size % 8
+            out += np.packbits(bits[:usable]).tobytes()
+            pending = bits[usable:]
+
+        if total == 0:
+            return None
+        if pending.size and self.classes == 2:
+            out += np.packbits(pending).tobytes()
+        return (bytes(out) if marked else _legacy_text(bytes(out))), flag
 
-        return ''.join(decoded_bits)
 
+def _legacy_text(data):
+    """Message bytes of an unmarked stream (one latin-1 character each) as UTF-8."""
+    return data.decode('latin-1').encode('utf-8')
 
-def binary_to_text(binary_str):
-    if len(binary_str) % 8 != 0:
-        binary_str = binary_str + '0' * (8 - len(binary_str) % 8)
 
-    text = ""
-    for i in range(0, len(binary_str), 8):
-        byte = binary_str[i:i+8]
-        text += chr(int(byte, 2))
-    return text
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("numpy is required for chunked decoding (pip install numpy)")
+    return numpy
 
 
 def main():
     parser = argparse.ArgumentParser(description='Feature Coding Steganography - Decoder')
 
-    parser.add_argument('-i', '--input', required=True, help='Input stego file')
+    parser.add_argument('-i', '--input', required=True,
+                        help='Input stego file (gzip / zstd compressed files are detected)')
     parser.add_argument('-o', '--output', help='Output file for decoded message')
     parser.add_argument('-v', '--verbose', action='store_true', help='Verbose output')
+    parser.add_argument('--chunk-size', type=int, default=1 << 20,
+                        help='Bytes per chunk for the vectorized decoder (default: 1 MiB)')
+    parser.add_argument('--no-numpy', action='store_true', help='Use the plain Python decoder')
+    parser.add_argument('-k', '--classes', type=int, choices=sorted(PARTITIONS), default=2,
+                        help='Letter classes the message was encoded with')
 
     args = parser.parse_args()
 
@@ -68,24 +187,42 @@ def main():
             print(f"Error: File '{args.input}' not found!", file=sys.stderr)
             sys.exit(1)
 
-        with open(input_path, 'r', encoding='utf-8') as f:
-            stego_text = f.read()
-
-        if not stego_text:
+        if input_path.stat().st_size == 0:
             print("Error: File is empty!", file=sys.stderr)
             sys.exit(1)
 
         if args.verbose:
-            print(f"Input: {len(stego_text)} chars")
-
-        stego = FeatureCodingSteganography()
-        decoded_binary = stego.decode(stego_text)
+            print(f"Input: {input_path.stat().st_size} bytes")
+
+        stego = FeatureCodingSteganography(args.classes)
+
+        use_numpy = not args.no_numpy
+        if use_numpy:
+            try:
+                _numpy()
+            except ImportError:
+                use_numpy = False
+
+        if use_numpy:
+            # compressed input is decompressed chunk by chunk
+            with open_input(input_path) as f:
+                decoded = stego.decode_file(f, args.chunk_size)
+            if decoded is None:
+                print("Error: No hidden message found!", file=sys.stderr)
+                sys.exit(1)
+            secret_text = payload_to_text(*decoded)
+            decoded_bits = len(decoded[0]) * 8
+        else:
+            with open_text_input(input_path) as f:
+                stego_text = f.read()
+            decoded_binary = stego.decode(stego_text)
 
-        if not decoded_binary:
-            print("Error: No hidden message found!", file=sys.stderr)
-            sys.exit(1)
+            if not decoded_binary:
+                print("Error: No hidden message found!", file=sys.stderr)
+                sys.exit(1)
 
-        secret_text = binary_to_text(decoded_binary)
+            secret_text = payload_to_text(*stego.payload(decoded_binary, stego.marked(stego_text)))
+            decoded_bits = len(decoded_binary)
 
         if args.output:
             output_path = Path(args.output)
@@ -99,7 +236,7 @@ def main():
                 print(f"Decoded to: {args.output}")
         else:
             if args.verbose:
-                print(f"Binary: {len(decoded_binary)} bits")
+                print(f"Binary: {decoded_bits} bits")
                 print(f"Message: {len(secret_text)} chars")
                 print()
 
@@ -1,73 +1,178 @@
 import sys
 import argparse
+import array
 from pathlib import Path
 
+ROOT_DIR = str(Path(__file__).resolve().parent.parent)
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
+
+from common.framing import flag_bit, frame_payload
+from common.cover_index import load_or_build, IndexedTransformable
+from common.streams import open_text_input, open_text_output
+
+# Letter classes for k = 2, 4 and 8. Moving from a letter of class a to the
+# next capitalised letter, of class b, carries the log2(k) bits of (b - a) mod k.
+# k = 2 is the original vowel/consonant scheme (0: same class, 1: the other);
+# the larger partitions spread the frequent letters evenly over the classes.
+PARTITIONS = {
+    2: ('aeiou', 'bcdfghjklmnpqrstvwxyz'),
+    4: ('efghqrx', 'djstwyz', 'aklmnp', 'bciouv'),
+    8: ('efg', 'twy', 'amp', 'oub', 'icv', 'nlk', 'sdjz', 'hrxq'),
+}
+
+
 class FeatureCodingSteganography:
-    def __init__(self):
-        self.categories = {
-            'CF1': list('aeiou'),
-            'CF2': list('bcdfghjklmnpqrstvwxyz'),
-        }
+    def __init__(self, classes=2):
+        if classes not in PARTITIONS:
+            raise ValueError(f"classes must be one of {sorted(PARTITIONS)}")
+        self.classes = classes
+        self.bits_per_letter = classes.bit_length() - 1
+        self.categories = {f'CF{i + 1}': list(letters) for i, letters in enumerate(PARTITIONS[classes])}
 
         self.char_to_category = {}
         for cat_name, chars in self.categories.items():
             for char in chars:
                 self.char_to_category[char] = cat_name
 
-    def find_transformable(self, text):
-        transformable = []
-        for i, char in enumerate(text):
-            if char in self.char_to_category:
-                category = self.char_to_category[char]
-                transformable.append((i, char, category))
-        return transformable
+        # lowercase letter -> class number
+        self.letter_numbers = {char: i for i, chars in enumerate(self.categories.values())
+                               for char in chars}
+
+    def letter_classes(self, text):
+        """
+        Positions and class numbers of the transformable letters, as numpy
+        arrays, or array.array ('q' and 'B') without numpy.
+        """
+        np = _numpy()
+        if np is None:
+            numbers = self.letter_numbers
+            found = [(pos, numbers[char]) for pos, char in enumerate(text) if char in numbers]
+            return (array.array('q', [pos for pos, _ in found]),
+                    array.array('B', [number for _, number in found]))
+        # code point -> class number + 1 (0: not transformable)
+        table = np.zeros(256, dtype=np.uint8)
+        for char, number in self.letter_numbers.items():
+            table[ord(char)] = number + 1
+        codes = np.frombuffer(text.encode('utf-32-le', 'surrogatepass'), dtype='<u4')
+        numbers = table[np.minimum(codes, 255)]
+        positions = np.flatnonzero(numbers)
+        return positions, numbers[positions] - 1
 
-    def encode(self, cover_text, secret_binary):
-        transformable = self.find_transformable(cover_text)
+    def find_transformable(self, text):
+        names = list(self.categories)
+        positions, numbers = self.letter_classes(text)
+        return [(pos, text[pos], names[number])
+                for pos, number in zip(positions.tolist(), numbers.tolist())]
+
+    def symbols(self, secret_binary):
+        """Bits -> class steps of bits_per_letter bits, the last one zero-padded."""
+        b = self.bits_per_letter
+        padded = secret_binary + '0' * (-len(secret_binary) % b)
+        return [int(padded[i:i + b], 2) for i in range(0, len(padded), b)]
+
+    def _class_arrays(self, transformable):
+        if hasattr(transformable, 'positions'):  # IndexedTransformable: arrays already there
+            positions, numbers = transformable.positions, transformable.categories
+        else:
+            names = {name: i for i, name in enumerate(self.categories)}
+            positions = [pos for pos, _, _ in transformable]
+            numbers = [names[cat] for _, _, cat in transformable]
+        np = _numpy()
+        if np is None:
+            return list(positions), list(numbers)
+        return np.asarray(positions, dtype=np.int64), np.asarray(numbers, dtype=np.uint8)
+
+    def _following(self, numbers):
+        """following[c][i]: first letter of class c at index >= i (n: none left)."""
+        n = len(numbers)
+        np = _numpy()
+        if np is None:
+            following = []
+            for c in range(self.classes):
+                row = [n] * (n + 1)
+                nearest = n
+                for i in range(n - 1, -1, -1):
+                    if numbers[i] == c:
+                        nearest = i
+                    row[i] = nearest
+                following.append(row)
+            return following
+        index = np.arange(n)
+        following = []
+        for c in range(self.classes):
+            candidates = np.where(numbers == c, index, n)
+            row = np.empty(n + 1, dtype=np.int64)
+            row[:n] = np.minimum.accumulate(candidates[::-1])[::-1]
+            row[n] = n
+            following.append(row)
+        return following
+
+    def encode(self, cover_text, secret_binary, transformable=None, compressed=False):
+        # transformable: precomputed find_transformable() result, e.g. from a cover index
+        # the first embedded bit is always the compression flag (common.framing); the
+        # first transformable letter stays lowercase to mark that, since encoders
+        # without the flag started every message by capitalising it
+        secret_binary = flag_bit(compressed) + secret_binary
+        if transformable is None:
+            positions, numbers = self.letter_classes(cover_text)
+        else:
+            positions, numbers = self._class_arrays(transformable)
+        n = len(positions)
 
-        if len(transformable) == 0:
+        if n == 0:
             raise ValueError("No transformable characters in cover text!")
 
-        if len(secret_binary) >= len(transformable):
+        steps = self.symbols(secret_binary)
+        if len(steps) >= n - 1:
             raise ValueError(
-                f"Secret too long! Need {len(secret_binary)} chars, "
-                f"only {len(transformable)} available"
+                f"Secret too long! Need {len(steps)} chars, "
+                f"only {n - 1} available"
             )
 
-        current_state = transformable[0][2]
-        positions_to_transform = [transformable[0][0]]
-        used_indices = [0]
-
-        for bit in secret_binary:
-            found = False
-
-            for search_idx in range(used_indices[-1] + 1, len(transformable)):
-                pos, char, category = transformable[search_idx]
-
-                if bit == '0' and category == current_state:
-                    positions_to_transform.append(pos)
-                    used_indices.append(search_idx)
-                    found = True
-                    break
-                elif bit == '1' and category != current_state:
-                    positions_to_transform.append(pos)
-                    used_indices.append(search_idx)
-                    current_state = category
-                    found = True
-                    break
-
-            if not found:
+        following = self._following(numbers)
+        current_state = int(numbers[1])
+        used_indices = [1]
+        last = 1
+
+        for step in steps:
+            current_state = (current_state + step) % self.classes
+            last = int(following[current_state][last + 1])
+            if last == n:
                 raise ValueError(f"Cannot encode bit. Not enough suitable characters.")
+            used_indices.append(last)
 
         stego_chars = list(cover_text)
-        for pos in positions_to_transform:
+        if _numpy() is None:
+            used_positions = [positions[i] for i in used_indices]
+        else:
+            used_positions = positions[used_indices].tolist()
+        for pos in used_positions:
             stego_chars[pos] = stego_chars[pos].upper()
 
         return ''.join(stego_chars)
 
 
+def _numpy():
+    """numpy when installed, else None: the encoder then runs in plain Python."""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def index_params(classes):
+    """Cover index parameters; the two-class index keeps its original key."""
+    return {'classes': classes} if classes != 2 else {}
+
+
 def text_to_binary(text):
-    return ''.join(format(ord(c), '08b') for c in text)
+    return bytes_to_binary(text.encode('utf-8'))
+
+
+def bytes_to_binary(data):
+    return ''.join(format(b, '08b') for b in data)
 
 
 def main():
@@ -76,8 +181,15 @@ def main():
     parser.add_argument('-c', '--cover', required=True, help='Cover text file')
     parser.add_argument('-s', '--secret', help='Secret message (text)')
     parser.add_argument('-sf', '--secret-file', help='Secret message file')
-    parser.add_argument('-o', '--output', required=True, help='Output stego file')
+    parser.add_argument('-o', '--output', required=True,
+                        help='Output stego file (.gz / .zst: written compressed)')
     parser.add_argument('-v', '--verbose', action='store_true', help='Verbose output')
+    parser.add_argument('-z', '--compress', action='store_true',
+                        help='Compress the secret before embedding (needs fewer capitals)')
+    parser.add_argument('--index', action='store_true',
+                        help='Use (or build) the persistent cover index instead of rescanning the cover')
+    parser.add_argument('-k', '--classes', type=int, choices=sorted(PARTITIONS), default=2,
+                        help='Letter classes; each capital carries log2(k) bits (decode with the same -k)')
 
     args = parser.parse_args()
 
@@ -93,7 +205,7 @@ def main():
             print(f"Error: File '{args.cover}' not found!", file=sys.stderr)
             sys.exit(1)
 
-        with open(cover_path, 'r', encoding='utf-8') as f:
+        with open_text_input(cover_path) as f:
             cover_text = f.read().strip()
 
         if not cover_text:
@@ -119,18 +231,29 @@ def main():
             print(f"Cover text: {len(cover_text)} chars")
             print(f"Secret: '{secret_text}' ({len(secret_text)} chars)")
 
-        stego = FeatureCodingSteganography()
-        secret_binary = text_to_binary(secret_text)
+        stego = FeatureCodingSteganography(args.classes)
+        if args.compress:
+            secret_binary = bytes_to_binary(frame_payload(secret_text.encode('utf-8')))
+        else:
+            secret_binary = text_to_binary(secret_text)
+
+        index = None
+        transformable = None
+        if args.index:
+            index = load_or_build(cover_text.encode('utf-8'), 'algo5', index_params(args.classes))
+            transformable = IndexedTransformable(cover_text, index, stego.categories)
 
         if args.verbose:
             print(f"Binary: {len(secret_binary)} bits")
-            transformable = stego.find_transformable(cover_text)
+            if transformable is None:
+                transformable = stego.find_transformable(cover_text)
             print(f"Transformable chars: {len(transformable)}")
 
-        stego_text = stego.encode(cover_text, secret_binary)
+        stego_text = stego.encode(cover_text, secret_binary, transformable, args.compress)
+        if index is not None:
+            index.close()
 
-        output_path = Path(args.output)
-        with open(output_path, 'w', encoding='utf-8') as f:
+        with open_text_output(args.output) as f:
             f.write(stego_text)
 
         if args.verbose:
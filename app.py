@@ -1,10 +1,96 @@
 import tkinter as tk
-from tkinter import ttk
+from tkinter import ttk, filedialog
 import os
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from common import jobs
+from common.algorithms import ROOT_DIR, load
+from common.cover_index import indexed_words, load_or_build
+
+# domyślny cover i plik wynikowy (w folderze algorytmu) dla każdego algorytmu
+DEFAULT_COVERS = {
+    'algo1': ROOT_DIR / 'algo2' / 'cover.txt',
+    'algo2': ROOT_DIR / 'algo2' / 'cover.txt',
+    'algo3': ROOT_DIR / 'algo3' / 'cover.txt',
+    'algo4': None,  # sonet z algo4/encode.py
+    'algo5': ROOT_DIR / 'algo5' / 'cover_sample.txt',
+    'autorski_projekt': ROOT_DIR / 'algo5' / 'cover_sample.txt',
+}
+OUTPUT_NAMES = {
+    'algo1': 'app_output.html',
+    'algo2': 'app_output.html',
+    'algo3': 'app_output.txt',
+    'algo4': 'app_output.txt',
+    'algo5': 'app_output.txt',
+    'autorski_projekt': 'app_output.pdf',
+}
+
+# index=1: analiza covera (etykiety, litery, układ glifów) z trwałego indeksu,
+# więc kolejne uruchomienia na tym samym coverze jej nie powtarzają
+JOB_PARAMS = {'index': '1', 'scheme': 'packed'}
+
+executor = ThreadPoolExecutor(max_workers=2)
+results = queue.Queue()
+cover_cache = {}  # ścieżka -> (mtime_ns, bajty)
+
+def read_cover(path):
+    mtime = os.stat(path).st_mtime_ns
+    cached = cover_cache.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path, 'rb') as f:
+            cached = cover_cache[path] = (mtime, f.read())
+    return cached[1]
+
+def run_algo4(message):
+    enc = load('algo4', 'encode')
+    cover_text = enc.SHAKESPEARE_SONNET_18
+    cipher, otp_key = enc.encipher_one_time_pad(message.encode('utf-8'))
+    # podział na słowa z indeksu covera, jak index=1 w pozostałych algorytmach
+    with load_or_build(cover_text.encode('utf-8'), 'algo4') as index:
+        words = indexed_words(cover_text, index)
+    stego_text = enc.missing_letter_hide(cipher, cover_text, words=words)
+    enc.pack_key(otp_key, cipher, ROOT_DIR / 'algo4' / 'app_key.bin')
+    return len(cover_text.encode('utf-8')), stego_text.encode('utf-8')
+
+def run_job(algo, message, cover_path):
+    """Wykonywane w wątku roboczym; wynik (albo błąd) trafia do kolejki results."""
+    start = time.perf_counter()
+    try:
+        if algo == 'algo4':
+            cover_size, output = run_algo4(message)
+        else:
+            cover = read_cover(cover_path)
+            cover_size = len(cover)
+            output = jobs.run(algo, 'encode', dict(JOB_PARAMS, message=message), cover)
+        out_path = ROOT_DIR / algo / OUTPUT_NAMES[algo]
+        with open(out_path, 'wb') as f:
+            f.write(output)
+    except Exception as e:
+        results.put((algo, None, str(e), time.perf_counter() - start, 0))
+        return
+    results.put((algo, out_path, None, time.perf_counter() - start, cover_size))
+
+def poll_results():
+    while True:
+        try:
+            algo, out_path, error, elapsed, cover_size = results.get_nowait()
+        except queue.Empty:
+            break
+        if error is not None:
+            result_label.config(text=f"❌ {algo}: {error}", fg="red")
+        else:
+            throughput = cover_size / elapsed / 1e6 if elapsed else 0.0
+            result_label.config(
+                text=f"✅ {algo} → {os.path.relpath(out_path)}\n"
+                     f"⏱ {elapsed * 1000:.0f} ms, {throughput:.2f} MB/s coveru",
+                fg="green")
+    window.after(100, poll_results)
 
 window = tk.Tk()
 window.title("Drop-down w oknie")
-window.geometry("350x250")
+window.geometry("350x300")
 
 label_select = tk.Label(window, text="Wybierz folder:")
 label_select.pack(pady=10)
@@ -21,6 +107,21 @@ label_msg.pack(pady=5)
 entry = tk.Entry(window, width=35)
 entry.pack(pady=5)
 
+cover_path = None  # None: domyślny cover algorytmu
+
+def on_select_cover():
+    global cover_path
+    path = filedialog.askopenfilename(filetypes=[("Pliki tekstowe", "*.txt"), ("Wszystkie", "*")])
+    if path:
+        cover_path = path
+        cover_label.config(text=os.path.basename(path))
+
+cover_button = tk.Button(window, text="Wybierz cover…", command=on_select_cover)
+cover_button.pack(pady=2)
+
+cover_label = tk.Label(window, text="(domyślny cover)")
+cover_label.pack()
+
 result_label = tk.Label(window, text="", fg="blue")
 result_label.pack(pady=10)
 
@@ -28,13 +129,23 @@ def on_submit():
     message = entry.get().strip()
     selected = combo.get()
     if not selected:
-        result_label.config(text="⚠️ Nie wybrano folderu!")
+        result_label.config(text="⚠️ Nie wybrano folderu!", fg="blue")
     elif not message:
-        result_label.config(text="⚠️ Wpisz wiadomość!")
+        result_label.config(text="⚠️ Wpisz wiadomość!", fg="blue")
+    elif selected not in DEFAULT_COVERS:
+        result_label.config(text=f"⚠️ {selected} nie jest algorytmem!", fg="blue")
     else:
-        result_label.config(text=f"📁 {selected}\n💬 {message}")
+        cover = cover_path or DEFAULT_COVERS[selected]
+        result_label.config(text=f"⏳ {selected}: ukrywanie…", fg="blue")
+        executor.submit(run_job, selected, message, cover)
 
 submit_button = tk.Button(window, text="Zatwierdź", command=on_submit)
 submit_button.pack(pady=5)
 
+def on_close():
+    executor.shutdown(wait=False, cancel_futures=True)
+    window.destroy()
+
+window.protocol("WM_DELETE_WINDOW", on_close)
+window.after(100, poll_results)
 window.mainloop()
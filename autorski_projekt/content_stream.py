@@ -0,0 +1,293 @@
+"""
+Glyph colour scanner working directly on PDF content streams.
+
+Reads the page's drawing operators instead of running PyMuPDF's text
+layout: every glyph shown by Tj / TJ / ' / " is reported with the fill
+colour set by the last rg / g / k / sc / scn operator, in drawing order.
+The scanner (decode.py) and the rewriter (overlay.py) share one tokeniser,
+so both see the same glyphs. Text drawn inside form XObjects is not
+followed.
+
+The point is exactness (one colour per glyph, no span merging) and
+stopping as soon as the payload is read. A full scan of a page runs at
+about the speed of PyMuPDF's layout extraction, not faster: the layout
+runs in C, this tokeniser is a Python regex.
+"""
+import re
+from itertools import repeat
+
+# Literal string with at most one level of unescaped nested parentheses.
+LITERAL = rb'\((?:[^()\\]|\\.|\((?:[^()\\]|\\.)*\))*\)'
+HEX = rb'<[0-9A-Fa-f\s]*>'
+
+# Operators the scanner and the rewriter act on; the rest are skipped
+# inside the regex, so a match is made per statement that matters, not per
+# token.
+OPS = (rb"(?:Tj|TJ|'|\"|rg|g|k|cs|sc|scn|Tf|q|Q|ID)")
+REGULAR = rb'[^\s/\[\]<>(){}%]'
+
+# Everything up to and including the next operator in OPS. Strings,
+# arrays, comments and names are consumed whole, so their content is never
+# mistaken for operators and /Fg is not the g operator. A group inside the
+# repetition keeps its last capture: 'string' is the last string (outside
+# an array), 'array' the last [...] array, 'name' the last /name and
+# 'other' the last skipped operator, whose end is where the operands of
+# 'op' start. Every byte is consumed by one branch, so the repetition only
+# stops at an operator in OPS; 'op' is None for the tail after the last one.
+STATEMENT_RE = re.compile(
+    rb"(?:[^(<%/\[A-Za-z'\"]+"  # numbers and white space
+    rb'|(?P<other>(?!(?:' + OPS + rb'|true|false|null)(?!' + REGULAR + rb'))'
+    rb'[A-Za-z\'"]' + REGULAR + rb'*)'
+    rb'|(?P<string>' + LITERAL + rb'|' + HEX + rb')'
+    rb'|(?P<name>/' + REGULAR + rb'*)'
+    rb'|(?P<array>\[(?:[^\]()<%]+|' + LITERAL + rb'|' + HEX + rb'|<<|%[^\r\n]*)*\])'
+    rb'|%[^\r\n]*'
+    rb'|(?:true|false|null)(?!' + REGULAR + rb')'
+    rb'|[(<\[])*'  # unbalanced delimiters
+    rb'(?P<op>' + OPS + rb'(?!' + REGULAR + rb'))?',
+    re.DOTALL)
+ESCAPE_RE = re.compile(rb'\\(?:[0-7]{1,3}|\r\n|.)', re.DOTALL)
+INLINE_IMAGE_END_RE = re.compile(rb'\sEI(?=[\s]|$)')
+STRING_RE = re.compile(LITERAL + rb'|' + HEX, re.DOTALL)
+
+
+def string_length(token: bytes) -> int:
+    """Number of bytes in a literal (...) or hex <...> string token."""
+    if token[:1] == b'<':
+        return (len(re.sub(rb'\s', b'', token[1:-1])) + 1) // 2
+    body = token[1:-1]
+    if b'\\' not in body:
+        return len(body)
+    length = len(body)
+    for m in ESCAPE_RE.finditer(body):
+        escape = m.group()
+        # a backslash before an end of line continues the string and adds nothing
+        length -= len(escape) if escape[1:] in (b'\r\n', b'\n', b'\r') else len(escape) - 1
+    return length
+
+
+def skip_inline_image(data: bytes, pos: int) -> int:
+    """Offset just past the EI that ends the inline image data starting at pos (after ID)."""
+    end = INLINE_IMAGE_END_RE.search(data, pos)
+    return end.end() if end else len(data)
+
+
+def fill_color(op: bytes, operands: bytes):
+    """
+    (r, g, b) floats set by a fill colour operator. sc / scn components are
+    read by count (1 gray, 3 RGB, 4 CMYK); a pattern or other colour space
+    gives None, i.e. the colour is unknown and left as it was.
+    """
+    try:
+        values = [float(value) for value in operands.split()]
+    except ValueError:
+        return None  # a pattern name
+    if not values:
+        return None
+    if op == b'g' or (op != b'rg' and op != b'k' and len(values) == 1):
+        gray = values[-1]
+        return (gray, gray, gray)
+    if op == b'k' or (op != b'rg' and len(values) == 4):
+        c, m, y, k = values[-4:]
+        return ((1 - c) * (1 - k), (1 - m) * (1 - k), (1 - y) * (1 - k))
+    if len(values) >= 3:
+        return tuple(values[-3:])
+    return None
+
+
+def _operands(m) -> bytes:
+    """Operands of a STATEMENT_RE match's operator: the bytes after the last skipped operator."""
+    start = m.start() if m['other'] is None else m.end('other')
+    return m.string[start:m.start('op')]
+
+
+def scan_glyph_colors(data: bytes, font_code_sizes=None):
+    """
+    Yield the fill colour (r, g, b floats) of every glyph shown in a content
+    stream, in drawing order. font_code_sizes maps font resource names
+    (without '/') to bytes per character code: 2 for Type0 fonts, 1 otherwise.
+    Reads the statements recolor_glyphs rewrites: inline image data is
+    skipped, cs resets the fill colour to black and sc / scn set it like
+    rg / g / k.
+    """
+    font_code_sizes = font_code_sizes or {}
+    color = (0.0, 0.0, 0.0)
+    saved = []
+    code_size = 1
+    pos = 0
+
+    while pos is not None:
+        resume = None
+        for m in STATEMENT_RE.finditer(data, pos):
+            op = m['op']
+            if op is None:
+                break
+            if op == b'Tj' or op == b"'" or op == b'"':
+                if m['string'] is not None:
+                    yield from repeat(color, string_length(m['string']) // code_size)
+            elif op == b'rg':
+                # the common case, without fill_color's checks
+                operands = _operands(m)
+                try:
+                    r, g, b = map(float, operands.split())
+                    color = (r, g, b)
+                except ValueError:
+                    color = fill_color(op, operands) or color
+            elif op == b'TJ':
+                if m['array'] is not None:
+                    length = sum(map(string_length, STRING_RE.findall(m['array'])))
+                    yield from repeat(color, length // code_size)
+            elif op == b'cs':
+                color = (0.0, 0.0, 0.0)
+            elif op == b'Tf':
+                if m['name'] is not None:
+                    code_size = font_code_sizes.get(m['name'][1:].decode('latin-1'), 1)
+            elif op == b'q':
+                saved.append(color)
+            elif op == b'Q':
+                if saved:
+                    color = saved.pop()
+            elif op == b'ID':
+                resume = skip_inline_image(data, m.end())
+                break
+            else:  # g, k, sc, scn
+                color = fill_color(op, _operands(m)) or color
+        pos = resume
+
+
+def page_font_code_sizes(page) -> dict:
+    """Font resource name -> bytes per character code for a PyMuPDF page."""
+    return {font[4]: 2 if font[2] == 'Type0' else 1 for font in page.get_fonts()}
+
+
+# --- rewriting (overlay.py) ---
+
+ELEMENT_RE = re.compile(rb'(' + LITERAL + rb'|' + HEX + rb')|[-+]?(?:\d+\.?\d*|\.\d+)', re.DOTALL)
+FILL_OPS = {b'rg', b'g', b'k', b'cs'}
+_ESCAPES = {b'n': b'\n', b'r': b'\r', b't': b'\t', b'b': b'\b', b'f': b'\f'}
+
+
+def _unescape(m):
+    escape = m.group()[1:]
+    if escape[0] in b'01234567':
+        return bytes([int(escape, 8) & 0xFF])
+    if escape in (b'\r\n', b'\n', b'\r'):
+        return b''
+    return _ESCAPES.get(escape, escape)
+
+
+def string_bytes(token: bytes) -> bytes:
+    """Character codes of a literal (...) or hex <...> string token."""
+    if token[:1] == b'<':
+        digits = re.sub(rb'\s', b'', token[1:-1])
+        return bytes.fromhex((digits + b'0' * (len(digits) % 2)).decode('ascii'))
+    return ESCAPE_RE.sub(_unescape, token[1:-1])
+
+
+def _show_items(op, operands):
+    """
+    (prefix operators, [[codes, adjustments], ...]) for a text showing
+    operator; adjustments are the TJ numbers that follow those codes.
+    """
+    if op == b'TJ':
+        units, leading = [], []
+        for m in ELEMENT_RE.finditer(operands):
+            if m[1] is not None:
+                units.append([string_bytes(m[1]), []])
+            elif units:
+                units[-1][1].append(m.group())
+            else:
+                leading.append(m.group())
+        prefix = b'[' + b' '.join(leading) + b'] TJ' if leading else b''
+        return prefix, units
+    token = list(ELEMENT_RE.finditer(operands))
+    prefix = b''
+    if op == b"'":
+        prefix = b'T*'
+    elif op == b'"':
+        aw, ac = token[-3].group(), token[-2].group()
+        prefix = aw + b' Tw ' + ac + b' Tc T*'
+    return prefix, [[string_bytes(token[-1][1]), []]]
+
+
+def _show(codes, adjustments):
+    if adjustments:
+        return b'[<' + codes.hex().encode() + b'> ' + b' '.join(adjustments) + b'] TJ'
+    return b'<' + codes.hex().encode() + b'> Tj'
+
+
+def _recolor_show(units, colours, i, code_size, fill):
+    """Statements replacing one text showing operator; returns (pieces, next colour index)."""
+    pieces = []
+    for u, (codes, adjustments) in enumerate(units):
+        n = len(codes) // code_size
+        if n == 0:
+            pieces.append(_show(codes, adjustments))
+            continue
+        for j in range(n):
+            if i == len(colours):
+                pieces += fill
+                pieces.append(_show(codes[j * code_size:], adjustments))
+                pieces += [_show(c, a) for c, a in units[u + 1:]]
+                return pieces, i
+            last = j == n - 1
+            glyph = codes[j * code_size:] if last else codes[j * code_size:(j + 1) * code_size]
+            pieces.append(b'%.6g %.6g %.6g rg ' % colours[i] + _show(glyph, adjustments if last else []))
+            i += 1
+    if i == len(colours):
+        pieces += fill
+    return pieces, i
+
+
+def recolor_glyphs(data: bytes, colours, start=0, font_code_sizes=None):
+    """
+    Give the glyphs of a content stream, in drawing order, the fill colours
+    colours[start:] ((r, g, b) floats), one per glyph, as scan_glyph_colors
+    reports them. Text showing operators that carry colours are split into
+    one operator per glyph; after the last colour the previous fill colour is
+    restored and the rest of the stream is copied untouched, so the work
+    depends on the glyphs recoloured, not on the stream size.
+    Returns (new stream, index of the first unused colour).
+    """
+    font_code_sizes = font_code_sizes or {}
+    fill = [b'0 g']  # statements recreating the current fill colour
+    saved = []
+    code_size = 1
+    out = []
+    copied = 0  # data[:copied] is in out
+    pos = 0
+    i = start
+
+    while i < len(colours):
+        m = STATEMENT_RE.match(data, pos)
+        op = m['op']
+        if op is None:
+            break
+        pos = m.end()
+        statement_start = m.start() if m['other'] is None else m.end('other')
+        operands = data[statement_start:m.start('op')]
+
+        if op in FILL_OPS:
+            fill = [data[statement_start:pos].strip()]
+        elif op in (b'sc', b'scn'):
+            # keep the colour space the components belong to
+            fill = [fill[0], data[statement_start:pos].strip()]
+        elif op == b'q':
+            saved.append(fill)
+        elif op == b'Q':
+            if saved:
+                fill = saved.pop()
+        elif op == b'Tf':
+            name = operands.rsplit(b'/', 1)[-1].split()[0]
+            code_size = font_code_sizes.get(name.decode('latin-1'), 1)
+        elif op == b'ID':
+            pos = skip_inline_image(data, pos)
+        elif op in (b'Tj', b'TJ', b"'", b'"'):
+            prefix, units = _show_items(op, operands)
+            pieces, i = _recolor_show(units, colours, i, code_size, fill)
+            out.append(data[copied:statement_start])
+            out.append(b'\n' + b'\n'.join([prefix] + pieces if prefix else pieces))
+            copied = pos
+
+    out.append(data[copied:])
+    return b''.join(out), i
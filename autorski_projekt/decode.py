@@ -1,5 +1,18 @@
+import sys
+from pathlib import Path
+
 import fitz  # PyMuPDF
 
+ROOT_DIR = str(Path(__file__).resolve().parent.parent)
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
+
+from common.algorithms import load
+from common.buffers import is_path, read_source
+
+# loaded by path: this script is also imported by the server, where its folder is not on sys.path
+content_stream = load('autorski_projekt', 'content_stream')
+
 def rgb_to_char(r, g, b):
     """
     Convert RGB values back to character based on the distributed encoding scheme.
@@ -25,30 +38,93 @@ def int_to_rgb(color_int):
     b = color_int & 255
     return r / 255, g / 255, b / 255
 
-def extract_hidden_message(pdf_path):
-    doc = fitz.open(pdf_path)
-    hidden_message = ""
+def channel_bits(bytes_per_glyph):
+    """
+    Same split of payload bits over R, G, B as in encode.py. 3 is still read
+    for PDFs written before the encoder was capped at 2 bytes per glyph.
+    """
+    if not 1 <= bytes_per_glyph <= 3:
+        raise ValueError("bytes_per_glyph must be 1, 2 or 3")
+    base, extra = divmod(8 * bytes_per_glyph, 3)
+    return tuple(base + (1 if i < extra else 0) for i in range(3))
 
+def glyph_colors(doc):
+    """Yield the 0xRRGGBB colour of every glyph in reading order."""
     for page in doc:
-        blocks = page.get_text("dict")["blocks"]
-        for b in blocks:
+        for b in page.get_text("dict")["blocks"]:
             for line in b.get("lines", []):
                 for span in line.get("spans", []):
                     color_int = span.get("color")
                     if color_int is not None:
-                        r, g, b = int_to_rgb(color_int)
-                        # Check if this is one of our encoded colors (not pure black)
-                        if (r > 0 or g > 0 or b > 0) and not (r == 0 and g == 0 and b == 0):
-                            char = rgb_to_char(r, g, b)
-                            if char:
-                                span_text = span.get("text", "")
-                                repeat = len(span_text) or 1
-                                hidden_message += char * repeat
-
-    doc.close()
-    return hidden_message
+                        # adjacent glyphs with the same colour end up in one span
+                        for _ in range(len(span.get("text", "")) or 1):
+                            yield color_int
+
+def stream_glyph_colors(doc):
+    """
+    Same as glyph_colors, but read straight from each page's content stream:
+    no layout analysis, no span merging, exact colour per glyph.
+    """
+    for page in doc:
+        code_sizes = content_stream.page_font_code_sizes(page)
+        for r, g, b in content_stream.scan_glyph_colors(page.read_contents(), code_sizes):
+            yield (round(r * 255) << 16) | (round(g * 255) << 8) | round(b * 255)
+
+def rgb_to_payload(colors, bytes_per_glyph=2):
+    """Inverse of encode.payload_to_rgb: read the length header, then that many bytes."""
+    r_bits, g_bits, b_bits = channel_bits(bytes_per_glyph)
+    data = bytearray()
+    needed = 4
+    for color_int in colors:
+        r, g, b = (color_int >> 16) & 255, (color_int >> 8) & 255, color_int & 255
+        value = (r << (g_bits + b_bits)) | (g << b_bits) | b
+        data += value.to_bytes(bytes_per_glyph, 'big')
+        if len(data) >= 4:
+            needed = 4 + int.from_bytes(data[:4], 'big')
+        if len(data) >= needed:
+            break
+    return bytes(data[4:needed])
+
+def open_pdf(source):
+    """PyMuPDF document from a path, bytes, memoryview, mmap or binary stream."""
+    if is_path(source):
+        return fitz.open(source)
+    return fitz.open(stream=read_source(source), filetype="pdf")
+
+def extract_payload(pdf_path, bytes_per_glyph=2, parser="layout"):
+    """Raw payload bytes of a PDF written with scheme="packed"."""
+    doc = open_pdf(pdf_path)
+    try:
+        colors = stream_glyph_colors(doc) if parser == "stream" else glyph_colors(doc)
+        return rgb_to_payload(colors, bytes_per_glyph)
+    finally:
+        doc.close()
+
+def extract_hidden_message(pdf_path, scheme="legacy", bytes_per_glyph=2, parser="layout"):
+    """
+    parser="layout": PyMuPDF text extraction (spans); parser="stream":
+    direct content-stream scan with one exact colour per glyph in drawing order.
+    """
+    if scheme == "packed":
+        payload = extract_payload(pdf_path, bytes_per_glyph, parser)
+        return payload.decode('utf-8', errors='replace')
+
+    doc = open_pdf(pdf_path)
+    try:
+        colors = stream_glyph_colors(doc) if parser == "stream" else glyph_colors(doc)
+        hidden_message = ""
+        for color_int in colors:
+            # Check if this is one of our encoded colors (not pure black)
+            if color_int != 0:
+                hidden_message += rgb_to_char(*int_to_rgb(color_int))
+        return hidden_message
+    finally:
+        doc.close()
 
 # Example usage
-pdf_path = "hidden_message.pdf"
-message = extract_hidden_message(pdf_path)
-print("Hidden message:", message)
+if __name__ == "__main__":
+    pdf_path = "hidden_message.pdf"
+    parser = "stream" if "--stream" in sys.argv[1:] else "layout"
+    message = extract_hidden_message(pdf_path, parser=parser)
+    print("Hidden message:", message)
+
@@ -3,6 +3,16 @@ from reportlab.lib.pagesizes import LETTER
 from reportlab.lib.colors import Color
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
+import io
+import sys
+from pathlib import Path
+
+ROOT_DIR = str(Path(__file__).resolve().parent.parent)
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
+
+from common.buffers import describe, write_sink
+from common.cover_index import load_or_build, indexed_layout
 
 # (Optional) register a TTF if you want a different font:
 # pdfmetrics.registerFont(TTFont("DejaVuSans", "/path/to/DejaVuSans.ttf"))
@@ -22,35 +32,62 @@ def char_to_shade(c):
     b = int(ascii_val % 6)
     return Color(float(r / sense), float(g / sense), float(b / sense))
 
-def embed_hidden_message(pdf_path, visible_text, hidden_message,
-                         pagesize=LETTER, font_name="Helvetica", font_size=12,
-                         left_margin=50, top_margin=100, bottom_margin=50, leading=None):
+# 3 bytes would use whole channels, up to rgb(255, 255, 255): white, invisible text
+MAX_BYTES_PER_GLYPH = 2
+
+def channel_bits(bytes_per_glyph):
     """
-    Generates a PDF with text that looks black but encodes a hidden message
-    in the color of each character. Text is wrapped into lines and across pages.
+    Split bytes_per_glyph * 8 payload bits as evenly as possible over R, G, B,
+    e.g. 2 bytes -> (6, 5, 5): at most rgb(63, 31, 31), still a very dark grey.
     """
-    if len(visible_text) < len(hidden_message):
-        raise ValueError("Visible text must be at least as long as hidden message")
+    if not 1 <= bytes_per_glyph <= MAX_BYTES_PER_GLYPH:
+        raise ValueError(f"bytes_per_glyph must be 1 or {MAX_BYTES_PER_GLYPH}")
+    base, extra = divmod(8 * bytes_per_glyph, 3)
+    return tuple(base + (1 if i < extra else 0) for i in range(3))
 
-    c = canvas.Canvas(pdf_path, pagesize=pagesize)
-    width, height = pagesize
+def payload_to_rgb(payload: bytes, bytes_per_glyph=2):
+    """
+    Packed scheme: 4-byte big-endian length header + payload, cut into
+    bytes_per_glyph-byte groups, each stored in the low bits of one glyph's
+    8-bit R, G and B channels.
+    """
+    r_bits, g_bits, b_bits = channel_bits(bytes_per_glyph)
+    data = len(payload).to_bytes(4, 'big') + payload
+    data += b'\0' * (-len(data) % bytes_per_glyph)
 
-    c.setFont(font_name, font_size)
+    colours = []
+    for i in range(0, len(data), bytes_per_glyph):
+        value = int.from_bytes(data[i:i + bytes_per_glyph], 'big')
+        r = value >> (g_bits + b_bits)
+        g = (value >> b_bits) & ((1 << g_bits) - 1)
+        b = value & ((1 << b_bits) - 1)
+        colours.append((r, g, b))
+    return colours
+
+def layout_glyphs(visible_text, pagesize=LETTER, font_name="Helvetica", font_size=12,
+                  left_margin=50, top_margin=100, bottom_margin=50, leading=None):
+    """
+    Yields (page, x, y) for every character of visible_text: text is wrapped
+    into lines and across pages exactly as embed_hidden_message draws it.
+    The result only depends on the text and layout parameters, so it can be
+    stored in a cover index (common/cover_index.py) and reused.
+    """
+    width, height = pagesize
     if leading is None:
         leading = int(font_size * 1.2)  # default line spacing
 
     max_width = width - 2 * left_margin
 
     # Starting coordinates
+    page = 0
     x = left_margin
     y = height - top_margin
 
-    # We'll draw character-by-character. Use pdfmetrics to measure widths.
-    for i, ch in enumerate(visible_text):
+    # Use pdfmetrics to measure widths.
+    for ch in visible_text:
         # If current y would go below bottom margin, create new page and reset positions
         if y < bottom_margin + leading:  # leave space for one more line
-            c.showPage()
-            c.setFont(font_name, font_size)
+            page += 1
             x = left_margin
             y = height - top_margin
 
@@ -63,27 +100,80 @@ def embed_hidden_message(pdf_path, visible_text, hidden_message,
             y -= leading
             # check again for page break after wrapping
             if y < bottom_margin + leading:
-                c.showPage()
-                c.setFont(font_name, font_size)
+                page += 1
                 x = left_margin
                 y = height - top_margin
 
+        yield page, x, y
+
+        # advance x
+        x += ch_width
+
+def embed_hidden_message(pdf_path, visible_text, hidden_message,
+                         pagesize=LETTER, font_name="Helvetica", font_size=12,
+                         left_margin=50, top_margin=100, bottom_margin=50, leading=None,
+                         use_index=False, scheme="legacy", bytes_per_glyph=2):
+    """
+    Generates a PDF with text that looks black but encodes a hidden message
+    in the color of each character. Text is wrapped into lines and across pages.
+    With use_index=True the glyph layout is read from (or stored in) the cover
+    index instead of being measured again.
+    scheme="legacy": one character per glyph (char_to_shade).
+    scheme="packed": UTF-8 bytes with a length header, bytes_per_glyph per glyph
+    (see payload_to_rgb); decode with the same scheme and bytes_per_glyph.
+    pdf_path may also be a binary stream, a writable buffer, or None to get
+    the PDF bytes back (see common/buffers.py).
+    """
+    if scheme == "packed":
+        payload = hidden_message.encode('utf-8') if isinstance(hidden_message, str) else bytes(hidden_message)
+        shades = [Color(r / 255, g / 255, b / 255) for r, g, b in payload_to_rgb(payload, bytes_per_glyph)]
+    elif scheme == "legacy":
+        shades = [char_to_shade(ch) for ch in hidden_message]
+    else:
+        raise ValueError(f"Unknown scheme {scheme!r}")
+
+    if len(visible_text) < len(shades):
+        raise ValueError(f"Visible text must have at least {len(shades)} characters for this message")
+
+    layout_params = dict(pagesize=list(pagesize), font_name=font_name, font_size=font_size,
+                         left_margin=left_margin, top_margin=top_margin,
+                         bottom_margin=bottom_margin, leading=leading)
+    index = None
+    if use_index:
+        index = load_or_build(visible_text.encode('utf-8'), 'autorski_projekt', layout_params)
+        layout = indexed_layout(index)
+    else:
+        layout = layout_glyphs(visible_text, **layout_params)
+
+    out = io.BytesIO()
+    c = canvas.Canvas(out, pagesize=pagesize)
+    c.setFont(font_name, font_size)
+    current_page = 0
+
+    # We'll draw character-by-character at the precomputed positions.
+    for i, (ch, (page, x, y)) in enumerate(zip(visible_text, layout)):
+        while current_page < page:
+            c.showPage()
+            c.setFont(font_name, font_size)
+            current_page += 1
+
         # Set color according to hidden message (or black if past hidden_message length)
-        if i < len(hidden_message):
-            shade = char_to_shade(hidden_message[i])
-            c.setFillColor(shade)
+        if i < len(shades):
+            c.setFillColor(shades[i])
         else:
             c.setFillColor(Color(0, 0, 0))
 
         # Draw the single character
         c.drawString(x, y, ch)
 
-        # advance x
-        x += ch_width
+    if index is not None:
+        index.close()
 
     # save page
     c.save()
-    print(f"PDF saved as {pdf_path}")
+    result = write_sink(out.getvalue(), pdf_path)
+    print(f"PDF saved as {describe(pdf_path)}")
+    return result
 
 # Example usage
 if __name__ == "__main__":
@@ -0,0 +1,131 @@
+"""
+Overlay mode: hide a message in an existing PDF by re-colouring its glyphs.
+
+Unlike encode.py nothing is typeset: the text showing operators that carry
+payload are rewritten in place (content_stream.recolor_glyphs) and the
+document is saved with an incremental update, so fonts and layout stay as
+they were and only the rewritten pages are appended to the file. Decode
+with decode.py's parser="stream", which reads colours in the same drawing
+order.
+
+    python overlay.py cover.pdf -m "secret" -o stego.pdf
+"""
+import argparse
+import shutil
+import sys
+from pathlib import Path
+
+import fitz  # PyMuPDF
+
+ROOT_DIR = str(Path(__file__).resolve().parent.parent)
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
+
+from common.algorithms import load
+from common.buffers import describe, is_path, read_source, write_sink
+
+content_stream = load('autorski_projekt', 'content_stream')
+encode = load('autorski_projekt', 'encode')
+
+
+def message_colours(hidden_message, scheme="packed", bytes_per_glyph=2):
+    """(r, g, b) floats per glyph, as embed_hidden_message would draw them."""
+    if scheme == "packed":
+        payload = hidden_message.encode('utf-8') if isinstance(hidden_message, str) else bytes(hidden_message)
+        return [(r / 255, g / 255, b / 255) for r, g, b in encode.payload_to_rgb(payload, bytes_per_glyph)]
+    if scheme == "legacy":
+        return [(c.red, c.green, c.blue) for c in map(encode.char_to_shade, hidden_message)]
+    raise ValueError(f"Unknown scheme {scheme!r}")
+
+
+def count_glyphs(doc) -> int:
+    """Glyphs the stream decoder sees, i.e. colours the document can carry."""
+    return sum(
+        sum(1 for _ in content_stream.scan_glyph_colors(page.read_contents(),
+                                                        content_stream.page_font_code_sizes(page)))
+        for page in doc)
+
+
+def recolor_document(doc, colours) -> int:
+    """Rewrite the pages carrying colours; returns the number of pages changed."""
+    used = 0
+    changed = 0
+    for page in doc:
+        if used == len(colours):
+            break
+        data, end = content_stream.recolor_glyphs(page.read_contents(), colours, used,
+                                                  content_stream.page_font_code_sizes(page))
+        if end == used:
+            continue
+        # a new stream object: the old ones may be shared with other pages
+        xref = doc.get_new_xref()
+        doc.update_object(xref, "<<>>")
+        doc.update_stream(xref, data)
+        page.set_contents(xref)
+        used = end
+        changed += 1
+    if used < len(colours):
+        raise ValueError(f"The PDF has {used} glyphs, {len(colours)} needed for this message")
+    return changed
+
+
+def overlay_hidden_message(pdf, hidden_message, output=None, scheme="packed", bytes_per_glyph=2):
+    """
+    Hide hidden_message in the existing PDF pdf.
+
+    pdf as a path: output None (or the same path) updates the file in place,
+    another path gets a copy with the update appended. pdf given as bytes,
+    a buffer or a stream is saved in full (PyMuPDF appends incremental updates
+    to files only), to output as in write_sink, or returned when output is None.
+    """
+    colours = message_colours(hidden_message, scheme, bytes_per_glyph)
+
+    if not is_path(pdf):
+        doc = fitz.open(stream=read_source(pdf), filetype="pdf")
+        try:
+            recolor_document(doc, colours)
+            result = write_sink(doc.tobytes(), output)
+        finally:
+            doc.close()
+        print(f"PDF saved as {describe(output)}")
+        return result
+
+    target = pdf if output is None else output
+    copied = Path(target).resolve() != Path(pdf).resolve()
+    if copied:
+        shutil.copyfile(pdf, target)
+    doc = fitz.open(target)
+    try:
+        pages = recolor_document(doc, colours)
+        doc.saveIncr()
+    except Exception:
+        doc.close()
+        if copied:
+            Path(target).unlink()
+        raise
+    doc.close()
+    print(f"PDF saved as {describe(target)} ({pages} page(s) rewritten)")
+    return pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Hide a message in an existing PDF (overlay mode)')
+
+    parser.add_argument('pdf', help='Cover PDF')
+    parser.add_argument('-m', '--message', required=True, help='Message to hide')
+    parser.add_argument('-o', '--output', help='Output PDF (default: update the cover in place)')
+    parser.add_argument('--scheme', choices=['packed', 'legacy'], default='packed')
+    parser.add_argument('--bytes-per-glyph', type=int, choices=[1, 2], default=2,
+                        help='Packed scheme only')
+
+    args = parser.parse_args()
+
+    try:
+        overlay_hidden_message(args.pdf, args.message, args.output, args.scheme, args.bytes_per_glyph)
+    except (ValueError, OSError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
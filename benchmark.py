@@ -0,0 +1,289 @@
+"""
+Throughput benchmarks with a history file and a regression gate.
+
+    python benchmark.py                     # run, record, compare with the previous run
+    python benchmark.py --baseline 26abea5  # compare with the last run of that revision
+    python benchmark.py -w 'algo5-*' --repeats 15 --no-record
+
+Every workload runs a fixed input through one encoder or decoder several
+times. The median and interquartile range (IQR) of the timings are appended
+to the history file (bench_history.jsonl) together with the git revision.
+A workload counts as a regression when its median is more than --threshold
+slower than the baseline *and* the two IQRs do not overlap, so one noisy
+repeat cannot fail the gate. Exit code 1 means at least one regression.
+"""
+import argparse
+import contextlib
+import fnmatch
+import io
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from common import jobs
+from common.algorithms import ROOT_DIR, load
+from common.autoselect import HISTORY_FILE
+
+# Fixed inputs: the sample covers shipped in the repo, repeated to a size
+# where a single run takes long enough to time reliably.
+LOREM = (ROOT_DIR / 'algo2' / 'cover.txt').read_bytes()
+SENTENCES = (ROOT_DIR / 'algo3' / 'cover.txt').read_bytes()
+FEATURE_TEXT = (ROOT_DIR / 'algo5' / 'cover_sample.txt').read_bytes()
+MESSAGE = LOREM[:1000].decode('utf-8').replace('\n', ' ')
+
+
+def _encode(algo, params, cover):
+    def setup():
+        return (lambda: jobs.run(algo, 'encode', params, cover)), len(cover)
+    return setup
+
+
+def _decode(algo, params, cover, decode_params=None):
+    def setup():
+        stego = jobs.run(algo, 'encode', params, cover)
+        return (lambda: jobs.run(algo, 'decode', decode_params or {}, stego)), len(stego)
+    return setup
+
+
+def _algo4_encode():
+    enc = load('algo4', 'encode')
+    cover = (LOREM * 2).decode('utf-8')
+    plaintext = MESSAGE.encode('utf-8') * 50
+
+    def encode():
+        cipher, _ = enc.encipher_one_time_pad(plaintext, rng_seed=42)
+        enc.missing_letter_hide(cipher, cover, rng_seed=123)
+    return encode, len(plaintext)
+
+
+def _algo4_decode():
+    enc, dec = load('algo4', 'encode'), load('algo4', 'decode')
+    cipher, key = enc.encipher_one_time_pad(MESSAGE.encode('utf-8') * 50, rng_seed=42)
+    return (lambda: dec.decipher_one_time_pad(cipher, key)), len(cipher)
+
+
+def _algo5_decode_stream():
+    dec = load('algo5', 'decode')
+    stego = jobs.run('algo5', 'encode', ALGO5, FEATURE_TEXT * 200) * 10
+    return (lambda: dec.FeatureCodingSteganography().decode_file(io.BytesIO(stego))), len(stego)
+
+
+def _autorski_overlay():
+    # cover: a PDF typeset by the autorski encoder, re-coloured in place
+    cover = jobs.run('autorski_projekt', 'encode', {'message': 'x'}, LOREM[:20000])
+    return (lambda: jobs.run('autorski_projekt', 'encode', AUTORSKI, cover)), len(cover)
+
+
+def _fec_protect():
+    from common import fec
+    payload = (LOREM * 4)[:1 << 20]
+    return (lambda: fec.protect(payload)), len(payload)
+
+
+def _fec_recover():
+    from common import fec
+    payload = (LOREM * 4)[:1 << 20]
+    coded = bytearray(fec.protect(payload))
+    for i in range(0, len(coded), 97):
+        coded[i] ^= 0x10  # one flipped bit every 97 bytes, all correctable
+    return (lambda: fec.recover(coded)), len(payload)
+
+
+ALGO1 = {'message': MESSAGE}
+ALGO1_COMPACT = {'message': MESSAGE, 'compact': '1'}
+ALGO2 = {'message': MESSAGE}
+ALGO3 = {'message': MESSAGE}
+ALGO5 = {'message': MESSAGE}
+ALGO5_K4 = {'message': MESSAGE, 'classes': '4'}
+ALGO5_K8 = {'message': MESSAGE, 'classes': '8'}
+AUTORSKI = {'message': MESSAGE[:200], 'scheme': 'packed'}
+
+# name -> setup(); setup returns (callable, input size in bytes) and is not timed.
+WORKLOADS = {
+    'algo1-encode': _encode('algo1', ALGO1, LOREM * 20),
+    'algo1-decode': _decode('algo1', ALGO1, LOREM * 20),
+    'algo1-compact-encode': _encode('algo1', ALGO1_COMPACT, LOREM * 20),
+    'algo1-compact-decode': _decode('algo1', ALGO1_COMPACT, LOREM * 20),
+    'algo2-encode': _encode('algo2', ALGO2, LOREM),
+    'algo2-decode': _decode('algo2', ALGO2, LOREM),
+    'algo3-encode': _encode('algo3', ALGO3, SENTENCES * 200),
+    'algo3-decode': _decode('algo3', ALGO3, SENTENCES * 200),
+    'algo4-encode': _algo4_encode,
+    'algo4-decode': _algo4_decode,
+    'algo5-encode': _encode('algo5', ALGO5, FEATURE_TEXT * 200),
+    'algo5-decode': _decode('algo5', ALGO5, FEATURE_TEXT * 200),
+    'algo5-decode-stream': _algo5_decode_stream,
+    'algo5-k4-encode': _encode('algo5', ALGO5_K4, FEATURE_TEXT * 200),
+    'algo5-k4-decode': _decode('algo5', ALGO5_K4, FEATURE_TEXT * 200, {'classes': '4'}),
+    'algo5-k8-encode': _encode('algo5', ALGO5_K8, FEATURE_TEXT * 200),
+    'algo5-k8-decode': _decode('algo5', ALGO5_K8, FEATURE_TEXT * 200, {'classes': '8'}),
+    'fec-protect': _fec_protect,
+    'fec-recover': _fec_recover,
+    'autorski-encode': _encode('autorski_projekt', AUTORSKI, LOREM[:20000]),
+    'autorski-overlay-encode': _autorski_overlay,
+    'autorski-decode-layout': _decode('autorski_projekt', AUTORSKI, LOREM[:20000],
+                                      {'scheme': 'packed', 'parser': 'layout'}),
+    'autorski-decode-stream': _decode('autorski_projekt', AUTORSKI, LOREM[:20000],
+                                      {'scheme': 'packed', 'parser': 'stream'}),
+}
+
+
+def measure(fn, repeats, warmup=1):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def summarize(samples, size):
+    q1, median, q3 = statistics.quantiles(samples, n=4, method='inclusive')
+    return {
+        'median': median,
+        'q1': q1,
+        'q3': q3,
+        'mb_s': size / median / 1e6 if median else 0.0,
+        'bytes': size,
+        'samples': samples,
+    }
+
+
+def git_revision():
+    """(short revision, dirty flag), or ('unknown', False) outside a checkout."""
+    try:
+        rev = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR,
+                             capture_output=True, text=True, check=True).stdout.strip()
+        status = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                                cwd=ROOT_DIR, capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown', False
+    return rev, bool(status.strip())
+
+
+def read_history(path):
+    if not path.exists():
+        return []
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def append_history(path, record):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record, sort_keys=True) + '\n')
+
+
+def find_baseline(history, revision=None):
+    """Latest recorded run, or the latest run of a given revision (prefix match)."""
+    for record in reversed(history):
+        if revision is None or record['rev'].startswith(revision):
+            return record
+    return None
+
+
+def compare(current, baseline, threshold):
+    """Yield (name, ratio, verdict) for the workloads present in both runs."""
+    for name, cur in current.items():
+        base = baseline.get(name)
+        if base is None:
+            yield name, None, 'new'
+            continue
+        if base['bytes'] != cur['bytes']:
+            yield name, None, 'input changed'
+            continue
+        ratio = cur['median'] / base['median']
+        if ratio > 1 + threshold and cur['q1'] > base['q3']:
+            yield name, ratio, 'REGRESSION'
+        elif ratio < 1 - threshold and cur['q3'] < base['q1']:
+            yield name, ratio, 'faster'
+        else:
+            yield name, ratio, 'ok'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the encoders and decoders')
+
+    parser.add_argument('-w', '--workload', action='append',
+                        help='Workload name or glob pattern (repeatable, default: all)')
+    parser.add_argument('--repeats', type=int, default=7, help='Timed runs per workload')
+    parser.add_argument('--warmup', type=int, default=1, help='Untimed runs per workload')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='Relative slowdown of the median that counts as a regression')
+    parser.add_argument('--baseline', help='Git revision to compare with (default: previous run)')
+    parser.add_argument('--history', type=Path, default=HISTORY_FILE, help='History file')
+    parser.add_argument('--no-record', action='store_true', help='Do not append this run')
+    parser.add_argument('--list', action='store_true', help='List workloads and exit')
+
+    args = parser.parse_args()
+    if args.repeats < 2:
+        parser.error('--repeats must be at least 2')
+
+    available = WORKLOADS
+    if args.list:
+        print('\n'.join(available))
+        return
+
+    patterns = args.workload or ['*']
+    selected = [name for name in available if any(fnmatch.fnmatch(name, p) for p in patterns)]
+    if not selected:
+        parser.error(f"No workload matches {patterns}")
+
+    history = read_history(args.history)
+    baseline = find_baseline(history, args.baseline)
+    if args.baseline and baseline is None:
+        print(f"Warning: no recorded run of {args.baseline} in {args.history}", file=sys.stderr)
+
+    rev, dirty = git_revision()
+    results = {}
+    for name in selected:
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                fn, size = available[name]()
+                samples = measure(fn, args.repeats, args.warmup)
+        except ImportError as e:
+            print(f"{name:<26} skipped ({e})")
+            continue
+        results[name] = summary = summarize(samples, size)
+        iqr = summary['q3'] - summary['q1']
+        print(f"{name:<26} median {summary['median'] * 1000:9.2f} ms  "
+              f"IQR {iqr * 1000:8.2f} ms  {summary['mb_s']:8.2f} MB/s")
+
+    if not args.no_record and results:
+        append_history(args.history, {
+            'time': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'rev': rev,
+            'dirty': dirty,
+            'python': platform.python_version(),
+            'host': platform.node(),
+            'repeats': args.repeats,
+            'results': results,
+        })
+
+    if baseline is None:
+        print("\nNo baseline recorded yet; nothing to compare.")
+        return
+
+    label = baseline['rev'] + (' (dirty)' if baseline.get('dirty') else '')
+    print(f"\nCompared with {label} from {baseline['time']} "
+          f"(threshold {args.threshold:.0%}):")
+    regressions = 0
+    for name, ratio, verdict in compare(results, baseline['results'], args.threshold):
+        change = '' if ratio is None else f"{(ratio - 1) * 100:+7.1f}%"
+        print(f"  {name:<26} {change:>8}  {verdict}")
+        regressions += verdict == 'REGRESSION'
+
+    if regressions:
+        print(f"\n{regressions} regression(s)", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
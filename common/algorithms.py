@@ -0,0 +1,56 @@
+"""Load the per-folder algorithm scripts (algo1/encode.py, ...) as modules."""
+import importlib.util
+import sys
+import threading
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+
+# Held while a script executes, so two threads never import it twice.
+_LOAD_LOCK = threading.RLock()
+
+# folder -> script names (without .py)
+MODULES = {
+    'algo1': ('encode', 'decode', 'update'),
+    'algo2': ('algos',),
+    'algo3': ('encode', 'decode', 'stub_ollama'),
+    'algo4': ('encode', 'decode'),
+    'algo5': ('encode', 'decode'),
+    'autorski_projekt': ('encode', 'decode', 'content_stream', 'overlay'),
+}
+
+
+def load(algo: str, name: str):
+    """
+    Import algo/name.py under a unique name (e.g. stego_algo1_encode).
+    Every folder has its own encode.py, so a plain import would mix them up.
+    Each module is loaded once per process.
+    """
+    if name not in MODULES.get(algo, ()):
+        raise KeyError(f"Unknown module {algo}/{name}.py")
+
+    key = f"stego_{algo}_{name}"
+    with _LOAD_LOCK:
+        module = sys.modules.get(key)
+        if module is None:
+            spec = importlib.util.spec_from_file_location(key, ROOT_DIR / algo / f"{name}.py")
+            module = importlib.util.module_from_spec(spec)
+            sys.modules[key] = module
+            try:
+                spec.loader.exec_module(module)
+            except BaseException:
+                del sys.modules[key]
+                raise
+    return module
+
+
+# Bumped whenever an algorithm's embedding format or cover analysis changes;
+# part of every cover-index and result-cache key.
+ALGORITHM_VERSIONS = {
+    'algo1': 2,
+    'algo2': 2,
+    'algo3': 5,
+    'algo4': 1,
+    'algo5': 3,
+    'autorski_projekt': 1,
+}
@@ -0,0 +1,241 @@
+"""
+'auto' mode: pick the algorithm for a cover and payload from a cost model.
+
+    python -m common.autoselect -m "secret" -i cover.txt -o stego --max-seconds 0.5
+    python -m common.autoselect -m "secret" -i cover.txt --prefer size --dry-run
+
+Every candidate is scored on the cover and payload size:
+  - capacity: common.capacity; candidates that cannot hold the payload drop out.
+    The payload is sized by common.jobs.payload_size, i.e. as that
+    candidate's encoder embeds it (compressed or not),
+  - encode time: cover bytes x seconds per cover byte. The rate comes from the
+    newest run of the matching workload in the benchmark history
+    (benchmark.py, preferring runs recorded on this host), else DEFAULT_RATES,
+  - output size: OUTPUT_MODELS, fitted on the sample covers.
+Among the candidates within --max-seconds / --max-output the fastest wins
+(--prefer size: the smallest output). After encoding the actual time and
+size are reported next to the prediction.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import sys
+import time
+from pathlib import Path
+
+from common import jobs
+from common.algorithms import ROOT_DIR, load
+from common.capacity import capacity, cover_lines, cover_sentences
+from common.sharding import SUFFIXES
+
+HISTORY_FILE = Path(os.environ.get('STEGO_BENCH_HISTORY', ROOT_DIR / 'bench_history.jsonl'))
+
+# (name, algo, job params); name is also the benchmark workload prefix
+CANDIDATES = [
+    ('algo1', 'algo1', {}),
+    ('algo1-compact', 'algo1', {'compact': '1'}),
+    ('algo2', 'algo2', {}),
+    ('algo3', 'algo3', {}),
+    ('algo5', 'algo5', {}),
+    ('autorski', 'autorski_projekt', {'scheme': 'packed'}),
+]
+
+# Seconds per cover byte of the encoders (keyword labeller for algo3),
+# measured on the sample covers; used until benchmark.py has recorded a run.
+DEFAULT_RATES = {
+    'algo1': 4.1e-9,
+    'algo1-compact': 3.6e-9,
+    'algo2': 4.8e-8,
+    'algo3': 2.5e-7,
+    'algo5': 2.1e-7,
+    'autorski': 2.0e-5,
+}
+
+
+def _algo1_output(cover, params, payload_size):
+    # a styled <div> per cover line (a bare one with compact=1)
+    per_line = 3.5 if params.get('compact') else 49
+    return len(cover) + per_line * len(cover_lines(cover))
+
+
+def _algo2_output(cover, params, payload_size):
+    # a <span> per line plus the markup around every embedded bit pair
+    return len(cover) + 17.5 * len(cover_lines(cover)) + 12 * 8 * payload_size
+
+
+def _algo3_output(cover, params, payload_size):
+    # only the sentences that carry bits are written: one emoticon, a comma and
+    # a space each (and the marker before the first), or (slots=k) a spaced
+    # emoticon per word-boundary group
+    mod = load('algo3', 'encode')
+    sentences = cover_sentences(cover)
+    slots = int(params.get('slots', 1))
+    used = sentences[:mod.sentences_needed(sentences, payload_size * 8, slots)]
+    if slots == 1:
+        return len(mod.MARKER.encode('utf-8')) + 1 + sum(len(s.encode('utf-8')) + 7 for s in used)
+    return sum(len(s.encode('utf-8')) + 1 + 5 * len(mod.slot_groups(len(s.split()), slots))
+               for s in used)
+
+
+def _algo5_output(cover, params, payload_size):
+    return len(cover)
+
+
+def _autorski_output(cover, params, payload_size):
+    # one separately coloured text object per glyph
+    return 7.6 * len(cover)
+
+
+OUTPUT_MODELS = {
+    'algo1': _algo1_output,
+    'algo2': _algo2_output,
+    'algo3': _algo3_output,
+    'algo5': _algo5_output,
+    'autorski_projekt': _autorski_output,
+}
+
+
+def calibrated_rates(history_path=HISTORY_FILE) -> dict:
+    """Seconds per cover byte per candidate, from the newest benchmark runs."""
+    rates = {name: (rate, 'default') for name, rate in DEFAULT_RATES.items()}
+    try:
+        with open(history_path, encoding='utf-8') as f:
+            history = [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return rates
+    host = platform.node()
+    # oldest first, runs from other hosts before ours: later records win
+    history.sort(key=lambda record: record.get('host') == host)
+    for record in history:
+        for name, _, _ in CANDIDATES:
+            result = record['results'].get(f"{name}-encode")
+            if result and result['bytes']:
+                rates[name] = (result['median'] / result['bytes'], f"benchmark {record['rev']}")
+    return rates
+
+
+def job_params(params: dict, message: str, compress=False) -> dict:
+    """A candidate's job parameters for message."""
+    params = dict(params, message=message)
+    if compress:
+        params['compress'] = '1'
+    return params
+
+
+def plan(cover: bytes, message: str, compress=False, max_seconds=None, max_output=None,
+         prefer='time', rates=None):
+    """
+    Score every candidate for message. Returns dicts sorted best first, with
+    'ok' False and a 'reason' for the ones that do not qualify.
+    """
+    try:
+        cover.decode('utf-8')
+    except UnicodeDecodeError:
+        raise ValueError("auto mode needs a UTF-8 text cover") from None
+    rates = rates or calibrated_rates()
+    scored = []
+    for name, algo, params in CANDIDATES:
+        entry = {'name': name, 'algo': algo, 'params': params, 'ok': False, 'reason': ''}
+        size = entry['payload_bytes'] = jobs.payload_size(algo, job_params(params, message, compress))
+        try:
+            entry['capacity'] = capacity(algo, cover, params)
+        except ImportError as e:
+            entry['reason'] = f"unavailable ({e})"
+            scored.append(entry)
+            continue
+        rate, source = rates[name]
+        entry['seconds'] = rate * len(cover)
+        entry['output_bytes'] = int(OUTPUT_MODELS[algo](cover, params, size))
+        entry['rate_source'] = source
+        if entry['capacity'] < size:
+            entry['reason'] = f"capacity {entry['capacity']} B < {size} B"
+        elif max_seconds is not None and entry['seconds'] > max_seconds:
+            entry['reason'] = f"predicted {entry['seconds']:.3f} s > {max_seconds} s"
+        elif max_output is not None and entry['output_bytes'] > max_output:
+            entry['reason'] = f"predicted {entry['output_bytes']} B > {max_output} B"
+        else:
+            entry['ok'] = True
+        scored.append(entry)
+
+    key = 'output_bytes' if prefer == 'size' else 'seconds'
+    scored.sort(key=lambda e: (not e['ok'], e.get(key, math.inf)))
+    return scored
+
+
+def run_plan(scored, message: str, cover: bytes, compress=False):
+    """
+    Encode with the best entry of plan(). Returns (choice, stego bytes);
+    choice is the plan entry plus 'actual_seconds' and 'actual_bytes'.
+    """
+    choice = scored[0]
+    if not choice['ok']:
+        reasons = '; '.join(f"{e['name']}: {e['reason']}" for e in scored)
+        raise ValueError(f"No algorithm meets the targets ({reasons})")
+    params = job_params(choice['params'], message, compress)
+    start = time.perf_counter()
+    stego = jobs.run(choice['algo'], 'encode', params, cover)
+    choice = dict(choice, actual_seconds=time.perf_counter() - start, actual_bytes=len(stego))
+    return choice, stego
+
+
+def encode_auto(message: str, cover: bytes, compress=False, **targets):
+    """plan() and run_plan() in one; targets are plan()'s keyword arguments."""
+    return run_plan(plan(cover, message, compress, **targets), message, cover, compress)
+
+
+def _report(scored, out=sys.stderr):
+    for e in scored:
+        if 'seconds' not in e:
+            print(f"  {e['name']:<14} {e['reason']}", file=out)
+            continue
+        verdict = 'ok' if e['ok'] else e['reason']
+        print(f"  {e['name']:<14} payload {e['payload_bytes']:>7} B  capacity {e['capacity']:>9} B  "
+              f"~{e['seconds'] * 1000:9.1f} ms  ~{e['output_bytes']:>10} B  {verdict}", file=out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Encode with the algorithm the cost model picks')
+
+    parser.add_argument('-m', '--message', required=True, help='Message to hide')
+    parser.add_argument('-i', '--input', required=True, help='Cover text file')
+    parser.add_argument('-o', '--output',
+                        help="Output file; without a suffix the algorithm's one is added")
+    parser.add_argument('-z', '--compress', action='store_true', help='Compress before embedding')
+    parser.add_argument('--max-seconds', type=float, help='Encode time target')
+    parser.add_argument('--max-output', type=int, help='Output size target in bytes')
+    parser.add_argument('--prefer', choices=['time', 'size'], default='time',
+                        help='What to minimise among the candidates meeting the targets')
+    parser.add_argument('--dry-run', action='store_true', help='Only print the plan')
+
+    args = parser.parse_args()
+    if not args.dry_run and not args.output:
+        parser.error("-o is required unless --dry-run is given")
+
+    cover = Path(args.input).read_bytes()
+    try:
+        scored = plan(cover, args.message, args.compress, args.max_seconds, args.max_output,
+                      args.prefer)
+        print(f"Cover {len(cover)} B, message {len(args.message.encode('utf-8'))} B:",
+              file=sys.stderr)
+        _report(scored)
+        if args.dry_run:
+            return
+        choice, stego = run_plan(scored, args.message, cover, args.compress)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    output = Path(args.output)
+    if not output.suffix:
+        output = output.with_suffix(SUFFIXES[choice['algo']])
+    output.write_bytes(stego)
+    print(f"{choice['name']} ({choice['rate_source']}): "
+          f"predicted {choice['seconds'] * 1000:.1f} ms / {choice['output_bytes']} B, "
+          f"actual {choice['actual_seconds'] * 1000:.1f} ms / {choice['actual_bytes']} B "
+          f"-> {output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Inputs and outputs for the encoder/decoder entry points that used to take
+file paths only.
+
+A source may be a path (str or os.PathLike), bytes-like data (bytes,
+bytearray, memoryview, mmap) or a binary stream with read(). A sink may be
+a path, a binary stream with write(), a writable buffer (bytearray,
+memoryview, mmap) that the result is copied into, or None to get the
+bytes back. Buffers are used in place; only paths and streams are read.
+Text is decompressed and path sinks compressed as in common/streams.py.
+"""
+import os
+
+
+def is_path(obj) -> bool:
+    return isinstance(obj, (str, os.PathLike))
+
+
+def read_source(source):
+    """Bytes-like view of source; buffers are returned without copying."""
+    if is_path(source):
+        with open(source, 'rb') as f:
+            return f.read()
+    try:
+        # checked before read(): an mmap has both
+        return memoryview(source).cast('B')
+    except TypeError:
+        return source.read()
+
+
+def read_text(source, encoding='utf-8') -> str:
+    """Text of source; gzip/zstd compressed stego files are decompressed."""
+    from common.streams import decompress
+    return str(decompress(read_source(source)), encoding)
+
+
+def write_sink(data, sink=None):
+    """
+    Deliver data to sink. Returns data itself when sink is None, otherwise
+    the number of bytes written. A buffer sink must be large enough.
+    """
+    if sink is None:
+        return data
+    if is_path(sink):
+        # compressed when the suffix says so (.gz, .zst; see common/streams.py)
+        from common.streams import open_output
+        with open_output(sink) as f:
+            f.write(data)
+        return len(data)
+    try:
+        target = memoryview(sink).cast('B')
+    except TypeError:
+        sink.write(data)
+        return len(data)
+    if target.readonly:
+        raise TypeError(f"Output buffer {type(sink).__name__} is read-only")
+    if len(target) < len(data):
+        raise ValueError(f"Output buffer holds {len(target)} bytes, {len(data)} needed")
+    target[:len(data)] = data
+    return len(data)
+
+
+def describe(obj) -> str:
+    """Name for log messages: the path, or the kind of buffer/stream."""
+    if obj is None:
+        return "<bytes>"
+    return os.fspath(obj) if is_path(obj) else f"<{type(obj).__name__}>"
@@ -0,0 +1,116 @@
+"""
+How many payload bytes fit into a cover, per algorithm.
+
+Covers are passed as bytes, the way common.jobs receives them. The numbers
+are exact for algo1, algo2, algo3 and autorski_projekt (packed scheme) and a
+guaranteed lower bound for algo5, whose usage depends on the bits embedded.
+They exclude the algorithm's own length header, so a payload of exactly
+capacity() bytes still fits.
+"""
+import re
+
+from common.algorithms import load
+
+# algo2 needs a space (block 01) and a punctuation mark (block 10) in a line
+# to be able to carry any 2-bit block; the first line without them ends the usable cover.
+_ALGO2_PUNCT = re.compile(r'[,.!;?]')
+
+
+def cover_lines(cover: bytes) -> list:
+    """algo1 cover lines, as in common.jobs."""
+    return cover.decode('utf-8').splitlines()
+
+
+def cover_sentences(cover: bytes) -> list:
+    """algo3 cover sentences: non-empty stripped lines, as in common.jobs."""
+    return [line.strip() for line in cover.decode('utf-8').splitlines() if line.strip()]
+
+
+def algo1_capacity(cover: bytes, params=None) -> int:
+    bits_per_line = int((params or {}).get('bits_per_line', 1))
+    return max(0, len(cover_lines(cover)) * bits_per_line // 8 - 4)
+
+
+def algo2_capacity(cover: bytes, params=None) -> int:
+    text = cover.replace(b'\r\n', b'\n').replace(b'\r', b'\n').decode('utf-8')
+    usable = 0
+    for line in text.split('\n'):
+        if ' ' not in line or not _ALGO2_PUNCT.search(line):
+            break
+        usable += 1
+    return usable * 2 // 8
+
+
+def algo3_capacity(cover: bytes, params=None) -> int:
+    mod = load('algo3', 'encode')
+    slots = int((params or {}).get('slots', 1))
+    n = min(mod.SET_BITS.values())
+    # covers are reused cyclically by the encoder; count each sentence once
+    bits = sum(mod.sentence_bits(sentence, slots, n) for sentence in cover_sentences(cover))
+    bits -= mod.FLAG_BITS
+    if slots > 1:
+        bits -= mod.HEADER_BITS
+    return max(0, bits) // 8
+
+
+def algo5_guaranteed_bits(categories, classes=2) -> int:
+    """
+    Bits the greedy algo5 encoder can embed whatever their values.
+
+    categories are the class numbers of the transformable letters. From the
+    letter it used last (index i), a class step s takes the next letter of
+    class (class[i] + s) mod k; worst[i] = 1 + min over all classes of worst
+    at their next letter, 0 when some class is missing. Each step carries
+    log2(k) bits.
+    """
+    n = len(categories)
+    worst = [0] * n
+    next_of = {}  # class -> nearest index to the right
+    for i in range(n - 1, -1, -1):
+        if len(next_of) == classes:
+            worst[i] = 1 + min(worst[j] for j in next_of.values())
+        next_of[categories[i]] = i
+    return (worst[0] if n else 0) * (classes.bit_length() - 1)
+
+
+def algo5_capacity(cover: bytes, params=None) -> int:
+    classes = int((params or {}).get('classes', 2))
+    stego = load('algo5', 'encode').FeatureCodingSteganography(classes)
+    text = cover.decode('utf-8').strip()
+    _, categories = stego.letter_classes(text)
+    # the first letter is left lowercase and the first embedded bit is the compression flag
+    return max(0, algo5_guaranteed_bits(categories.tolist()[1:], classes) - 1) // 8
+
+
+def autorski_capacity(cover: bytes, params=None) -> int:
+    """
+    Packed scheme only; the legacy scheme carries one character per glyph.
+    A PDF cover (overlay mode) carries one group per glyph it already shows.
+    """
+    bytes_per_glyph = int((params or {}).get('bytes_per_glyph', 2))
+    load('autorski_projekt', 'encode').channel_bits(bytes_per_glyph)  # rejects unsupported sizes
+    if cover.startswith(b'%PDF-'):
+        doc = load('autorski_projekt', 'decode').open_pdf(cover)
+        try:
+            glyphs = load('autorski_projekt', 'overlay').count_glyphs(doc)
+        finally:
+            doc.close()
+    else:
+        glyphs = len(cover.decode('utf-8'))
+    return max(0, glyphs * bytes_per_glyph - 4)
+
+
+CAPACITIES = {
+    'algo1': algo1_capacity,
+    'algo2': algo2_capacity,
+    'algo3': algo3_capacity,
+    'algo5': algo5_capacity,
+    'autorski_projekt': autorski_capacity,
+}
+
+
+def capacity(algo: str, cover: bytes, params=None) -> int:
+    """Payload bytes that fit into cover with the given job parameters."""
+    if algo not in CAPACITIES:
+        raise KeyError(f"No capacity model for {algo}")
+    return CAPACITIES[algo](cover, params or {})
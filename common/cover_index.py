@@ -0,0 +1,297 @@
+"""
+Persistent, memory-mapped index of a cover analysed for one algorithm.
+
+    python -m common.cover_index build --algo algo5 algo5/cover_sample.txt
+    python -m common.cover_index info .cover_index/algo5-v1-....idx
+
+The first run analyses the cover (line offsets, transformable letters,
+word spans, sentiment labels or glyph layout) and writes a binary index
+keyed by the cover's SHA-256, the algorithm version and the analysis
+parameters. Later runs mmap that file and read the arrays in place.
+Options that only say how to run the analysis (e.g. the ollama host of
+the algo3 labeller) are passed to it but are not part of the key.
+
+File layout:
+    b'STIX' | u32 header length | JSON header | zero padding to 8 | arrays
+The header lists every array as [typecode, byte offset, item count], with
+offsets counted from the (8-byte aligned) start of the array section.
+"""
+import argparse
+import array
+import hashlib
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+from pathlib import Path
+
+from common.algorithms import ALGORITHM_VERSIONS, ROOT_DIR, load
+
+MAGIC = b'STIX'
+INDEX_DIR = Path(os.environ.get('STEGO_INDEX_DIR', ROOT_DIR / '.cover_index'))
+
+SENTIMENTS = ('happy', 'sad', 'funny', 'angry')
+
+
+def _data_start(header_len):
+    start = 8 + header_len
+    return start + -start % 8
+
+
+class CoverIndex:
+    """Read-only view of an index file; arrays are memoryviews into the mmap."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = view = memoryview(self._mmap)
+        if view[:4] != MAGIC:
+            raise ValueError(f"{path} is not a cover index")
+        (header_len,) = struct.unpack_from('<I', view, 4)
+        self.header = json.loads(bytes(view[8:8 + header_len]))
+        base = _data_start(header_len)
+        self.arrays = {}
+        for name, (typecode, offset, count) in self.header['arrays'].items():
+            size = array.array(typecode).itemsize
+            start = base + offset
+            self.arrays[name] = view[start:start + count * size].cast(typecode)
+
+    def __getitem__(self, name):
+        return self.arrays[name]
+
+    def close(self):
+        for arr in self.arrays.values():
+            arr.release()
+        self.arrays.clear()
+        self._view.release()
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _params_key(params):
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+
+
+def index_path(cover: bytes, algo: str, params=None) -> Path:
+    digest = hashlib.sha256(cover).hexdigest()
+    version = ALGORITHM_VERSIONS[algo]
+    return INDEX_DIR / f"{algo}-v{version}-{digest[:32]}-{_params_key(params or {})}.idx"
+
+
+def write_index(path, cover: bytes, algo: str, params, arrays: dict):
+    """Write arrays (name -> array.array) atomically to path."""
+    header = {
+        'algo': algo,
+        'algo_version': ALGORITHM_VERSIONS[algo],
+        'cover_sha256': hashlib.sha256(cover).hexdigest(),
+        'cover_size': len(cover),
+        'params': params,
+    }
+    return write_arrays(path, header, arrays)
+
+
+def write_arrays(path, header: dict, arrays: dict):
+    """Write header (JSON-able) plus arrays atomically in the index file layout."""
+    layout, offset = {}, 0
+    for name, arr in arrays.items():
+        layout[name] = [arr.typecode, offset, len(arr)]
+        offset += len(arr) * arr.itemsize
+        offset += -offset % 8
+
+    header = dict(header, arrays=layout)
+    raw = json.dumps(header, sort_keys=True).encode('utf-8')
+    base = _data_start(len(raw))
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f'.tmp{os.getpid()}')
+    with open(tmp, 'wb') as f:
+        f.write(MAGIC + struct.pack('<I', len(raw)) + raw)
+        f.write(b'\0' * (base - 8 - len(raw)))
+        for name, arr in arrays.items():
+            f.write(arr.tobytes())
+            f.write(b'\0' * (-len(arr) * arr.itemsize % 8))
+    os.replace(tmp, path)
+    return path
+
+
+# --- analysers: cover bytes -> {name: array.array} ---
+
+def analyse_lines(cover: bytes, params):
+    """Byte offset of every line start plus a final end sentinel (algo1, algo2)."""
+    starts = array.array('Q', [0])
+    starts.extend(m.end() for m in re.finditer(b'\n', cover))
+    starts.append(len(cover) + 1)
+    return {'line_starts': starts}
+
+
+def analyse_words(cover: bytes, params):
+    """(start, end) character offsets of cover_text.split() words (algo4)."""
+    spans = array.array('Q')
+    for m in re.finditer(r'\S+', cover.decode('utf-8')):
+        spans.append(m.start())
+        spans.append(m.end())
+    return {'word_spans': spans}
+
+
+def analyse_feature_letters(cover: bytes, params):
+    """Character positions and class numbers of transformable letters (algo5, params['classes'])."""
+    stego = load('algo5', 'encode').FeatureCodingSteganography(int(params.get('classes', 2)))
+    positions, numbers = stego.letter_classes(cover.decode('utf-8'))
+    return {'positions': array.array('Q', positions.tobytes()),
+            'categories': array.array('B', numbers.tobytes())}
+
+
+def analyse_sentiment(cover: bytes, params):
+    """
+    Sentiment label per non-empty line (algo3); params['labeller'] is 'llm' or
+    'keywords'. The llm labeller takes chunk_size (0: one request for the
+    whole cover), concurrency, retries and host like the algo3 encoder.
+    """
+    mod = load('algo3', 'encode')
+    text = cover.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+    sentences = [line.strip() for line in text.split('\n') if line.strip()]
+    chunk_size = int(params.get('chunk_size', 40))
+    if params.get('labeller') == 'llm' and chunk_size > 0:
+        labels = mod.chunked_sentiment_labels_with_llm(
+            sentences, chunk_size, int(params.get('concurrency', 4)),
+            int(params.get('retries', 2)), params.get('host'))
+    elif params.get('labeller') == 'llm':
+        labels = mod.batch_sentiment_labels_with_llm(sentences)
+    else:
+        labels = mod.fallback_sentiment_batch(sentences)
+    return {'labels': array.array('B', (SENTIMENTS.index(label) for label in labels))}
+
+
+def analyse_glyph_layout(cover: bytes, params):
+    """Page number and x/y of every visible character (autorski_projekt)."""
+    mod = load('autorski_projekt', 'encode')
+    pages, xs, ys = array.array('I'), array.array('d'), array.array('d')
+    for page, x, y in mod.layout_glyphs(cover.decode('utf-8'), **params):
+        pages.append(page)
+        xs.append(x)
+        ys.append(y)
+    return {'pages': pages, 'xs': xs, 'ys': ys}
+
+
+ANALYSERS = {
+    'algo1': analyse_lines,
+    'algo2': analyse_lines,
+    'algo3': analyse_sentiment,
+    'algo4': analyse_words,
+    'algo5': analyse_feature_letters,
+    'autorski_projekt': analyse_glyph_layout,
+}
+
+
+def load_or_build(cover: bytes, algo: str, params=None, options=None) -> CoverIndex:
+    """
+    Open the index for (cover, algo, params), analysing the cover first if
+    needed; options go to the analyser along with params but not into the key.
+    """
+    params = params or {}
+    path = index_path(cover, algo, params)
+    if not path.exists():
+        arrays = ANALYSERS[algo](cover, dict(params, **(options or {})))
+        write_index(path, cover, algo, params, arrays)
+    return CoverIndex(path)
+
+
+# --- helpers turning index arrays back into what the encoders consume ---
+
+def indexed_lines(cover: bytes, index: CoverIndex) -> list:
+    """cover.split('\\n') without scanning the cover again."""
+    starts = index['line_starts']
+    return [cover[starts[i]:starts[i + 1] - 1].decode('utf-8') for i in range(len(starts) - 1)]
+
+
+def indexed_words(cover_text: str, index: CoverIndex) -> list:
+    spans = index['word_spans']
+    return [cover_text[spans[i]:spans[i + 1]] for i in range(0, len(spans), 2)]
+
+
+def indexed_labels(index: CoverIndex) -> list:
+    return [SENTIMENTS[i] for i in index['labels']]
+
+
+class IndexedTransformable:
+    """
+    Lazy stand-in for FeatureCodingSteganography.find_transformable():
+    item i is (position, char, category name), built only when the encoder
+    actually looks at it.
+    """
+
+    def __init__(self, cover_text: str, index: CoverIndex, category_names):
+        self.text = cover_text
+        self.positions = index['positions']
+        self.categories = index['categories']
+        self.names = list(category_names)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __getitem__(self, i):
+        pos = self.positions[i]
+        return pos, self.text[pos], self.names[self.categories[i]]
+
+
+def indexed_layout(index: CoverIndex):
+    return zip(index['pages'], index['xs'], index['ys'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build or inspect cover indexes')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    build = sub.add_parser('build', help='Analyse a cover and store its index')
+    build.add_argument('cover', help='Cover file')
+    build.add_argument('--algo', required=True, choices=sorted(ANALYSERS))
+    build.add_argument('--labeller', choices=['llm', 'keywords'], default='llm',
+                       help='algo3 only: how sentiment labels are produced')
+    build.add_argument('--chunk-size', type=int, default=40,
+                       help='algo3 llm labeller: cover lines per request (0 = whole cover)')
+    build.add_argument('--concurrency', type=int, default=4, help='algo3 llm labeller: parallel requests')
+    build.add_argument('--retries', type=int, default=2, help='algo3 llm labeller: retries per chunk')
+    build.add_argument('--host', help='algo3 llm labeller: ollama server URL')
+
+    info = sub.add_parser('info', help='Show an index header')
+    info.add_argument('index', help='Index file')
+
+    args = parser.parse_args()
+
+    if args.command == 'info':
+        with CoverIndex(args.index) as index:
+            print(json.dumps(index.header, indent=2))
+        return
+
+    with open(args.cover, 'rb') as f:
+        cover = f.read()
+    params, options = {}, {}
+    if args.algo == 'algo3':
+        params['labeller'] = args.labeller
+        options = {'chunk_size': args.chunk_size, 'concurrency': args.concurrency,
+                   'retries': args.retries, 'host': args.host}
+    elif args.algo == 'algo5':
+        # the algo5 encoder strips the cover before analysing it
+        cover = cover.decode('utf-8').strip().encode('utf-8')
+    elif args.algo == 'autorski_projekt':
+        print("Error: glyph layouts are keyed by layout parameters; build them via the encoder",
+              file=sys.stderr)
+        sys.exit(1)
+
+    with load_or_build(cover, args.algo, params, options) as index:
+        sizes = {name: len(arr) for name, arr in index.arrays.items()}
+        print(f"Index: {index.path}")
+        print(f"Arrays: {sizes}")
+
+
+if __name__ == "__main__":
+    main()
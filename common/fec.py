@@ -0,0 +1,128 @@
+"""
+Optional forward error correction for payloads, applied before embedding.
+
+Every payload nibble becomes one byte of an extended Hamming (8, 4) code
+(SECDED: one flipped bit per byte is corrected, two are detected), so the
+payload doubles in size. The code bytes are bit-interleaved in blocks of
+`depth` bytes: the first bits of all bytes of a block are sent first, then
+the second bits, and so on, so a burst of up to `depth` consecutive wrong
+bits (a few damaged cover lines, a run of misread glyph colours) touches
+every code byte at most once.
+
+    u32 payload length | payload      -> Hamming (8, 4) -> interleaved blocks
+
+The top bit of the length (common.framing.LENGTH_COMPRESSED) marks a
+payload framed by common.framing.
+
+Encoding and decoding are table lookups over whole NumPy arrays, and the
+interleaver is an 8x8 bit transpose on 64-bit words. The
+length is protected like the payload, but the algorithms' own headers
+(e.g. algo1's bit count) are not: they must survive for the decoder to
+hand over enough bits.
+"""
+import numpy as np
+
+from common.framing import LENGTH_COMPRESSED
+
+DEFAULT_DEPTH = 32
+
+
+def _build_tables():
+    nibbles = np.arange(16, dtype=np.uint8)
+    d = [(nibbles >> (3 - i)) & 1 for i in range(4)]
+    p1 = d[0] ^ d[1] ^ d[3]
+    p2 = d[0] ^ d[2] ^ d[3]
+    p3 = d[1] ^ d[2] ^ d[3]
+    bits = [p1, p2, d[0], p3, d[1], d[2], d[3]]
+    word = np.zeros(16, dtype=np.uint8)
+    for bit in bits:
+        word = (word << 1) | bit
+    parity = np.zeros(16, dtype=np.uint8)
+    for bit in bits:
+        parity ^= bit
+    encode = (word << 1) | parity
+
+    # nearest codeword for every received byte; two or more flipped bits are flagged
+    received = np.arange(256, dtype=np.uint8)
+    distance = np.unpackbits((received[:, None] ^ encode[None, :])[..., None], axis=-1).sum(axis=-1)
+    decode = distance.argmin(axis=1).astype(np.uint8)
+    status = np.minimum(distance.min(axis=1), 2)
+    return encode, decode, status.astype(np.uint8)
+
+
+# ENCODE[nibble] -> code byte; DECODE[byte] -> nibble; STATUS[byte]: 0 ok, 1 corrected, 2 uncorrectable
+ENCODE, DECODE, STATUS = _build_tables()
+# the same per payload byte / pair of code bytes (as big-endian u16), one lookup each
+BYTE_ENCODE = ((ENCODE[np.arange(256) >> 4].astype(np.uint16) << 8) | ENCODE[np.arange(256) & 0x0F]).astype('>u2')
+PAIR_DECODE = ((DECODE[np.arange(65536) >> 8] << 4) | DECODE[np.arange(65536) & 0xFF]).astype(np.uint8)
+
+
+def _transpose8(rows: np.ndarray) -> np.ndarray:
+    """Transpose every 8x8 bit matrix (8 consecutive bytes, MSB first)."""
+    x = rows.view('>u8').astype(np.uint64)
+    for shift, mask in ((7, 0x00AA00AA00AA00AA), (14, 0x0000CCCC0000CCCC), (28, 0x00000000F0F0F0F0)):
+        shift, mask = np.uint64(shift), np.uint64(mask)
+        t = (x ^ (x >> shift)) & mask
+        x ^= t ^ (t << shift)
+    return x.astype('>u8').view(np.uint8)
+
+
+def interleave(code: np.ndarray, depth: int) -> np.ndarray:
+    # bit j of the block's bytes, packed 8 at a time, for j = 0..7 in turn
+    planes = _transpose8(code).reshape(-1, depth // 8, 8)
+    return planes.transpose(0, 2, 1).reshape(-1)
+
+
+def deinterleave(data: np.ndarray, depth: int) -> np.ndarray:
+    planes = data.reshape(-1, 8, depth // 8).transpose(0, 2, 1)
+    return _transpose8(np.ascontiguousarray(planes).reshape(-1))
+
+
+def coded_size(payload_size: int, depth=DEFAULT_DEPTH) -> int:
+    """Bytes protect() produces for a payload of payload_size bytes."""
+    if depth < 8 or depth % 8:
+        raise ValueError("FEC depth must be a multiple of 8 (the length header fills one block)")
+    code = (4 + payload_size) * 2
+    return code + -code % depth
+
+
+def protect(data: bytes, depth=DEFAULT_DEPTH, compressed=False) -> bytes:
+    """Length header + data, Hamming (8, 4) coded and interleaved; compressed: data is framed."""
+    if len(data) >= LENGTH_COMPRESSED:
+        raise ValueError("FEC payload must be shorter than 2**31 bytes")
+    header = len(data) | (LENGTH_COMPRESSED if compressed else 0)
+    framed = np.frombuffer(header.to_bytes(4, 'big') + bytes(data), dtype=np.uint8)
+    code = np.zeros(coded_size(len(data), depth), dtype=np.uint8)
+    code[:framed.size * 2] = BYTE_ENCODE[framed].view(np.uint8)
+    return interleave(code, depth).tobytes()
+
+
+def _decode(code: np.ndarray):
+    status = np.bincount(STATUS[code], minlength=3)
+    return PAIR_DECODE[code.view('>u2')], int(status[1]), int(status[2])
+
+
+def recover(data, depth=DEFAULT_DEPTH):
+    """
+    Inverse of protect(). Trailing bytes past the coded block (decoder padding)
+    are ignored. Returns (payload, stats) with stats the number of 'corrected'
+    and 'uncorrectable' code bytes and whether the payload is 'compressed';
+    the payload is returned even when some were uncorrectable.
+    """
+    received = np.frombuffer(bytes(data), dtype=np.uint8)
+    if received.size < coded_size(0, depth):
+        raise ValueError("FEC data shorter than one block")
+    header, _, failed = _decode(deinterleave(received[:depth], depth)[:8])
+    if failed:
+        raise ValueError("FEC length header is damaged beyond repair")
+    length = int.from_bytes(header.tobytes(), 'big')
+    compressed = bool(length & LENGTH_COMPRESSED)
+    length &= ~LENGTH_COMPRESSED
+    total = coded_size(length, depth)
+    if total > received.size:
+        raise ValueError(f"FEC data truncated: {received.size} of {total} bytes")
+
+    code = deinterleave(received[:total], depth)[:(4 + length) * 2]
+    framed, corrected, failed = _decode(code)
+    return framed[4:].tobytes(), {'corrected': corrected, 'uncorrectable': failed,
+                                  'compressed': compressed}
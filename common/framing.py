@@ -0,0 +1,134 @@
+"""
+Optional compression of the payload before it is embedded.
+
+A framed payload is one header byte followed by the (possibly compressed)
+data: the header's high nibble is 0xA and the low nibble the codec id.
+Whether a payload is framed is recorded by its carrier, which the encoder
+always writes, and never guessed from the first byte (a plain message may
+start with 0xA0-0xA3 as well):
+  - algo1 and common.fec: the top bit of their 32-bit length (LENGTH_COMPRESSED),
+  - algo2: <meta name="stego-compressed"> in the document head,
+  - algo3 and algo5: the first embedded bit (flag_bit / split_flag). Streams
+    written before the flag have none; the encoders mark flagged streams in a
+    way those never are (algo3: encode.MARKER, algo5: a lowercase first
+    letter), and unmarked streams are decoded as before,
+  - common.sharding: a flag in the shard header.
+Decoders unframe only when that flag is set.
+"""
+import lzma
+import zlib
+
+MAGIC = 0xA0
+
+RAW, ZLIB, LZMA, ZSTD = 0, 1, 2, 3
+CODEC_NAMES = {'raw': RAW, 'zlib': ZLIB, 'lzma': LZMA, 'zstd': ZSTD}
+
+# Below this size the header and codec overhead eats any gain.
+MIN_COMPRESS_SIZE = 24
+# lzma only beats zlib on text once there is enough context to model.
+MIN_LZMA_SIZE = 2048
+
+# Set in a 32-bit length header: the payload that follows is framed.
+LENGTH_COMPRESSED = 1 << 31
+
+# Raw streams (no container headers): every byte counts when one byte costs
+# up to six cover lines.
+_LZMA_FILTERS = [{'id': lzma.FILTER_LZMA2, 'preset': 9 | lzma.PRESET_EXTREME}]
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+
+def _compress(data: bytes, codec: int) -> bytes:
+    if codec == RAW:
+        return data
+    if codec == ZLIB:
+        c = zlib.compressobj(9, zlib.DEFLATED, -15)
+        return c.compress(data) + c.flush()
+    if codec == LZMA:
+        return lzma.compress(data, format=lzma.FORMAT_RAW, filters=_LZMA_FILTERS)
+    if codec == ZSTD:
+        zstandard = _zstd()
+        if zstandard is None:
+            raise ValueError("zstd codec requires the zstandard package")
+        return zstandard.ZstdCompressor(level=19, write_content_size=False,
+                                        write_checksum=False).compress(data)
+    raise ValueError(f"Unknown codec id {codec}")
+
+
+def _decompress(data: bytes, codec: int) -> bytes:
+    # Decoders may hand over a few padding bits past the end of the stream,
+    # so every codec is driven through a streaming object that stops at EOF.
+    if codec == RAW:
+        return data
+    if codec == ZLIB:
+        return zlib.decompressobj(-15).decompress(data)
+    if codec == LZMA:
+        return lzma.LZMADecompressor(lzma.FORMAT_RAW, filters=_LZMA_FILTERS).decompress(data)
+    if codec == ZSTD:
+        zstandard = _zstd()
+        if zstandard is None:
+            raise ValueError("Payload is zstd-compressed but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    raise ValueError(f"Unknown codec id {codec}")
+
+
+def choose_codec(data: bytes) -> int:
+    """Try the codecs that make sense for this size and keep the smallest."""
+    if len(data) < MIN_COMPRESS_SIZE:
+        return RAW
+
+    candidates = [ZLIB]
+    if len(data) >= MIN_LZMA_SIZE:
+        candidates.append(LZMA)
+    if _zstd() is not None:
+        candidates.append(ZSTD)
+
+    best, best_size = RAW, len(data)
+    for codec in candidates:
+        size = len(_compress(data, codec))
+        if size < best_size:
+            best, best_size = codec, size
+    return best
+
+
+def frame_payload(data: bytes, codec='auto') -> bytes:
+    """Compress data with codec ('auto', 'raw', 'zlib', 'lzma', 'zstd') and prepend the header."""
+    data = bytes(data)
+    codec_id = choose_codec(data) if codec == 'auto' else CODEC_NAMES[codec]
+    return bytes([MAGIC | codec_id]) + _compress(data, codec_id)
+
+
+def is_framed(data: bytes) -> bool:
+    return len(data) > 0 and data[0] & 0xF0 == MAGIC and data[0] & 0x0F in CODEC_NAMES.values()
+
+
+def unframe_payload(data: bytes) -> bytes:
+    if not is_framed(data):
+        raise ValueError("Payload has no compression header")
+    try:
+        return _decompress(bytes(data[1:]), data[0] & 0x0F)
+    except (zlib.error, lzma.LZMAError) as e:
+        raise ValueError(f"Compressed payload is damaged: {e}") from None
+
+
+def flag_bit(compressed: bool) -> str:
+    """Leading bit of an algo3 / algo5 bit stream."""
+    return '1' if compressed else '0'
+
+
+def split_flag(bits: str):
+    """(payload bits, compressed) of a bit stream that starts with flag_bit()."""
+    return bits[1:], bits[:1] == '1'
+
+
+def payload_to_text(data: bytes, compressed=False) -> str:
+    """Embedded payload -> message text (UTF-8); a compressed payload is unframed first."""
+    if compressed:
+        data = unframe_payload(data)
+    return bytes(data).decode('utf-8', errors='replace')
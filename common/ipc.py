@@ -0,0 +1,65 @@
+"""
+Framing for the local daemon socket (daemon.py, stegoctl.py).
+
+Every message, in both directions, is one frame:
+    u32 header length | u32 body length | JSON header | body
+Requests carry {"algo", "op", "params"} (or {"op": "status"}); replies carry
+{"ok": true, "content_type": ...} or {"ok": false, "error": ...}.
+Kept free of heavy imports so the client starts fast.
+"""
+import json
+import os
+import struct
+import tempfile
+
+FRAME = struct.Struct('>II')
+MAX_HEADER_SIZE = 64 * 1024
+
+
+def socket_path() -> str:
+    """$STEGO_SOCKET, else stego-<uid>.sock in $XDG_RUNTIME_DIR or the temp dir."""
+    path = os.environ.get('STEGO_SOCKET')
+    if path:
+        return path
+    base = os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir()
+    return os.path.join(base, f"stego-{os.getuid()}.sock")
+
+
+def pack_frame(header: dict, body: bytes = b'') -> bytes:
+    raw = json.dumps(header).encode('utf-8')
+    return FRAME.pack(len(raw), len(body)) + raw + body
+
+
+def _parse(prefix, max_body):
+    header_len, body_len = FRAME.unpack(prefix)
+    if header_len > MAX_HEADER_SIZE:
+        raise ValueError("Frame header too large")
+    if max_body is not None and body_len > max_body:
+        raise ValueError(f"Body of {body_len} bytes exceeds the limit of {max_body}")
+    return header_len, body_len
+
+
+def _recv_exactly(sock, n) -> bytes:
+    buf = bytearray(n)
+    view = memoryview(buf)
+    got = 0
+    while got < n:
+        size = sock.recv_into(view[got:])
+        if size == 0:
+            raise ConnectionError("Connection closed mid-frame")
+        got += size
+    return bytes(buf)
+
+
+def recv_frame(sock, max_body=None):
+    """Blocking read of one frame from a socket: (header dict, body bytes)."""
+    header_len, body_len = _parse(_recv_exactly(sock, FRAME.size), max_body)
+    header = json.loads(_recv_exactly(sock, header_len))
+    return header, _recv_exactly(sock, body_len)
+
+
+async def read_frame(reader, max_body=None):
+    """asyncio counterpart of recv_frame; raises IncompleteReadError at EOF."""
+    header_len, body_len = _parse(await reader.readexactly(FRAME.size), max_body)
+    header = json.loads(await reader.readexactly(header_len))
+    return header, await reader.readexactly(body_len)
@@ -0,0 +1,292 @@
+"""
+Uniform (algo, op) entry points over the algorithm scripts.
+
+Every job takes a dict of string parameters plus the request body as bytes
+and returns the result as bytes, so it can run in a worker process and be
+shipped back over HTTP or a socket unchanged. Encoders accept compress=1 to
+frame the message with common.framing; the stego file records that, so
+decoders need no parameter for it.
+fec=1 on both sides protects the payload with common.fec (fec_depth sets the
+interleaving depth). slots=k (2-16) makes algo3 place up to k emoticons per
+sentence; classes=4 or 8 (on both sides) gives algo5 log2(k) bits per
+capital. index=1 makes algo2, algo3, algo5 and autorski_projekt encoders reuse
+the persistent cover analysis from common.cover_index. A PDF body given to the
+autorski_projekt encoder is a cover PDF for the overlay mode. algo1/update
+and algo2/update take an existing stego document as the body and swap in a
+new message, changing only the lines whose bits differ. run() given a
+common.result_cache.ResultCache answers repeated encodes from it (cache=0
+skips it for one request). payload_size() says how many bytes an encode
+embeds, to compare with common.capacity.
+"""
+import contextlib
+import io
+import sys
+import threading
+
+from common.algorithms import MODULES, load
+from common.buffers import read_text
+from common.cover_index import IndexedTransformable, indexed_labels, load_or_build
+from common.framing import frame_payload, payload_to_text, unframe_payload
+
+
+_quiet_lock = threading.Lock()
+_quiet_depth = 0
+_saved_stdout = None
+
+
+@contextlib.contextmanager
+def _quiet():
+    """
+    redirect_stdout that several threads can be inside at once (app.py runs
+    jobs on a thread pool): stdout is swapped by the first thread in and
+    restored by the last one out, not by whichever leaves first.
+    """
+    global _quiet_depth, _saved_stdout
+    with _quiet_lock:
+        if _quiet_depth == 0:
+            _saved_stdout, sys.stdout = sys.stdout, io.StringIO()
+        _quiet_depth += 1
+    try:
+        yield
+    finally:
+        with _quiet_lock:
+            _quiet_depth -= 1
+            if _quiet_depth == 0:
+                sys.stdout, _saved_stdout = _saved_stdout, None
+
+
+def _text(body: bytes) -> str:
+    # gzip/zstd bodies (e.g. a compressed stego file) are decompressed
+    return read_text(body)
+
+
+def _message(params: dict) -> str:
+    message = params.get('message', '')
+    if not message:
+        raise ValueError("Missing 'message' parameter")
+    return message
+
+
+def _flag(params: dict, name: str) -> bool:
+    return params.get(name, '').lower() in ('1', 'true', 'yes')
+
+
+def _payload(params: dict) -> bytes:
+    """The message as UTF-8, framed with common.framing when compress=1."""
+    payload = _message(params).encode('utf-8')
+    return frame_payload(payload) if _flag(params, 'compress') else payload
+
+
+def algo1_encode(params, body):
+    mod = load('algo1', 'encode')
+    cover_lines = _text(body).splitlines()
+    return mod.encode_html(None, cover_lines, _message(params), compress=_flag(params, 'compress'),
+                           compact=_flag(params, 'compact'),
+                           bits_per_line=int(params.get('bits_per_line', 1)))
+
+
+def algo1_decode(params, body):
+    mod = load('algo1', 'decode')
+    return mod.decode_html(body).encode('utf-8')
+
+
+def algo1_update(params, body):
+    mod = load('algo1', 'update')
+    return mod.update_html(body, _message(params), compress=_flag(params, 'compress'))
+
+
+def algo2_encode(params, body):
+    mod = load('algo2', 'algos')
+    return mod.encode_html_with_formatting(body, _message(params), None,
+                                           compress=_flag(params, 'compress'),
+                                           use_index=_flag(params, 'index'))
+
+
+def algo2_decode(params, body):
+    mod = load('algo2', 'algos')
+    return mod.decode_html_with_formatting(body).encode('utf-8')
+
+
+def algo2_update(params, body):
+    mod = load('algo2', 'algos')
+    return mod.update_html_with_formatting(body, _message(params), compress=_flag(params, 'compress'))
+
+
+def algo3_encode(params, body):
+    mod = load('algo3', 'encode')
+    cover_sentences = [line.strip() for line in _text(body).splitlines() if line.strip()]
+    if not cover_sentences:
+        raise ValueError("Cover is empty")
+    slots = int(params.get('slots', 1))
+    secret_bits = mod.bytes_to_binary(_payload(params))
+    # only the sentences that will carry bits are labelled
+    used = mod.sentences_needed(cover_sentences, len(secret_bits), slots)
+    labeller = params.get('labels', 'keywords')
+    labels = None
+    if _flag(params, 'index'):
+        with load_or_build(body, 'algo3', {'labeller': labeller}) as index:
+            labels = indexed_labels(index)
+        if len(labels) != len(cover_sentences):
+            labels = None  # line breaks the index does not split on
+        else:
+            labels = labels[:used]
+    cover_sentences = cover_sentences[:used]
+    if labels is None and labeller == 'llm':
+        labels = mod.batch_sentiment_labels_with_llm(cover_sentences)
+    elif labels is None:
+        labels = mod.fallback_sentiment_batch(cover_sentences)
+    results = mod.create_stego_sentences(cover_sentences, secret_bits, labels, slots,
+                                         compressed=_flag(params, 'compress'))
+    return ''.join(r['sentence'] + '\n' for r in results).encode('utf-8')
+
+
+def algo3_decode(params, body):
+    mod = load('algo3', 'decode')
+    sentences = [line.strip() for line in _text(body).splitlines() if line.strip()]
+    decoded_text, _ = mod.decode_messages(sentences)
+    return decoded_text.encode('utf-8')
+
+
+def algo5_encode(params, body):
+    enc = load('algo5', 'encode')
+    classes = int(params.get('classes', 2))
+    stego = enc.FeatureCodingSteganography(classes)
+    cover_text = _text(body).strip()
+    compress = _flag(params, 'compress')
+    secret_bits = enc.bytes_to_binary(_payload(params))
+    if not _flag(params, 'index'):
+        return stego.encode(cover_text, secret_bits, compressed=compress).encode('utf-8')
+    with load_or_build(cover_text.encode('utf-8'), 'algo5', enc.index_params(classes)) as index:
+        transformable = IndexedTransformable(cover_text, index, stego.categories)
+        return stego.encode(cover_text, secret_bits, transformable, compress).encode('utf-8')
+
+
+def algo5_decode(params, body):
+    stego = load('algo5', 'decode').FeatureCodingSteganography(int(params.get('classes', 2)))
+    text = _text(body)
+    bits = stego.decode(text)
+    if not bits:
+        raise ValueError("No hidden message found")
+    return payload_to_text(*stego.payload(bits, stego.marked(text))).encode('utf-8')
+
+
+def autorski_encode(params, body):
+    if body.startswith(b'%PDF-'):
+        # an existing PDF: re-colour its glyphs (decode with parser=stream)
+        return load('autorski_projekt', 'overlay').overlay_hidden_message(
+            body, _message(params), scheme=params.get('scheme', 'legacy'),
+            bytes_per_glyph=int(params.get('bytes_per_glyph', 2)))
+    mod = load('autorski_projekt', 'encode')
+    return mod.embed_hidden_message(None, _text(body), _message(params),
+                                    scheme=params.get('scheme', 'legacy'),
+                                    bytes_per_glyph=int(params.get('bytes_per_glyph', 2)),
+                                    use_index=_flag(params, 'index'))
+
+
+def autorski_decode(params, body):
+    mod = load('autorski_projekt', 'decode')
+    return mod.extract_hidden_message(body, scheme=params.get('scheme', 'legacy'),
+                                      bytes_per_glyph=int(params.get('bytes_per_glyph', 2)),
+                                      parser=params.get('parser', 'layout')).encode('utf-8')
+
+
+def fec_encode(algo, params, body):
+    from common import fec
+    from common.sharding import CODECS
+    depth = int(params.get('fec_depth', fec.DEFAULT_DEPTH))
+    return CODECS[algo][0](params, body, fec.protect(_payload(params), depth,
+                                                     compressed=_flag(params, 'compress')))
+
+
+def fec_decode(algo, params, body):
+    from common import fec
+    from common.sharding import CODECS
+    depth = int(params.get('fec_depth', fec.DEFAULT_DEPTH))
+    payload, stats = fec.recover(CODECS[algo][1](params, body), depth)
+    return unframe_payload(payload) if stats['compressed'] else payload
+
+
+JOBS = {
+    ('algo1', 'encode'): algo1_encode,
+    ('algo1', 'decode'): algo1_decode,
+    ('algo1', 'update'): algo1_update,
+    ('algo2', 'encode'): algo2_encode,
+    ('algo2', 'decode'): algo2_decode,
+    ('algo2', 'update'): algo2_update,
+    ('algo3', 'encode'): algo3_encode,
+    ('algo3', 'decode'): algo3_decode,
+    ('algo5', 'encode'): algo5_encode,
+    ('algo5', 'decode'): algo5_decode,
+    ('autorski_projekt', 'encode'): autorski_encode,
+    ('autorski_projekt', 'decode'): autorski_decode,
+}
+
+CONTENT_TYPES = {
+    ('algo1', 'encode'): 'text/html; charset=utf-8',
+    ('algo2', 'encode'): 'text/html; charset=utf-8',
+    ('algo1', 'update'): 'text/html; charset=utf-8',
+    ('algo2', 'update'): 'text/html; charset=utf-8',
+    ('autorski_projekt', 'encode'): 'application/pdf',
+}
+
+
+def payload_size(algo: str, params: dict) -> int:
+    """
+    Bytes run(algo, 'encode', params, ...) embeds, counted the way
+    common.capacity counts them: after compress=1 and fec=1, without the
+    algorithm's own length header and flag bits.
+    """
+    if _flag(params, 'fec'):
+        from common import fec
+        return fec.coded_size(len(_payload(params)), int(params.get('fec_depth', fec.DEFAULT_DEPTH)))
+    if algo == 'autorski_projekt':
+        # the PDF encoders embed the message as is, compress=1 or not
+        return len(_message(params).encode('utf-8'))
+    return len(_payload(params))
+
+
+def content_type(algo: str, op: str) -> str:
+    return CONTENT_TYPES.get((algo, op), 'text/plain; charset=utf-8')
+
+
+def preload():
+    """
+    Import every algorithm script up front (bs4, lxml, fitz, reportlab with
+    them), so a long-lived worker pays for it once. Scripts whose optional
+    dependencies are missing are skipped; their jobs fail when called.
+    """
+    loaded = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for algo, names in MODULES.items():
+            for name in names:
+                try:
+                    load(algo, name)
+                except ImportError:
+                    continue
+                loaded.append(f"{algo}/{name}")
+        if 'autorski_projekt/encode' in loaded:
+            # reportlab parses the font metrics on first use
+            load('autorski_projekt', 'encode').pdfmetrics.stringWidth('a', 'Helvetica', 12)
+    return loaded
+
+
+def run(algo: str, op: str, params: dict, body: bytes, cache=None) -> bytes:
+    """Run one job; the scripts' progress prints are swallowed."""
+    job = JOBS.get((algo, op))
+    if job is None:
+        raise KeyError(f"Unknown job {algo}/{op}")
+    key = None
+    if cache is not None:
+        key, result = cache.lookup(algo, op, params, body)
+        if result is not None:
+            return result
+    with _quiet():
+        if _flag(params, 'fec'):
+            if op == 'update':
+                raise ValueError("fec=1 is not supported by update; re-encode instead")
+            result = (fec_encode if op == 'encode' else fec_decode)(algo, params, body)
+        else:
+            result = job(params, body)
+    if key is not None:
+        cache.put(key, result)
+    return result
@@ -0,0 +1,110 @@
+"""
+Patch byte ranges of an existing stego document instead of rewriting it.
+
+    with PatchTarget('stego.html') as doc:
+        ...                                 # parse doc.data (an mmap for paths)
+        doc.apply([(start, end, b'...')])   # sorted, non-overlapping ranges
+
+Patches that keep the length of what they replace are written in place
+(through the mmap for a path, straight into a bytearray or writable mmap).
+When the patches change the length, the span from the first to the last
+patch is rebuilt and the rest of the document shifted in place (a path's
+mmap is resized, a bytearray grows or shrinks); an mmap passed in cannot
+be resized, so that raises ValueError. Read-only sources (bytes, streams)
+get the patched bytes back. Compressed stego files (common/streams.py)
+have to be re-encoded.
+"""
+import mmap
+
+from common.buffers import is_path, read_source
+from common.streams import detect
+
+
+class PatchTarget:
+    """
+    data is the document to parse: an mmap for a path, the object itself for
+    bytes, bytearray and mmap, a copy for anything else read_source() takes.
+    """
+
+    def __init__(self, target):
+        self.target = target
+        self._file = None
+        self._mmap = None
+        if is_path(target):
+            self._file = open(target, 'r+b')
+            try:
+                self._mmap = mmap.mmap(self._file.fileno(), 0)
+            except ValueError:  # empty file
+                self._file.close()
+                raise ValueError(f"{target} is empty") from None
+            self.data = self._mmap
+            self.writable = True
+        elif isinstance(target, (bytes, bytearray, mmap.mmap)):
+            self.data = target
+            with memoryview(target) as view:
+                self.writable = not view.readonly
+        else:
+            self.data = bytes(read_source(target))
+            self.writable = False
+        if detect(self.data[:4]):
+            self.close()
+            raise ValueError("Compressed stego files cannot be patched; decompress them first")
+
+    def apply(self, patches):
+        """
+        Apply (start, end, replacement) patches. Returns the number of bytes
+        written for a path or a writable buffer, the patched document otherwise.
+        """
+        if not self.writable:
+            return self._patched(self.data, patches, 0, len(self.data))
+        if all(end - start == len(new) for start, end, new in patches):
+            for start, end, new in patches:
+                self.data[start:end] = new
+            if self._mmap is not None:
+                self._mmap.flush()
+            return sum(len(new) for _, _, new in patches)
+
+        # the region from the first to the last patch is rebuilt, the rest is only shifted
+        first, last = patches[0][0], patches[-1][1]
+        middle = self._patched(self.data, patches, first, last)
+        if self._mmap is None:
+            if not isinstance(self.target, bytearray):
+                raise ValueError(f"{type(self.target).__name__} cannot change size; "
+                                 f"the update needs lines of another length")
+            self.target[first:last] = middle
+            return len(middle)
+
+        size = len(self._mmap)
+        delta = len(middle) - (last - first)
+        if delta > 0:
+            self._mmap.resize(size + delta)
+        self._mmap.move(last + delta, last, size - last)
+        if delta < 0:
+            self._mmap.resize(size + delta)
+        self._mmap[first:first + len(middle)] = middle
+        self._mmap.flush()
+        return len(middle) + size - last
+
+    @staticmethod
+    def _patched(data, patches, start, stop) -> bytes:
+        parts, pos = [], start
+        for patch_start, patch_end, new in patches:
+            parts.append(data[pos:patch_start])
+            parts.append(new)
+            pos = patch_end
+        parts.append(data[pos:stop])
+        return b''.join(parts)
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,224 @@
+"""
+Content-addressed cache of encode results.
+
+    cache = ResultCache()
+    stego = jobs.run('algo5', 'encode', {'message': 'secret'}, cover, cache=cache)
+    cache.stats()   # {'hits': 0, 'misses': 1, 'hit_rate': 0.0, ...}
+
+    python -m common.result_cache stats
+    python -m common.result_cache clear
+
+A request is keyed by the SHA-256 of its algorithm, ALGORITHM_VERSIONS
+entry, source files (source_digest, hashed once per process, so an edit
+that changes the output misses even without a version bump), cover (the
+request body), message and remaining job parameters, so re-encoding the
+same message into the same cover with the same settings returns the
+stored bytes. Only encode is cached; cache=0 in the
+parameters skips the cache for one request. Entries are files named by
+the key, written atomically (temporary file + os.replace), and their
+mtime is bumped on every hit. Once the directory grows past max_bytes
+the least recently used entries are deleted until it is back under
+LOW_WATER of the limit. Hit and miss counters are per ResultCache
+object; server.py and daemon.py report theirs in /health and status.
+"""
+import argparse
+import functools
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+from common.algorithms import ALGORITHM_VERSIONS, MODULES, ROOT_DIR
+
+CACHE_DIR = Path(os.environ.get('STEGO_RESULT_CACHE_DIR', ROOT_DIR / '.result_cache'))
+MAX_BYTES = int(os.environ.get('STEGO_RESULT_CACHE_BYTES', 256 * 1024 * 1024))
+LOW_WATER = 0.9
+
+CACHED_OPS = ('encode',)
+# common modules the jobs and the algorithm scripts use to produce a result
+COMMON_SOURCES = ('jobs', 'framing', 'fec', 'cover_index', 'buffers', 'streams', 'patching')
+
+
+@functools.lru_cache(maxsize=None)
+def source_digest(algo: str) -> str:
+    """SHA-256 of the source files an algorithm's results depend on."""
+    paths = [ROOT_DIR / algo / f"{name}.py" for name in MODULES[algo]]
+    paths += [ROOT_DIR / 'common' / f"{name}.py" for name in COMMON_SOURCES]
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(path.relative_to(ROOT_DIR).as_posix().encode('utf-8') + b'\0')
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def request_key(algo: str, op: str, params: dict, body: bytes):
+    """Hex key of a job request, or None when its result is not cached."""
+    if op not in CACHED_OPS or algo not in ALGORITHM_VERSIONS:
+        return None
+    if params.get('cache', '').lower() in ('0', 'false', 'no'):
+        return None
+    message = params.get('message', '')
+    rest = {name: value for name, value in params.items() if name not in ('message', 'cache')}
+    key = {
+        'algo': algo,
+        'op': op,
+        'algo_version': ALGORITHM_VERSIONS[algo],
+        'source_sha256': source_digest(algo),
+        'cover_sha256': hashlib.sha256(body).hexdigest(),
+        'payload_sha256': hashlib.sha256(message.encode('utf-8')).hexdigest(),
+        'params': rest,
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """Size-bounded LRU cache of results on disk; safe to share between threads."""
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=MAX_BYTES):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self._bytes = None  # directory size, counted on first use
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / key
+
+    def get(self, key: str):
+        """Stored result for key, or None."""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, key: str, data: bytes) -> bool:
+        """
+        Store data under key. Results larger than the whole cache are skipped,
+        and so is a write that fails (full or read-only disk): it only costs
+        the cache.
+        """
+        if len(data) > self.max_bytes:
+            return False
+        path = self._path(key)
+        tmp = path.with_suffix(f'.tmp{os.getpid()}-{threading.get_ident()}')
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError:
+            tmp.unlink(missing_ok=True)
+            return False
+        with self._lock:
+            self.stores += 1
+            if self._bytes is None:
+                self._bytes = sum(size for _, size, _ in self._entries())
+            else:
+                self._bytes += len(data)
+            if self._bytes > self.max_bytes:
+                self._evict()
+        return True
+
+    def lookup(self, algo: str, op: str, params: dict, body: bytes):
+        """(key, stored result or None); key is None for requests that are not cached."""
+        key = request_key(algo, op, params, body)
+        return key, (self.get(key) if key is not None else None)
+
+    def _entries(self):
+        """(path, size, mtime) of every stored result."""
+        entries = []
+        if not self.directory.is_dir():
+            return entries
+        for sub in os.scandir(self.directory):
+            if not sub.is_dir():
+                continue
+            for entry in os.scandir(sub.path):
+                if '.tmp' in entry.name:
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue  # removed by another process
+                entries.append((entry.path, st.st_size, st.st_mtime_ns))
+        return entries
+
+    def _evict(self):
+        # other processes share the directory, so the size is recounted first
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * LOW_WATER
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            total -= size
+            self.evictions += 1
+        self._bytes = total
+
+    def clear(self) -> int:
+        """Delete every stored result; returns how many there were."""
+        with self._lock:
+            entries = self._entries()
+            for path, _, _ in entries:
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+            self._bytes = 0
+        return len(entries)
+
+    def stats(self, scan=False) -> dict:
+        """Counters since this object was created; scan=True also sizes the directory."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+                'stores': self.stores,
+                'evictions': self.evictions,
+                'max_bytes': self.max_bytes,
+            }
+            if scan:
+                entries = self._entries()
+                self._bytes = sum(size for _, size, _ in entries)
+                stats['entries'] = len(entries)
+            if self._bytes is not None:
+                stats['bytes'] = self._bytes
+        return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect or clear the encode result cache')
+
+    parser.add_argument('command', choices=['stats', 'clear'])
+    parser.add_argument('--dir', default=CACHE_DIR, help='Cache directory')
+
+    args = parser.parse_args()
+
+    cache = ResultCache(args.dir)
+    if args.command == 'clear':
+        print(f"Removed {cache.clear()} cached result(s) from {cache.directory}")
+        return
+    stats = cache.stats(scan=True)
+    print(json.dumps({'directory': str(cache.directory), 'entries': stats['entries'],
+                      'bytes': stats['bytes'], 'max_bytes': stats['max_bytes']}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+"""
+Random access to the payload of large algo1 / algo5 stego files.
+
+    with open_reader('stego.html', 'algo1') as reader:
+        reader.size                      # payload bytes (algo1: its 32-bit header)
+        reader.read_range(4096, 4160)    # payload bytes [4096, 4160)
+        reader.seek(1 << 20)
+        reader.read(64)
+
+    python -m common.seek algo1 stego.html 4096 4160 > slice.bin
+    python -m common.seek algo5 stego.txt 0 16 -p classes=4
+
+Only the cover units carrying the requested bytes are decoded: body lines
+for algo1 (a symbol each, after the 32-bit length), capital letters for
+algo5 (a class step between each neighbouring pair, after the compression
+flag bit of a marked stream). A sparse index with
+the byte offset of every STRIDE-th unit leads to the first one. It is
+built in one vectorised pass over the file and, for paths, kept in the
+cover index directory (common.cover_index.INDEX_DIR, the same file
+layout) under the hash of the file's absolute path, never next to the
+user's file. It is rebuilt when the file's size or mtime no longer
+match. The bytes are the payload as
+embedded: a compressed (--compress) message, reported by the reader's
+compressed attribute, has to be decoded whole.
+"""
+import abc
+import argparse
+import array
+import hashlib
+import io
+import mmap
+import os
+import sys
+
+import numpy as np
+
+from common.algorithms import load
+from common.buffers import is_path, read_source
+from common.cover_index import INDEX_DIR, CoverIndex, write_arrays
+from common.streams import detect
+
+STRIDE = 1024
+CHUNK_SIZE = 1 << 24
+
+
+def seek_index_path(path):
+    """Where the seek index of the stego file at path is kept."""
+    digest = hashlib.sha256(os.fsencode(os.path.abspath(path))).hexdigest()
+    return INDEX_DIR / f"seek-{digest[:32]}.idx"
+
+
+class PayloadReader(io.RawIOBase, abc.ABC):
+    """
+    Seekable binary reader over the payload of one stego file (path,
+    bytes, bytearray, mmap or anything common.buffers.read_source takes).
+    Subclasses implement _scan, _payload_size and read_range.
+    """
+    algo = None
+    compressed = False
+
+    def __new__(cls, *args, **kwargs):
+        # io.RawIOBase's C constructor skips ABCMeta's abstract method check
+        if cls.__abstractmethods__:
+            missing = ', '.join(sorted(cls.__abstractmethods__))
+            raise TypeError(f"Can't instantiate abstract class {cls.__name__} with abstract methods {missing}")
+        return super().__new__(cls)
+
+    def __init__(self, source, stride=STRIDE, index_file=True, **params):
+        super().__init__()
+        self.params = params
+        self.stride = stride
+        self._pos = 0
+        self._file = self._mmap = None
+        if is_path(source):
+            self._file = open(source, 'rb')
+            try:
+                self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # empty file
+                self._file.close()
+                raise ValueError(f"{source} is empty") from None
+            self.data = self._mmap
+        elif isinstance(source, (bytes, bytearray, mmap.mmap)):
+            self.data = source
+        else:
+            self.data = bytes(read_source(source))
+        if detect(self.data[:4]):
+            self.close()
+            raise ValueError("Compressed stego files cannot be read by range; decompress them first")
+        self._setup()
+        self.offsets, self.units = self._load_index(source if is_path(source) and index_file else None)
+        self.size = self._payload_size()
+
+    # --- per algorithm ---
+
+    def _setup(self):
+        pass
+
+    @abc.abstractmethod
+    def _scan(self):
+        """(offsets of every stride-th unit, unit count) in one pass over the file."""
+
+    @abc.abstractmethod
+    def _payload_size(self) -> int:
+        """Payload bytes in the file."""
+
+    @abc.abstractmethod
+    def read_range(self, start: int, stop: int) -> bytes:
+        """Payload bytes [start, stop), clamped to size."""
+
+    # --- sparse index ---
+
+    def _index_header(self, path):
+        stat = os.stat(path)
+        return {'kind': 'seek', 'algo': self.algo, 'params': self.params, 'stride': self.stride,
+                'path': os.path.abspath(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+    def _load_index(self, path):
+        if path is None:
+            return self._scan()
+        index_path = seek_index_path(path)
+        expected = self._index_header(path)
+        try:
+            with CoverIndex(index_path) as index:
+                if all(index.header.get(name) == value for name, value in expected.items()):
+                    return array.array('Q', index['offsets']), index.header['units']
+        except (OSError, ValueError, KeyError):
+            pass
+        offsets, units = self._scan()
+        try:
+            write_arrays(index_path, dict(expected, units=units), {'offsets': offsets})
+        except OSError:
+            pass  # read-only index directory: the index only lives as long as the reader
+        return offsets, units
+
+    def _chunks(self, start):
+        """(offset, uint8 array) over data[start:], CHUNK_SIZE bytes at a time."""
+        for offset in range(start, len(self.data), CHUNK_SIZE):
+            count = min(CHUNK_SIZE, len(self.data) - offset)
+            yield offset, np.frombuffer(self.data, dtype=np.uint8, count=count, offset=offset)
+
+    # --- io.RawIOBase ---
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: self.size}[whence]
+        if base + offset < 0:
+            raise ValueError("negative seek position")
+        self._pos = base + offset
+        return self._pos
+
+    def readinto(self, buffer):
+        data = self.read_range(self._pos, self._pos + len(buffer))
+        buffer[:len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        super().close()
+
+
+class Algo1Reader(PayloadReader):
+    """
+    algo1: body line i carries symbol i; payload bit j is bit 32 + j of the
+    stream. The top bit of the 32-bit length is the compression flag.
+    """
+    algo = 'algo1'
+
+    def _setup(self):
+        self.decode = load('algo1', 'decode')
+        self.compact, self.levels, self.k, self.body_start = self.decode.body_layout(self.data)
+        if self.body_start <= 0:
+            raise ValueError("Stego document has no cover lines")
+        self.tag_re = self.decode.P_TAG_RE if self.compact else self.decode.DIV_TAG_RE
+
+    def _scan(self):
+        # line 0 starts the body, line n + 1 follows the n-th newline after it;
+        # the last newline precedes '</body></html>', so newlines = cover lines
+        offsets = array.array('Q', [self.body_start])
+        seen = 0
+        for offset, chunk in self._chunks(self.body_start):
+            newlines = np.flatnonzero(chunk == 10) + offset
+            numbers = np.arange(seen + 1, seen + 1 + newlines.size)
+            offsets.extend((newlines[numbers % self.stride == 0] + 1).tolist())
+            seen += newlines.size
+        if seen and offsets[-1] >= len(self.data):
+            offsets.pop()
+        return offsets, seen
+
+    def _symbols(self, first, count):
+        pos = self.offsets[first // self.stride]
+        for _ in range(first % self.stride):
+            pos = self.data.find(b'\n', pos) + 1
+        symbols = []
+        for _ in range(count):
+            match = self.tag_re.match(self.data, pos)
+            if pos <= 0 or not match:
+                raise ValueError("Stego document ends before the requested range")
+            symbols.append(self.decode.tag_symbol(match, self.compact, self.levels))
+            pos = self.data.find(b'\n', match.end()) + 1
+        return symbols
+
+    def _bits(self, start, stop):
+        """Bit string of stream bits [start, stop)."""
+        first = start // self.k
+        symbols = self._symbols(first, -(-stop // self.k) - first)
+        bits = ''.join(format(symbol, f'0{self.k}b') for symbol in symbols)
+        return bits[start - first * self.k:stop - first * self.k]
+
+    def _payload_size(self):
+        length, self.compressed = self.decode.length_header(int(self._bits(0, 32), 2))
+        available = (self.units * self.k - 32) // 8
+        if length > available:
+            raise ValueError(f"Length header says {length} bytes, the document holds {available}")
+        return length
+
+    def read_range(self, start, stop):
+        start, stop = max(0, start), min(stop, self.size)
+        if start >= stop:
+            return b''
+        bits = self._bits(32 + 8 * start, 32 + 8 * stop)
+        return int(bits, 2).to_bytes(stop - start, 'big')
+
+
+class Algo5Reader(PayloadReader):
+    """
+    algo5: the step between capitals i and i + 1 carries stream bits
+    [i * b, (i + 1) * b); in a marked stream (decode.marked) stream bit 0 is
+    the compression flag and payload bit j is stream bit 1 + j, in an older
+    unmarked one payload bit j is stream bit j.
+    """
+    algo = 'algo5'
+
+    def _setup(self):
+        stego = load('algo5', 'decode').FeatureCodingSteganography(int(self.params.get('classes', 2)))
+        self.classes = stego.classes
+        self.bits_per_letter = stego.bits_per_letter
+        self.table = stego.byte_table()
+        self.flag_bits = 1 if stego.marked(self.data) else 0
+        self.params = {'classes': self.classes}
+
+    def _scan(self):
+        offsets = array.array('Q')
+        seen = 0
+        for offset, chunk in self._chunks(0):
+            capitals = np.flatnonzero(self.table[chunk]) + offset
+            numbers = np.arange(seen, seen + capitals.size)
+            offsets.extend(capitals[numbers % self.stride == 0].tolist())
+            seen += capitals.size
+        return offsets, seen
+
+    def _payload_size(self):
+        bits = max(0, (self.units - 1) * self.bits_per_letter - self.flag_bits)
+        if self.units > 1 and self.flag_bits:
+            self.compressed = bool(self._bits(0, 1)[0])
+        # like decode_file: two classes pad the last byte, more drop the encoder's padding
+        return -(-bits // 8) if self.classes == 2 else bits // 8
+
+    def _bits(self, start, stop):
+        """uint8 array of stream bits [start, stop), short when the stream ends first."""
+        b = self.bits_per_letter
+        first = start // b
+        last = min(-(-stop // b), self.units - 1)  # steps [first, last)
+        window_start = self.offsets[first // self.stride]
+        following = last // self.stride + 1
+        window_end = self.offsets[following] if following < len(self.offsets) else len(self.data)
+
+        window = np.frombuffer(self.data, dtype=np.uint8, count=window_end - window_start,
+                               offset=window_start)
+        cats = self.table[window]
+        cats = cats[cats != 0]
+        skip = first - first // self.stride * self.stride
+        cats = cats[skip:skip + last - first + 1].astype(np.int16)
+        steps = (np.diff(cats) % self.classes).astype(np.uint8)
+        bits = np.unpackbits(steps[:, None], axis=1)[:, 8 - b:].reshape(-1)
+        return bits[start - first * b:stop - first * b]
+
+    def read_range(self, start, stop):
+        start, stop = max(0, start), min(stop, self.size)
+        if start >= stop:
+            return b''
+        bits = self._bits(self.flag_bits + 8 * start, self.flag_bits + 8 * stop)
+        # the last byte of a two-class message may be zero-padded
+        bits = np.concatenate((bits, np.zeros(8 * (stop - start) - bits.size, dtype=np.uint8)))
+        return np.packbits(bits).tobytes()
+
+
+READERS = {
+    'algo1': Algo1Reader,
+    'algo5': Algo5Reader,
+}
+
+
+def open_reader(source, algo: str, **kwargs) -> PayloadReader:
+    """Reader for algo's stego source; kwargs: stride, index_file, algorithm parameters."""
+    if algo not in READERS:
+        raise KeyError(f"No random-access reader for {algo}")
+    return READERS[algo](source, **kwargs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Read a byte range of a stego payload')
+
+    parser.add_argument('algo', choices=sorted(READERS))
+    parser.add_argument('stego', help='Stego file (uncompressed)')
+    parser.add_argument('start', type=int, help='First payload byte')
+    parser.add_argument('stop', type=int, nargs='?', help='End of the range (default: payload end)')
+    parser.add_argument('-p', '--param', action='append', metavar='NAME=VALUE', default=[],
+                        help='Algorithm parameter, e.g. classes=4 for algo5')
+    parser.add_argument('-o', '--output', help='Output file (default: stdout)')
+    parser.add_argument('--stride', type=int, default=STRIDE, help='Units between index entries')
+    parser.add_argument('--no-index-file', action='store_true',
+                        help='Do not read or write the seek index kept under .cover_index/')
+
+    args = parser.parse_args()
+    params = dict(item.partition('=')[::2] for item in args.param)
+
+    try:
+        with open_reader(args.stego, args.algo, stride=args.stride,
+                         index_file=not args.no_index_file, **params) as reader:
+            data = reader.read_range(args.start, reader.size if args.stop is None else args.stop)
+            print(f"{len(data)} of {reader.size} payload bytes", file=sys.stderr)
+    except (ValueError, OSError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if args.output:
+        with open(args.output, 'wb') as f:
+            f.write(data)
+    else:
+        sys.stdout.buffer.write(data)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+"""
+Spread one payload over many covers.
+
+    python -m common.sharding encode --algo algo1 -i secret.bin -o out/ covers/*.txt
+    python -m common.sharding decode --algo algo1 -o secret.bin out/*.html
+
+The payload is cut into shards sized to each cover's capacity
+(common.capacity). Every shard starts with a small manifest header, so
+the stego files can be decoded in any order and reassembled:
+
+    b'SH' | version | flags | payload id (4) | index (u16) | count (u16) | length (u32) | crc32 (u32)
+
+The payload id is the start of the payload's SHA-256 and is checked again
+after reassembly. FLAG_COMPRESSED in flags marks a payload compressed with
+common.framing before it was cut; it is unframed after reassembly. Shards
+are embedded uncompressed by the algorithms themselves. Shards are encoded
+and decoded in parallel worker processes.
+"""
+import argparse
+import contextlib
+import hashlib
+import io
+import struct
+import sys
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from common.algorithms import load
+from common.capacity import capacity, cover_lines, cover_sentences
+from common.framing import frame_payload, unframe_payload
+
+MAGIC = b'SH'
+VERSION = 2
+HEADER = struct.Struct('>2sBB4sHHII')
+FLAG_COMPRESSED = 0x01
+
+SUFFIXES = {
+    'algo1': '.html',
+    'algo2': '.html',
+    'algo3': '.txt',
+    'algo5': '.txt',
+    'autorski_projekt': '.pdf',
+}
+
+
+def _flag(params: dict, name: str) -> bool:
+    return params.get(name, '').lower() in ('1', 'true', 'yes')
+
+
+# --- byte-level encoders/decoders: (params, cover or stego bytes, ...) -> bytes ---
+
+def _encode_algo1(params, cover, data):
+    mod = load('algo1', 'encode')
+    return mod.encode_html(None, cover_lines(cover), data, compact=_flag(params, 'compact'),
+                           bits_per_line=int(params.get('bits_per_line', 1)))
+
+
+def _decode_algo1(params, stego):
+    return load('algo1', 'decode').decode_payload(stego)
+
+
+def _encode_algo2(params, cover, data):
+    return load('algo2', 'algos').encode_html_with_formatting(cover, data, None)
+
+
+def _decode_algo2(params, stego):
+    return load('algo2', 'algos').decode_payload(stego)
+
+
+def _algo3_labels(params, sentences):
+    mod = load('algo3', 'encode')
+    if params.get('labels', 'keywords') == 'llm':
+        return mod.batch_sentiment_labels_with_llm(sentences)
+    return mod.fallback_sentiment_batch(sentences)
+
+
+def _encode_algo3(params, cover, data):
+    mod = load('algo3', 'encode')
+    slots = int(params.get('slots', 1))
+    sentences = cover_sentences(cover)
+    sentences = sentences[:mod.sentences_needed(sentences, len(data) * 8, slots)]
+    labels = _algo3_labels(params, sentences)
+    return ''.join(stego + '\n' for stego, _ in
+                   mod.iter_stego_sentences(sentences, data, labels, slots=slots)).encode('utf-8')
+
+
+def _decode_algo3(params, stego):
+    mod = load('algo3', 'decode')
+    sentences = cover_sentences(stego)
+    bits = [result[0] for _, result in mod.iter_sentence_bits(sentences) if result]
+    return mod.payload_from_bits(''.join(bits), mod.is_marked(sentences))[0]
+
+
+def _encode_algo5(params, cover, data):
+    mod = load('algo5', 'encode')
+    text = cover.decode('utf-8').strip()
+    stego = mod.FeatureCodingSteganography(int(params.get('classes', 2)))
+    return stego.encode(text, mod.bytes_to_binary(data)).encode('utf-8')
+
+
+def _decode_algo5(params, stego):
+    dec = load('algo5', 'decode').FeatureCodingSteganography(int(params.get('classes', 2)))
+    text = stego.decode('utf-8')
+    bits = dec.decode(text)
+    if not bits:
+        return b''
+    return dec.payload(bits, dec.marked(text))[0]
+
+
+def _encode_autorski(params, cover, data):
+    mod = load('autorski_projekt', 'encode')
+    return mod.embed_hidden_message(None, cover.decode('utf-8'), data, scheme='packed',
+                                    bytes_per_glyph=int(params.get('bytes_per_glyph', 2)))
+
+
+def _decode_autorski(params, stego):
+    mod = load('autorski_projekt', 'decode')
+    return mod.extract_payload(stego, int(params.get('bytes_per_glyph', 2)),
+                               params.get('parser', 'layout'))
+
+
+CODECS = {
+    'algo1': (_encode_algo1, _decode_algo1),
+    'algo2': (_encode_algo2, _decode_algo2),
+    'algo3': (_encode_algo3, _decode_algo3),
+    'algo5': (_encode_algo5, _decode_algo5),
+    'autorski_projekt': (_encode_autorski, _decode_autorski),
+}
+
+
+# --- shards ---
+
+def pack_shard(payload_id: bytes, index: int, count: int, data: bytes, compressed=False) -> bytes:
+    flags = FLAG_COMPRESSED if compressed else 0
+    return HEADER.pack(MAGIC, VERSION, flags, payload_id, index, count, len(data),
+                       zlib.crc32(data)) + data
+
+
+def unpack_shard(blob: bytes):
+    """
+    (payload id, index, count, data, compressed) or ValueError when blob is
+    not a valid shard.
+    """
+    if len(blob) < HEADER.size:
+        raise ValueError("Too short for a shard header")
+    magic, version, flags, payload_id, index, count, length, crc = HEADER.unpack_from(blob)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("No shard header")
+    # decoders may return a few padding bytes past the shard
+    data = bytes(blob[HEADER.size:HEADER.size + length])
+    if len(data) != length or zlib.crc32(data) != crc:
+        raise ValueError(f"Shard {index + 1}/{count} is damaged")
+    return payload_id, index, count, data, bool(flags & FLAG_COMPRESSED)
+
+
+def plan_shards(payload_size: int, capacities) -> list:
+    """
+    Payload byte count for each cover, in cover order, None for covers left
+    unused. Raises ValueError when all covers together are too small.
+    """
+    sizes, remaining, started = [], payload_size, False
+    for cap in capacities:
+        room = cap - HEADER.size
+        # an empty payload still takes one (empty) shard
+        if room < 0 or (room == 0 and remaining) or (started and not remaining):
+            sizes.append(None)
+            continue
+        size = min(room, remaining)
+        sizes.append(size)
+        remaining -= size
+        started = True
+    if remaining or not started:
+        usable = sum(max(0, cap - HEADER.size) for cap in capacities)
+        raise ValueError(f"Covers hold {usable} payload bytes, {payload_size} needed")
+    return sizes
+
+
+def _capacity_job(algo, params, cover):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return capacity(algo, cover, params)
+
+
+def _encode_job(algo, params, cover, shard):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return CODECS[algo][0](params, cover, shard)
+
+
+def _decode_job(algo, params, stego):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return CODECS[algo][1](params, stego)
+
+
+def encode_sharded(algo, payload: bytes, covers, params=None, workers=None, compress=False):
+    """
+    Hide payload in as many of covers (list of bytes) as needed.
+    Returns a list with one stego bytes object per cover, None for unused covers.
+    """
+    params = params or {}
+    if algo not in CODECS:
+        raise KeyError(f"Sharding does not support {algo}")
+    if compress:
+        payload = frame_payload(payload)
+    payload_id = hashlib.sha256(payload).digest()[:4]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        capacities = list(pool.map(_capacity_job, [algo] * len(covers), [params] * len(covers),
+                                   covers))
+        sizes = plan_shards(len(payload), capacities)
+        count = sum(1 for size in sizes if size is not None)
+        if count > 0xFFFF:
+            raise ValueError(f"{count} shards, at most 65535 are supported")
+
+        futures, offset, index = [], 0, 0
+        for cover, size in zip(covers, sizes):
+            if size is None:
+                futures.append(None)
+                continue
+            shard = pack_shard(payload_id, index, count, payload[offset:offset + size], compress)
+            futures.append(pool.submit(_encode_job, algo, params, cover, shard))
+            offset += size
+            index += 1
+        return [future.result() if future else None for future in futures]
+
+
+def decode_sharded(algo, stegos, params=None, workers=None) -> bytes:
+    """Decode every stego file in parallel and reassemble the payload."""
+    params = params or {}
+    if algo not in CODECS:
+        raise KeyError(f"Sharding does not support {algo}")
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        blobs = list(pool.map(_decode_job, [algo] * len(stegos), [params] * len(stegos), stegos))
+
+    shards, expected = {}, None
+    for blob in blobs:
+        payload_id, index, count, data, compressed = unpack_shard(blob)
+        if expected is None:
+            expected = (payload_id, count, compressed)
+        elif (payload_id, count, compressed) != expected:
+            raise ValueError("Stego files belong to different payloads")
+        shards[index] = data
+
+    if expected is None:
+        raise ValueError("No stego files given")
+    payload_id, count, compressed = expected
+    missing = [i + 1 for i in range(count) if i not in shards]
+    if missing:
+        raise ValueError(f"Missing shards {missing} of {count}")
+
+    payload = b''.join(shards[i] for i in range(count))
+    if hashlib.sha256(payload).digest()[:4] != payload_id:
+        raise ValueError("Reassembled payload does not match its checksum")
+    return unframe_payload(payload) if compressed else payload
+
+
+def _params(args) -> dict:
+    params = {}
+    for item in args.param or []:
+        name, _, value = item.partition('=')
+        params[name] = value
+    return params
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Split a payload across several covers')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    encode = sub.add_parser('encode', help='Hide a payload file in a set of covers')
+    encode.add_argument('covers', nargs='+', help='Cover files')
+    encode.add_argument('-i', '--input', required=True, help='Payload file')
+    encode.add_argument('-o', '--output-dir', required=True, help='Directory for the stego files')
+    encode.add_argument('-z', '--compress', action='store_true', help='Compress before sharding')
+
+    decode = sub.add_parser('decode', help='Reassemble a payload from stego files')
+    decode.add_argument('stegos', nargs='+', help='Stego files, in any order')
+    decode.add_argument('-o', '--output', required=True, help='Payload file')
+
+    for command in (encode, decode):
+        command.add_argument('--algo', required=True, choices=sorted(CODECS))
+        command.add_argument('-p', '--param', action='append', metavar='NAME=VALUE',
+                             help='Job parameter, e.g. bits_per_line=2 or bytes_per_glyph=1')
+        command.add_argument('-j', '--workers', type=int, help='Worker processes (default: CPUs)')
+
+    args = parser.parse_args()
+    params = _params(args)
+
+    try:
+        if args.command == 'encode':
+            payload = Path(args.input).read_bytes()
+            covers = [Path(p).read_bytes() for p in args.covers]
+            stegos = encode_sharded(args.algo, payload, covers, params, args.workers,
+                                    args.compress)
+            out_dir = Path(args.output_dir)
+            out_dir.mkdir(parents=True, exist_ok=True)
+            used = 0
+            for cover_path, stego in zip(args.covers, stegos):
+                if stego is None:
+                    continue
+                target = out_dir / (Path(cover_path).stem + SUFFIXES[args.algo])
+                target.write_bytes(stego)
+                used += 1
+                print(f"{target}")
+            print(f"{len(payload)} bytes in {used} of {len(covers)} covers", file=sys.stderr)
+        else:
+            stegos = [Path(p).read_bytes() for p in args.stegos]
+            payload = decode_sharded(args.algo, stegos, params, args.workers)
+            Path(args.output).write_bytes(payload)
+            print(f"{len(payload)} bytes from {len(stegos)} files", file=sys.stderr)
+    except (ValueError, OSError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
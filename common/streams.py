@@ -0,0 +1,139 @@
+"""
+Compressed stego files: gzip (stdlib) or zstd (needs the optional
+`zstandard` package).
+
+Writers compress while the encoder writes, readers decompress while the
+decoder reads, so the uncompressed HTML/text never lands on disk. The
+format of an output path follows its suffix (.gz, .zst); inputs are
+recognised by their magic bytes, whatever they are called. Neither magic
+can start UTF-8 text, so plain covers and stego files are never mistaken
+for compressed ones.
+
+    with open_text_output('stego_output.txt.gz') as f:
+        f.write(stego)
+    with open_input('stego_output.txt.gz') as f:
+        data = f.read()
+"""
+import gzip
+import io
+
+from common.buffers import is_path
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+SUFFIXES = {'.gz': 'gzip', '.gzip': 'gzip', '.zst': 'zstd', '.zstd': 'zstd'}
+DEFAULT_LEVELS = {'gzip': 6, 'zstd': 3}
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError("zstd needs the 'zstandard' package (pip install zstandard)") from None
+    return zstandard
+
+
+def compression_for(path):
+    """'gzip', 'zstd' or None, from the file suffix."""
+    name = str(path).lower()
+    for suffix, compression in SUFFIXES.items():
+        if name.endswith(suffix):
+            return compression
+    return None
+
+
+def detect(prefix) -> str:
+    """'gzip', 'zstd' or None, from the first bytes of a file."""
+    prefix = bytes(prefix[:4])
+    if prefix.startswith(GZIP_MAGIC):
+        return 'gzip'
+    if prefix == ZSTD_MAGIC:
+        return 'zstd'
+    return None
+
+
+def wrap_writer(fileobj, compression, level=None):
+    """
+    Compressing writer over an open binary stream. Closing it finishes the
+    compressed data but leaves fileobj open.
+    """
+    if compression is None:
+        return fileobj
+    level = DEFAULT_LEVELS[compression] if level is None else level
+    if compression == 'gzip':
+        # mtime=0: the same stego file always compresses to the same bytes
+        return gzip.GzipFile(fileobj=fileobj, mode='wb', compresslevel=level, mtime=0)
+    if compression == 'zstd':
+        return _zstd().ZstdCompressor(level=level).stream_writer(fileobj, closefd=False)
+    raise ValueError(f"Unknown compression {compression!r}")
+
+
+def wrap_reader(fileobj, compression):
+    """Decompressing reader over an open binary stream (left open on close)."""
+    if compression is None:
+        return fileobj
+    if compression == 'gzip':
+        return gzip.GzipFile(fileobj=fileobj, mode='rb')
+    if compression == 'zstd':
+        return _zstd().ZstdDecompressor().stream_reader(fileobj, closefd=False)
+    raise ValueError(f"Unknown compression {compression!r}")
+
+
+def open_output(path, compression='auto', level=None):
+    """Binary writer for path; compression='auto' follows the suffix."""
+    if compression == 'auto':
+        compression = compression_for(path)
+    if compression == 'gzip':
+        return gzip.GzipFile(path, 'wb', DEFAULT_LEVELS['gzip'] if level is None else level, mtime=0)
+    if compression is None:
+        return open(path, 'wb')
+    if compression != 'zstd':
+        raise ValueError(f"Unknown compression {compression!r}")
+    cctx = _zstd().ZstdCompressor(level=DEFAULT_LEVELS['zstd'] if level is None else level)
+    return cctx.stream_writer(open(path, 'wb'), closefd=True)
+
+
+def open_text_output(path, compression='auto', level=None, encoding='utf-8'):
+    return io.TextIOWrapper(open_output(path, compression, level), encoding=encoding)
+
+
+def _peek(stream, n=4) -> bytes:
+    if hasattr(stream, 'peek'):
+        return stream.peek(n)[:n]
+    prefix = stream.read(n)
+    stream.seek(-len(prefix), io.SEEK_CUR)
+    return prefix
+
+
+def open_input(source):
+    """
+    Binary reader over source (path, bytes-like or binary stream), transparently
+    decompressing gzip or zstd. A stream source must be seekable or have peek().
+    """
+    if is_path(source):
+        f = open(source, 'rb')
+        compression = detect(_peek(f))
+        if compression == 'gzip':
+            f.close()
+            return gzip.open(source, 'rb')
+        if compression == 'zstd':
+            return _zstd().ZstdDecompressor().stream_reader(f, closefd=True)
+        return f
+    try:
+        stream = io.BytesIO(memoryview(source))
+    except TypeError:
+        stream = source
+    return wrap_reader(stream, detect(_peek(stream)))
+
+
+def open_text_input(source, encoding='utf-8'):
+    return io.TextIOWrapper(open_input(source), encoding=encoding)
+
+
+def decompress(data) -> bytes:
+    """data itself when it is not compressed, else the decompressed bytes."""
+    compression = detect(data)
+    if compression is None:
+        return data
+    with wrap_reader(io.BytesIO(data), compression) as f:
+        return f.read()
@@ -0,0 +1,173 @@
+"""
+Warm worker daemon for the steganography algorithms on a local Unix socket.
+
+    python daemon.py --workers 4 &
+    python stegoctl.py algo5 encode -m "secret" -i algo5/cover_sample.txt -o stego.txt
+
+Worker processes import every algorithm script (and bs4, lxml, fitz,
+reportlab) once at startup and keep them, together with anything the
+scripts cache, for the lifetime of the daemon; a request only pays for
+the job itself. Requests and replies use the frames in common/ipc.py and
+the jobs in common/jobs.py, the same ones server.py serves over HTTP.
+The socket is created with mode 0600, so only the owner can use it.
+Repeated encodes are answered from common.result_cache without a worker
+(--cache-bytes, --no-cache); status reports the hit rate.
+"""
+import argparse
+import asyncio
+import os
+import socket
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from common import ipc, jobs
+from common.result_cache import MAX_BYTES, ResultCache
+
+
+class StegoDaemon:
+    def __init__(self, workers=None, max_body=64 * 1024 * 1024, queue_size=64, cache=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=jobs.preload)
+        self.max_body = max_body
+        self.queue_size = queue_size
+        self.pending = 0
+        self.served = 0
+        self.started = time.time()
+        self.server = None
+        self.cache = cache
+
+    def warm_up(self):
+        """Start every worker now instead of on the first requests."""
+        for future in [self.pool.submit(jobs.preload) for _ in range(self.workers)]:
+            future.result()
+
+    def status(self):
+        status = {
+            'ok': True,
+            'pid': os.getpid(),
+            'uptime': round(time.time() - self.started, 1),
+            'workers': self.workers,
+            'pending': self.pending,
+            'served': self.served,
+        }
+        if self.cache is not None:
+            status['cache'] = self.cache.stats()
+        return status
+
+    async def dispatch(self, header, body):
+        op = header.get('op')
+        if op == 'status':
+            return self.status(), b''
+        if op == 'shutdown':
+            self.server.close()
+            return {'ok': True}, b''
+
+        algo, params = header.get('algo'), header.get('params') or {}
+        if (algo, op) not in jobs.JOBS:
+            return {'ok': False, 'error': f"Unknown job {algo}/{op}"}, b''
+        if self.pending >= self.queue_size:
+            return {'ok': False, 'error': "Job queue is full, retry later"}, b''
+
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            key = result = None
+            if self.cache is not None:
+                key, result = await loop.run_in_executor(None, self.cache.lookup, algo, op, params, body)
+            if result is None:
+                result = await loop.run_in_executor(self.pool, jobs.run, algo, op, params, body)
+                if key is not None:
+                    await loop.run_in_executor(None, self.cache.put, key, result)
+        except Exception as e:
+            return {'ok': False, 'error': str(e) or type(e).__name__}, b''
+        finally:
+            self.pending -= 1
+        self.served += 1
+        return {'ok': True, 'content_type': jobs.content_type(algo, op)}, result
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    header, body = await ipc.read_frame(reader, self.max_body)
+                except asyncio.IncompleteReadError:
+                    break
+                except ValueError as e:
+                    # the rest of an oversized frame is still in the socket
+                    writer.write(ipc.pack_frame({'ok': False, 'error': str(e)}))
+                    await writer.drain()
+                    break
+                reply, data = await self.dispatch(header, body)
+                writer.write(ipc.pack_frame(reply, data))
+                await writer.drain()
+                if header.get('op') == 'shutdown':
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, path):
+        # the socket is created 0600, never briefly open to other users
+        umask = os.umask(0o177)
+        try:
+            self.server = await asyncio.start_unix_server(self.handle, path)
+        finally:
+            os.umask(umask)
+        print(f"Serving on {path} with {self.workers} workers")
+        async with self.server:
+            try:
+                await self.server.serve_forever()
+            except asyncio.CancelledError:
+                pass
+
+
+def claim_socket(path):
+    """Remove a stale socket file; refuse if a daemon still answers on it."""
+    if not os.path.exists(path):
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except (ConnectionRefusedError, FileNotFoundError):
+        os.unlink(path)
+        return
+    finally:
+        probe.close()
+    raise RuntimeError(f"Another daemon is already listening on {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Warm steganography worker daemon (Unix socket)')
+
+    parser.add_argument('--socket', default=ipc.socket_path(), help='Socket path')
+    parser.add_argument('--workers', type=int, help='Worker processes (default: CPU count)')
+    parser.add_argument('--max-body', type=int, default=64 * 1024 * 1024, help='Max request body in bytes')
+    parser.add_argument('--queue', type=int, default=64, help='Max jobs waiting for a worker')
+    parser.add_argument('--cache-bytes', type=int, default=MAX_BYTES, help='Size limit of the result cache')
+    parser.add_argument('--no-cache', action='store_true', help='Do not cache encode results')
+
+    args = parser.parse_args()
+
+    try:
+        claim_socket(args.socket)
+    except RuntimeError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    cache = None if args.no_cache else ResultCache(max_bytes=args.cache_bytes)
+    daemon = StegoDaemon(args.workers, args.max_body, args.queue, cache)
+    daemon.warm_up()
+    try:
+        asyncio.run(daemon.serve(args.socket))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.pool.shutdown(cancel_futures=True)
+        if os.path.exists(args.socket):
+            os.unlink(args.socket)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Load test for server.py.
+
+    python loadtest.py --url "http://127.0.0.1:8080/algo5/encode?message=test" \
+        --body algo5/cover_sample.txt --concurrency 16 --duration 10
+
+Each client keeps one connection open and sends requests back to back.
+Prints requests per second, latency percentiles and the status code mix.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+
+async def read_chunked(reader):
+    while True:
+        size = int((await reader.readuntil(b'\r\n')).split(b';', 1)[0], 16)
+        if size == 0:
+            await reader.readuntil(b'\r\n')
+            return
+        await reader.readexactly(size + 2)
+
+
+async def client(url, body, deadline, latencies, statuses):
+    path = url.path + (f"?{url.query}" if url.query else '')
+    request = (f"POST {path} HTTP/1.1\r\nHost: {url.netloc}\r\n"
+               f"Content-Length: {len(body)}\r\n\r\n").encode('latin-1') + body
+    reader = writer = None
+    while time.perf_counter() < deadline:
+        if writer is None:
+            reader, writer = await asyncio.open_connection(url.hostname, url.port or 80)
+        start = time.perf_counter()
+        try:
+            writer.write(request)
+            await writer.drain()
+            head = (await reader.readuntil(b'\r\n\r\n')).decode('latin-1')
+            await read_chunked(reader)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            statuses['conn-error'] += 1
+            writer.close()
+            writer = None
+            continue
+        latencies.append(time.perf_counter() - start)
+        status = head.split(' ', 2)[1]
+        statuses[status] += 1
+        if 'connection: close' in head.lower():
+            writer.close()
+            writer = None
+            if status == '503':
+                await asyncio.sleep(0.01)
+    if writer is not None:
+        writer.close()
+
+
+async def run(url, body, concurrency, duration):
+    latencies, statuses = [], Counter()
+    start = time.perf_counter()
+    deadline = start + duration
+    await asyncio.gather(*(client(url, body, deadline, latencies, statuses)
+                           for _ in range(concurrency)))
+    return time.perf_counter() - start, latencies, statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test for server.py')
+
+    parser.add_argument('--url', required=True, help='Full request URL incl. query string')
+    parser.add_argument('--body', required=True, help='File sent as request body')
+    parser.add_argument('-c', '--concurrency', type=int, default=8, help='Parallel connections')
+    parser.add_argument('-d', '--duration', type=float, default=10.0, help='Seconds to run')
+
+    args = parser.parse_args()
+
+    with open(args.body, 'rb') as f:
+        body = f.read()
+
+    elapsed, latencies, statuses = asyncio.run(
+        run(urlsplit(args.url), body, args.concurrency, args.duration))
+
+    ok = statuses.get('200', 0)
+    print(f"Requests: {sum(statuses.values())} in {elapsed:.2f}s")
+    print(f"Status codes: {dict(statuses)}")
+    print(f"Throughput: {ok / elapsed:.1f} req/s (200 only)")
+    if len(latencies) >= 2:
+        q = statistics.quantiles(latencies, n=100)
+        print(f"Latency p50: {q[49] * 1000:.1f} ms, p95: {q[94] * 1000:.1f} ms, "
+              f"max: {max(latencies) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
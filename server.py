@@ -0,0 +1,219 @@
+"""
+Local HTTP service for the steganography algorithms.
+
+    python server.py --port 8080 --workers 4
+
+Routes:
+    POST /<algo>/<op>?message=...   body = cover (encode) or stego file (decode)
+    GET  /health
+
+<algo> is one of algo1, algo2, algo3, algo5, autorski_projekt and <op> is
+encode or decode, or update for algo1/algo2 (see common/jobs.py). Jobs run
+in a process pool; when more than --queue jobs are waiting the server
+answers 503 instead of queueing. Encode results are kept in
+common.result_cache (--cache-bytes, --no-cache), so a repeated request is
+answered without a worker; /health reports the hit rate.
+Bodies can be sent with Content-Length or chunked and responses are always
+streamed back chunked.
+"""
+import argparse
+import asyncio
+import ipaddress
+import json
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import parse_qsl, urlsplit
+
+from common import jobs
+from common.result_cache import MAX_BYTES, ResultCache
+
+CHUNK_SIZE = 64 * 1024
+MAX_HEADER_SIZE = 16 * 1024
+
+REASONS = {
+    200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+    413: 'Payload Too Large', 500: 'Internal Server Error', 503: 'Service Unavailable',
+}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message=''):
+        super().__init__(message or REASONS[status])
+        self.status = status
+
+
+class StegoServer:
+    def __init__(self, workers=None, max_body=16 * 1024 * 1024, queue_size=64, cache=None):
+        self.pool = ProcessPoolExecutor(max_workers=workers)
+        self.max_body = max_body
+        self.queue_size = queue_size
+        self.pending = 0
+        self.cache = cache
+
+    async def read_head(self, reader):
+        try:
+            head = await reader.readuntil(b'\r\n\r\n')
+        except asyncio.LimitOverrunError:
+            raise HttpError(413, "Headers too large")
+        lines = head.decode('latin-1').split('\r\n')
+        try:
+            method, target, _ = lines[0].split(' ', 2)
+        except ValueError:
+            raise HttpError(400, "Malformed request line")
+        # Non-ASCII query values sent without %-encoding are UTF-8 on the wire.
+        target = target.encode('latin-1').decode('utf-8', errors='replace')
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                name, value = line.split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+        return method, target, headers
+
+    async def read_body(self, reader, headers):
+        """Read the body chunk by chunk, refusing it as soon as it crosses max_body."""
+        body = bytearray()
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            while True:
+                size_line = await reader.readuntil(b'\r\n')
+                size = int(size_line.split(b';', 1)[0], 16)
+                if size == 0:
+                    await reader.readuntil(b'\r\n')
+                    break
+                if len(body) + size > self.max_body:
+                    raise HttpError(413)
+                body += await reader.readexactly(size)
+                await reader.readexactly(2)
+            return bytes(body)
+
+        length = int(headers.get('content-length', '0'))
+        if length > self.max_body:
+            raise HttpError(413)
+        while len(body) < length:
+            chunk = await reader.read(min(CHUNK_SIZE, length - len(body)))
+            if not chunk:
+                raise asyncio.IncompleteReadError(bytes(body), length)
+            body += chunk
+        return bytes(body)
+
+    async def write_response(self, writer, status, data, content_type='text/plain; charset=utf-8',
+                             extra_headers=None):
+        head = [f"HTTP/1.1 {status} {REASONS[status]}",
+                f"Content-Type: {content_type}",
+                "Transfer-Encoding: chunked"]
+        for name, value in (extra_headers or {}).items():
+            head.append(f"{name}: {value}")
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1'))
+        view = memoryview(data)
+        for i in range(0, len(view), CHUNK_SIZE):
+            chunk = view[i:i + CHUNK_SIZE]
+            writer.write(f"{len(chunk):x}\r\n".encode('ascii'))
+            writer.write(chunk)
+            writer.write(b'\r\n')
+            await writer.drain()
+        writer.write(b'0\r\n\r\n')
+        await writer.drain()
+
+    async def dispatch(self, method, target, headers, reader):
+        url = urlsplit(target)
+        if url.path == '/health':
+            info = {'pending': self.pending, 'queue_size': self.queue_size}
+            if self.cache is not None:
+                info['cache'] = self.cache.stats()
+            return 200, json.dumps(info).encode('utf-8'), 'application/json'
+
+        parts = url.path.strip('/').split('/')
+        if len(parts) != 2 or tuple(parts) not in jobs.JOBS:
+            raise HttpError(404)
+        if method != 'POST':
+            raise HttpError(405)
+
+        # Backpressure: refuse before reading a body we could not process soon.
+        if self.pending >= self.queue_size:
+            raise HttpError(503, "Job queue is full, retry later")
+        algo, op = parts
+        params = dict(parse_qsl(url.query))
+
+        self.pending += 1
+        try:
+            body = await self.read_body(reader, headers)
+            loop = asyncio.get_running_loop()
+            key = result = None
+            if self.cache is not None:
+                # hashing the body and the file read stay off the event loop
+                key, result = await loop.run_in_executor(None, self.cache.lookup, algo, op, params, body)
+            if result is None:
+                result = await loop.run_in_executor(self.pool, jobs.run, algo, op, params, body)
+                if key is not None:
+                    await loop.run_in_executor(None, self.cache.put, key, result)
+        except (ValueError, KeyError, UnicodeDecodeError) as e:
+            raise HttpError(400, str(e))
+        finally:
+            self.pending -= 1
+        return 200, result, jobs.content_type(algo, op)
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    method, target, headers = await self.read_head(reader)
+                except asyncio.IncompleteReadError:
+                    break
+
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                try:
+                    status, data, ctype = await self.dispatch(method, target, headers, reader)
+                    await self.write_response(writer, status, data, ctype)
+                except HttpError as e:
+                    extra = {'Retry-After': '1'} if e.status == 503 else {}
+                    # The unread body makes the connection unusable for the next request.
+                    extra['Connection'] = 'close'
+                    keep_alive = False
+                    await self.write_response(writer, e.status, str(e).encode('utf-8'),
+                                              extra_headers=extra)
+                except Exception as e:
+                    keep_alive = False
+                    await self.write_response(writer, 500, f"Error: {e}".encode('utf-8'),
+                                              extra_headers={'Connection': 'close'})
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle, host, port, limit=MAX_HEADER_SIZE)
+        print(f"Serving on http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Steganography HTTP service (localhost only)')
+
+    parser.add_argument('--host', default='127.0.0.1', help='Loopback address to bind')
+    parser.add_argument('--port', type=int, default=8080, help='Port to listen on')
+    parser.add_argument('--workers', type=int, help='Worker processes (default: CPU count)')
+    parser.add_argument('--max-body', type=int, default=16 * 1024 * 1024, help='Max request body in bytes')
+    parser.add_argument('--queue', type=int, default=64, help='Max jobs waiting for a worker')
+    parser.add_argument('--cache-bytes', type=int, default=MAX_BYTES, help='Size limit of the result cache')
+    parser.add_argument('--no-cache', action='store_true', help='Do not cache encode results')
+
+    args = parser.parse_args()
+
+    if args.host != 'localhost' and not ipaddress.ip_address(args.host).is_loopback:
+        print(f"Error: refusing to bind non-loopback address {args.host}", file=sys.stderr)
+        sys.exit(1)
+
+    cache = None if args.no_cache else ResultCache(max_bytes=args.cache_bytes)
+    app = StegoServer(args.workers, args.max_body, args.queue, cache)
+    try:
+        asyncio.run(app.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        app.pool.shutdown(cancel_futures=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Thin command-line client for daemon.py.
+
+    python stegoctl.py algo5 encode -m "secret" -i cover.txt -o stego.txt
+    python stegoctl.py algo1 decode < stego.html
+    python stegoctl.py algo1 update -m "new secret" -i stego.html -o stego.html
+    python stegoctl.py autorski_projekt encode -m "hi" -p scheme=packed -i cover.txt -o out.pdf
+    python stegoctl.py status
+    python stegoctl.py stop
+
+The input (cover or stego file) is read from -i or stdin; the result goes to
+-o or stdout. Parameters are the ones common/jobs.py takes. When no daemon
+is running the job runs in this process instead (slower: every import is
+paid again), unless --no-fallback is given. The daemon answers repeated
+encodes from common/result_cache.py (-p cache=0 skips it); a local run
+stores stego there only with --cache.
+"""
+import argparse
+import json
+import socket
+import sys
+
+from common import ipc
+
+
+def request(path, header, body=b''):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path)
+        sock.sendall(ipc.pack_frame(header, body))
+        return ipc.recv_frame(sock)
+
+
+def run_locally(algo, op, params, body, cache=False):
+    from common import jobs
+    from common.result_cache import ResultCache
+    try:
+        return {'ok': True}, jobs.run(algo, op, params, body, cache=ResultCache() if cache else None)
+    except Exception as e:
+        # same as the daemon: any job error is reported, not a traceback
+        return {'ok': False, 'error': str(e) or type(e).__name__}, b''
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Client for the steganography daemon')
+
+    parser.add_argument('algo', help="Algorithm folder, or 'status' / 'stop'")
+    parser.add_argument('op', nargs='?', choices=['encode', 'decode', 'update'], help='Operation')
+    parser.add_argument('-m', '--message', help="Message to hide (same as -p message=...)")
+    parser.add_argument('-p', '--param', action='append', metavar='NAME=VALUE',
+                        help='Job parameter, e.g. compress=1 or bits_per_line=2')
+    parser.add_argument('-i', '--input', help='Input file (default: stdin)')
+    parser.add_argument('-o', '--output', help='Output file (default: stdout)')
+    parser.add_argument('--socket', default=ipc.socket_path(), help='Daemon socket path')
+    parser.add_argument('--no-fallback', action='store_true',
+                        help='Fail instead of running locally when the daemon is not running')
+    parser.add_argument('--cache', action='store_true',
+                        help='Use the encode result cache when running locally')
+
+    args = parser.parse_args()
+
+    if args.algo in ('status', 'stop'):
+        try:
+            reply, _ = request(args.socket, {'op': 'status' if args.algo == 'status' else 'shutdown'})
+        except (FileNotFoundError, ConnectionRefusedError):
+            print(f"No daemon on {args.socket}", file=sys.stderr)
+            sys.exit(1)
+        print(json.dumps(reply, indent=2))
+        return
+    if args.op is None:
+        parser.error("the operation (encode, decode or update) is required")
+
+    params = {}
+    for item in args.param or []:
+        name, _, value = item.partition('=')
+        params[name] = value
+    if args.message is not None:
+        params['message'] = args.message
+
+    if args.input:
+        with open(args.input, 'rb') as f:
+            body = f.read()
+    else:
+        body = sys.stdin.buffer.read()
+
+    header = {'algo': args.algo, 'op': args.op, 'params': params}
+    try:
+        reply, result = request(args.socket, header, body)
+    except (FileNotFoundError, ConnectionRefusedError):
+        if args.no_fallback:
+            print(f"Error: no daemon on {args.socket}", file=sys.stderr)
+            sys.exit(1)
+        print("stegoctl: daemon not running, running the job locally", file=sys.stderr)
+        reply, result = run_locally(args.algo, args.op, params, body, args.cache)
+
+    if not reply.get('ok'):
+        print(f"Error: {reply.get('error')}", file=sys.stderr)
+        sys.exit(1)
+
+    if args.output:
+        with open(args.output, 'wb') as f:
+            f.write(result)
+    else:
+        sys.stdout.buffer.write(result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Chunked LLM labeller of algo3 against the local stub server (algo3/stub_ollama.py).
+"""
+import contextlib
+import io
+import itertools
+import sys
+import threading
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from common.algorithms import load
+
+pytest.importorskip('ollama')
+
+encode = load('algo3', 'encode')
+stub = load('algo3', 'stub_ollama')
+
+COVER = [
+    "I love this, what a great day",
+    "This is so sad, I miss you",
+    "haha that was hilarious lol",
+    "I am so angry right now",
+    "Thanks, you are the best",
+    "Why does this always happen to me",
+    "That joke was funny",
+    "Stop it, this is annoying",
+    "See you tomorrow",
+    "Congrats on the new job!",
+    "I cried all night",
+]
+
+
+@pytest.fixture
+def server():
+    """Stub ollama on a free port; yields (url, handler class) with a request counter."""
+    counter = itertools.count()
+
+    class Handler(stub.StubOllamaHandler):
+        delay = 0.0
+        fail_rate = 0.0
+        requests = 0
+
+        def do_POST(self):
+            Handler.requests = next(counter) + 1
+            super().do_POST()
+
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{httpd.server_address[1]}", Handler
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+def label(url, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()) as out:
+        labels = encode.chunked_sentiment_labels_with_llm(COVER, host=url, **kwargs)
+    return labels, out.getvalue()
+
+
+@pytest.mark.parametrize('chunk_size', [1, 4, 40])
+def test_one_request_per_chunk(server, chunk_size):
+    url, handler = server
+    labels, _ = label(url, chunk_size=chunk_size, concurrency=2, retries=2)
+    assert labels == encode.fallback_sentiment_batch(COVER)
+    assert handler.requests == -(-len(COVER) // chunk_size)
+
+
+def test_malformed_responses_are_retried_then_fall_back(server):
+    url, handler = server
+    handler.fail_rate = 1.0
+    labels, out = label(url, chunk_size=4, concurrency=4, retries=2)
+    # every chunk is asked retries + 1 times, then labelled by keywords
+    assert handler.requests == 3 * 3
+    assert out.count("using keyword fallback") == 3
+    assert labels == encode.fallback_sentiment_batch(COVER)
+
+
+def test_unreachable_server_falls_back():
+    with contextlib.redirect_stdout(io.StringIO()) as out:
+        labels = encode.chunked_sentiment_labels_with_llm(COVER, chunk_size=8, retries=1,
+                                                          host="http://127.0.0.1:9")
+    assert labels == encode.fallback_sentiment_batch(COVER)
+    assert "chunk request failed" in out.getvalue()
+
+
+@pytest.mark.parametrize('response, expected', [
+    ("1. happy\n2. sad\n3. funny", ['happy', 'sad', 'funny']),
+    ("Labels:\n1) Happy\n2 - SAD\n3: funny", ['happy', 'sad', 'funny']),
+    ("3. funny\n1. happy\n2. sad", ['happy', 'sad', 'funny']),
+    ("1. happy\n2. sad", None),                # a label missing
+    ("1. happy\n2. confused\n3. funny", None),  # unknown label
+    ("1. happy or sad\n2. sad\n3. funny", None),  # ambiguous label
+    ("1. happy\n2. sad\n4. funny", None),       # number out of range
+    ("not sure", None),
+])
+def test_parse_chunk_labels(response, expected):
+    assert encode.parse_chunk_labels(response, 3) == expected
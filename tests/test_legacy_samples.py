@@ -0,0 +1,35 @@
+"""
+Stego files written before the compression flag (the committed samples) still
+decode, next to flagged streams from the current encoders.
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from common import jobs
+
+ALGO5_COVER = (ROOT / 'algo5' / 'cover_sample.txt').read_bytes() * 4
+
+
+def test_algo3_sample():
+    stego = (ROOT / 'algo3' / 'stego_output.txt').read_bytes()
+    assert jobs.run('algo3', 'decode', {}, stego) == b'testowa wiadomosc ollama3.1 test'
+
+
+def test_algo5_sample():
+    stego = (ROOT / 'algo5' / 'output.txt').read_bytes()
+    assert jobs.run('algo5', 'decode', {}, stego) == b'testowyydsygfdsyufyusdfyus'
+
+
+@pytest.mark.parametrize('compress', ['0', '1'])
+def test_flagged_round_trip(compress):
+    message = '\xa0hello, zażółć'
+    cover = (ROOT / 'algo3' / 'cover.txt').read_bytes()
+    stego = jobs.run('algo3', 'encode', {'message': message, 'compress': compress}, cover)
+    assert jobs.run('algo3', 'decode', {}, stego).decode('utf-8') == message
+    stego = jobs.run('algo5', 'encode', {'message': message, 'compress': compress}, ALGO5_COVER)
+    assert jobs.run('algo5', 'decode', {}, stego).decode('utf-8') == message